@@ -0,0 +1,132 @@
+"""
+Controle de admissão (backpressure) para os endpoints de chat
+"""
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+class Ticket:
+    """Vaga concedida pelo controlador; deve ser liberada ao fim da requisição"""
+
+    def __init__(self, controller: 'AdmissionController', user_id: str):
+        self.controller = controller
+        self.user_id = user_id
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self.user_id)
+
+
+class _Waiter:
+    """Requisição na fila; a vaga é concedida por quem a liberou"""
+    __slots__ = ('user_id', 'event', 'ticket')
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.event = threading.Event()
+        self.ticket: Optional[Ticket] = None
+
+
+class AdmissionController:
+    """
+    Limita as requisições simultâneas de uma rota.
+
+    Até ``max_in_flight`` requisições rodam ao mesmo tempo e cada usuário
+    ocupa no máximo ``max_per_user`` vagas. Quem não consegue vaga espera em
+    uma fila de até ``max_queue`` posições por ``queue_timeout`` segundos;
+    com a fila cheia a requisição é recusada imediatamente. Cada usuário
+    também ocupa no máximo ``max_per_user`` posições da fila, e as vagas
+    liberadas vão para o primeiro da fila que pode ser admitido (ordem de
+    chegada), sem disputa entre as threads acordadas.
+    """
+
+    def __init__(self, name: str, max_in_flight: int = 16, max_queue: int = 32,
+                 queue_timeout: float = 2.0, max_per_user: int = 2):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_per_user = max_per_user
+        self._in_flight = 0
+        self._per_user: Dict[str, int] = {}
+        self._queue = deque()
+        self._waiting_per_user: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {'admitted': 0, 'queued': 0, 'rejected': 0}
+
+    def acquire(self, user_id: str) -> Optional[Ticket]:
+        """Obtém uma vaga ou retorna None se a requisição deve ser recusada"""
+        with self._lock:
+            if self._can_admit(user_id):
+                return self._admit(user_id)
+
+            if (len(self._queue) >= self.max_queue
+                    or self._waiting_per_user.get(user_id, 0) >= self.max_per_user):
+                self._stats['rejected'] += 1
+                return None
+
+            waiter = _Waiter(user_id)
+            self._queue.append(waiter)
+            self._waiting_per_user[user_id] = self._waiting_per_user.get(user_id, 0) + 1
+            self._stats['queued'] += 1
+
+        waiter.event.wait(self.queue_timeout)
+        with self._lock:
+            # A vaga pode ter sido concedida logo depois do fim da espera
+            if waiter.ticket is None:
+                self._dequeue(waiter)
+                self._stats['rejected'] += 1
+            return waiter.ticket
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'in_flight': self._in_flight,
+                'waiting': len(self._queue),
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'max_per_user': self.max_per_user
+            })
+            return stats
+
+    def _can_admit(self, user_id: str) -> bool:
+        return (self._in_flight < self.max_in_flight
+                and self._per_user.get(user_id, 0) < self.max_per_user)
+
+    def _admit(self, user_id: str) -> Ticket:
+        self._in_flight += 1
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        self._stats['admitted'] += 1
+        return Ticket(self, user_id)
+
+    def _dequeue(self, waiter: _Waiter):
+        self._queue.remove(waiter)
+        count = self._waiting_per_user[waiter.user_id] - 1
+        if count > 0:
+            self._waiting_per_user[waiter.user_id] = count
+        else:
+            del self._waiting_per_user[waiter.user_id]
+
+    def _hand_off(self):
+        """Concede as vagas livres aos primeiros da fila que podem ser admitidos"""
+        for waiter in list(self._queue):
+            if self._in_flight >= self.max_in_flight:
+                break
+            if self._can_admit(waiter.user_id):
+                self._dequeue(waiter)
+                waiter.ticket = self._admit(waiter.user_id)
+                waiter.event.set()
+
+    def _release(self, user_id: str):
+        with self._lock:
+            self._in_flight -= 1
+            count = self._per_user.get(user_id, 0) - 1
+            if count > 0:
+                self._per_user[user_id] = count
+            else:
+                self._per_user.pop(user_id, None)
+            self._hand_off()
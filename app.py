@@ -1,36 +1,100 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, request, jsonify
+import atexit
 from flask_cors import CORS
 import os
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
 from flask import Response
 from chatbot import ChatBot
-from database import DatabaseManager
-from config import config
+from storage import create_storage
+from config import config, config_store
+from sse import HEARTBEAT, format_retry, parse_event_id, with_heartbeat
+from streams import STREAM_TOKEN_HEADER, StreamRegistry
+from admission import AdmissionController
+from health import HealthMonitor
+from profiling import Profiler, span
+from intents import analyze_messages, classify_intents
+from history_io import export_ndjson, gzip_chunks
+from assets import AssetPipeline
+from traffic import TrafficRecorder
+from ratelimit import RateLimiter
+from usage import USAGE_GROUPS, USAGE_ORDERS
+from chat_socket import ChatSocketServer
+from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
 CORS(app)
+# Limite de requisições por usuário e por IP, por rota (RATE_LIMIT_*)
+rate_limiter = RateLimiter(app, config)
+# Server-Timing / X-Debug-Timing e captura de perfis (opt-in via PROFILING_*)
+profiler = Profiler(app, config)
+# Arquivos estáticos com hash + gzip/brotli e compressão de respostas JSON
+asset_pipeline = AssetPipeline(app, config)
+# Gravação amostrada de requisições/respostas para replay (opt-in via TRAFFIC_RECORD_*)
+traffic_recorder = TrafficRecorder(app, config)
+atexit.register(traffic_recorder.close)
 
 # Configurações
 app.config['SECRET_KEY'] = config.SECRET_KEY
 app.config['DATABASE_PATH'] = config.DATABASE_PATH
 
 # Inicializar componentes
-db_manager = DatabaseManager(config.DATABASE_PATH)
+db_manager = create_storage(config)
 
-# Sincronizar GEMINI_API_KEY do ambiente para o banco antes de criar o chatbot
-try:
-    gemini_key = config.GEMINI_API_KEY or os.getenv('GEMINI_API_KEY')
-    if gemini_key:
-        db_manager.set_system_config('gemini_api_key', gemini_key)
-except Exception as e:
-    print(f"Erro ao sincronizar GEMINI_API_KEY: {e}")
+# Snapshot de configuração passa a considerar o system_config (ex.: gemini_api_key)
+config_store.attach_database(db_manager)
+config_store.start_watcher(config.CONFIG_WATCH_INTERVAL)
+config_store.install_signal_handler()
+config_store.subscribe(rate_limiter.on_config_change)
 
 chatbot = ChatBot(db_manager)
 
+# Monitor de saúde: endpoints de status servem o último snapshot
+health_monitor = HealthMonitor(
+    db_manager,
+    lambda: chatbot.gemini_integration,
+    interval=config.HEALTH_CHECK_INTERVAL,
+    gemini_interval=config.HEALTH_GEMINI_CHECK_INTERVAL
+)
+health_monitor.start()
+# Respostas pré-geradas para os botões de sugestão (na inicialização e periodicamente)
+chatbot.precomputed.start()
+
+# Registro de streams em andamento (retomada via Last-Event-ID ou user_message_id)
+stream_registry = StreamRegistry(max_streams=config.SSE_REPLAY_MAX_STREAMS, ttl=config.SSE_REPLAY_TTL,
+                                 max_events=config.SSE_REPLAY_MAX_EVENTS)
+# Controle de admissão por rota (limite de chamadas simultâneas ao Gemini)
+admission = {
+    route: AdmissionController(
+        route,
+        max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+        max_queue=config.ADMISSION_MAX_QUEUE,
+        queue_timeout=config.ADMISSION_QUEUE_TIMEOUT,
+        max_per_user=config.ADMISSION_MAX_PER_USER
+    )
+    for route in ('chat', 'stream')
+}
+
+def _apply_admission_config(old, new):
+    """Aplica novos limites de admissão sem reiniciar os workers"""
+    for controller in admission.values():
+        controller.max_in_flight = new.ADMISSION_MAX_IN_FLIGHT
+        controller.max_queue = new.ADMISSION_MAX_QUEUE
+        controller.queue_timeout = new.ADMISSION_QUEUE_TIMEOUT
+        controller.max_per_user = new.ADMISSION_MAX_PER_USER
+
+config_store.subscribe(_apply_admission_config)
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # Desativar buffering em proxies (nginx)
+}
+
 @app.route('/')
 def index():
     """Página principal do chatbot"""
-    return render_template('index.html')
+    return asset_pipeline.index()
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -49,14 +113,77 @@ def chat():
         if not message:
             return jsonify({'error': 'Mensagem não pode estar vazia'}), 400
         
+        # Controle de admissão para chamadas ao Gemini
+        ticket = None
+        if use_gemini:
+            ticket = admission['chat'].acquire(user_id)
+            if ticket is None:
+                if config.ADMISSION_OVERLOAD_MODE != 'degrade':
+                    return _overloaded_response()
+                print("[ADMISSAO] Sobrecarga - respondendo sem Gemini")
+                use_gemini = False
+        
         # Processar mensagem com o chatbot
-        response = chatbot.process_message(message, user_id, use_gemini)
+        try:
+            response = chatbot.process_message(message, user_id, use_gemini)
+        finally:
+            if ticket:
+                ticket.release()
         
-        return jsonify({
-            'response': response['message'],
-            'timestamp': response['timestamp'],
-            'message_id': response['message_id']
-        })
+        with span('serialization'):
+            return jsonify({
+                'response': response['message'],
+                'timestamp': response['timestamp'],
+                'message_id': response['message_id']
+            })
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Endpoint para processar um lote de mensagens (jobs offline)"""
+    try:
+        data = request.get_json()
+        messages = data.get('messages', []) if isinstance(data, dict) else None
+        if not isinstance(messages, list) or not messages:
+            return jsonify({'error': 'Envie uma lista de mensagens em "messages"'}), 400
+        if len(messages) > config.BATCH_MAX_SIZE:
+            return jsonify({'error': f'Lote excede o limite de {config.BATCH_MAX_SIZE} mensagens'}), 400
+        
+        # Valores padrão do lote aplicados a cada item
+        default_user_id = data.get('user_id', 'anonymous')
+        default_use_gemini = data.get('use_gemini', False)
+        batch = []
+        for index, item in enumerate(messages):
+            if isinstance(item, str):
+                item = {'message': item}
+            if not isinstance(item, dict):
+                return jsonify({'error': f'Item {index}: envie um texto ou um objeto com "message"',
+                                'index': index}), 400
+            if not isinstance(item.get('message', ''), str) or not isinstance(item.get('user_id', default_user_id), str):
+                return jsonify({'error': f'Item {index}: "message" e "user_id" devem ser texto',
+                                'index': index}), 400
+            batch.append({
+                'message': item.get('message', ''),
+                'user_id': item.get('user_id', default_user_id),
+                'use_gemini': item.get('use_gemini', default_use_gemini)
+            })
+        
+        # Cada chamada ao Gemini do lote passa pelo mesmo controle de admissão do /api/chat
+        results = chatbot.process_messages(batch, admission['chat'])
+        
+        with span('serialization'):
+            return jsonify({
+                'results': [
+                    result if 'error' in result else {
+                        'response': result['message'],
+                        'timestamp': result['timestamp'],
+                        'message_id': result['message_id']
+                    }
+                    for result in results
+                ]
+            })
         
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
@@ -65,6 +192,11 @@ def chat():
 def chat_stream():
     """Endpoint de streaming de resposta do Gemini via SSE"""
     try:
+        # Cliente reconectando: reenviar eventos perdidos a partir do Last-Event-ID
+        last_event = parse_event_id(request.headers.get('Last-Event-ID'))
+        if last_event:
+            return _resume_stream(*last_event)
+        
         data = request.get_json()
         message = data.get('message', '').strip()
         user_id = data.get('user_id', 'anonymous')
@@ -72,50 +204,191 @@ def chat_stream():
         if not message:
             return jsonify({'error': 'Mensagem não pode estar vazia'}), 400
 
-        # Salvar mensagem do usuário
-        user_message_id = db_manager.save_message(user_id=user_id, message=message, is_user=True)
-
-        def event_stream():
-            if use_gemini and chatbot.gemini_integration and chatbot.gemini_integration.is_available():
-                # Contexto mínimo
-                context = chatbot._get_conversation_context_for_gemini(user_id)
-                chunks = chatbot.gemini_integration.generate_stream(message, context)
-                accumulated = []
-                for text in chunks:
-                    if not text:
-                        continue
-                    accumulated.append(text)
-                    yield f"data: {text}\n\n"
-                # Salvar resposta completa
-                full_text = ''.join(accumulated) if accumulated else ''
-                if full_text:
-                    db_manager.save_message(user_id=user_id, message=full_text, is_user=False, parent_message_id=user_message_id)
-                    yield "event: end\n" + f"data: {{\"saved\": true}}\n\n"
-                else:
-                    # fallback
-                    fallback = chatbot._get_default_response(message)
-                    db_manager.save_message(user_id=user_id, message=fallback, is_user=False, parent_message_id=user_message_id)
-                    yield "event: end\n" + f"data: {{\"saved\": true}}\n\n"
-            else:
-                # Sem Gemini: usar resposta padrão de uma vez
-                fallback = chatbot._get_default_response(message)
-                db_manager.save_message(user_id=user_id, message=fallback, is_user=False, parent_message_id=user_message_id)
-                yield f"data: {fallback}\n\n"
-                yield "event: end\n" + f"data: {{\"saved\": true}}\n\n"
-
-        return Response(event_stream(), mimetype='text/event-stream')
+        # Controle de admissão: a vaga fica ocupada até o produtor terminar
+        ticket = None
+        if use_gemini:
+            ticket = admission['stream'].acquire(user_id)
+            if ticket is None:
+                if config.ADMISSION_OVERLOAD_MODE != 'degrade':
+                    return _overloaded_response()
+                print("[ADMISSAO] Sobrecarga - streaming sem Gemini")
+                use_gemini = False
+
+        try:
+            # Salvar mensagem do usuário
+            user_message_id = db_manager.save_message(user_id=user_id, message=message, is_user=True)
+
+            # A geração roda em segundo plano e sobrevive a desconexões do cliente
+            def producer(writer):
+                try:
+                    _produce_chat_stream(writer, message, user_id, use_gemini, user_message_id)
+                finally:
+                    if ticket:
+                        ticket.release()
+
+            stream = stream_registry.start(user_message_id, producer, config.SSE_FLUSH_BYTES)
+        except Exception:
+            if ticket:
+                ticket.release()
+            raise
+        return _stream_response(stream)
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+@app.route('/api/chat/stream/<user_message_id>')
+def chat_stream_resume(user_message_id):
+    """
+    Reconecta a um stream em andamento: envia o prefixo já gerado e acompanha o restante
+
+    Exige o token do stream (evento 'meta') no header X-Stream-Token ou em ``?token=``.
+    """
+    last_event = parse_event_id(request.headers.get('Last-Event-ID'))
+    if last_event and last_event[0] == user_message_id:
+        return _resume_stream(*last_event)
+    return _resume_stream(user_message_id, 0, coalesce=True)
+
+def _overloaded_response():
+    """Resposta 503 para requisições recusadas pelo controle de admissão"""
+    response = jsonify({'error': 'Servidor sobrecarregado. Tente novamente em instantes.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(config.ADMISSION_RETRY_AFTER)
+    return response
+
+def _produce_chat_stream(writer, message: str, user_id: str, use_gemini: bool, user_message_id,
+                         context: Optional[str] = None) -> str:
+    """
+    Gera a resposta de um stream e a salva uma única vez ao final
+
+    ``context`` já formatado evita reler as mensagens recentes do banco
+    (sessões WebSocket mantêm o contexto em memória). Retorna o texto salvo.
+    """
+    # O token só é enviado a quem iniciou o stream e é exigido na retomada
+    writer.event('meta', {'stream_id': user_message_id, 'token': writer.sink.token})
+    
+    full_text = ''
+    cached_text = None
+    streamed_text = ''
+    # Origem, tokens e latência da resposta (message_usage); só no caminho do Gemini
+    usage = None
+    gemini_ready = use_gemini and chatbot.gemini_integration and chatbot.gemini_integration.is_available()
+    if gemini_ready:
+        if context is None:
+            context = chatbot._get_conversation_context_for_gemini(user_id)
+        # Resposta pré-gerada ou de pergunta similar já respondida
+        usage = {}
+        for source, lookup in (('precomputed', chatbot.precomputed.lookup),
+                               ('semantic_cache', lambda text: chatbot.lookup_semantic_cache(text, user_id, context))):
+            cached_text = lookup(message)
+            if cached_text is not None:
+                usage['source'] = source
+                break
+    if cached_text is not None:
+        # Resposta já conhecida: enviar de uma vez
+        full_text = cached_text
+        writer.event('chunk', {'text': full_text})
+    elif gemini_ready:
+        chunks = with_heartbeat(
+            chatbot.gemini_integration.generate_stream(message, context, usage=usage),
+            config.SSE_HEARTBEAT_INTERVAL
+        )
+        accumulated = []
+        for text in chunks:
+            if text is HEARTBEAT:
+                # Enviar texto pendente para não segurar o cliente
+                writer.flush()
+                continue
+            if not text:
+                continue
+            accumulated.append(text)
+            writer.write(text)
+        writer.flush()
+        full_text = streamed_text = ''.join(accumulated)
+    
+    if not full_text:
+        # Sem Gemini (ou sem resposta): usar resposta padrão de uma vez
+        full_text = chatbot._get_default_response(message)
+        writer.event('chunk', {'text': full_text})
+    
+    # Salvar resposta completa
+    bot_message_id = db_manager.save_message(user_id=user_id, message=full_text, is_user=False,
+                                             parent_message_id=user_message_id, usage=usage)
+    writer.event('end', {'saved': bot_message_id is not None, 'message_id': bot_message_id})
+    if streamed_text and usage.get('source') in ('gemini', 'response_cache'):
+        # Stream do Gemini concluído sem erro (e já salvo): guardar para perguntas similares
+        chatbot.store_semantic_cache(message, user_id, context,
+                                     chatbot.gemini_integration._clean_response_text(streamed_text))
+    return full_text
+
+def _resume_stream(stream_id: str, last_seq: int, coalesce: bool = False):
+    """Reenvia os eventos de um stream registrado (com o token do cliente) e acompanha o restante ao vivo"""
+    token = request.headers.get(STREAM_TOKEN_HEADER) or request.args.get('token')
+    stream = stream_registry.get(stream_id, token)
+    if stream is None:
+        return jsonify({'error': 'Stream expirado ou desconhecido'}), 410
+    return _stream_response(stream, last_seq, coalesce)
+
+def _stream_response(stream, after_seq: int = 0, coalesce: bool = False):
+    def event_stream():
+        yield format_retry(config.SSE_RETRY_MS)
+        yield from stream.follow(after_seq, config.SSE_HEARTBEAT_INTERVAL, coalesce)
+
+    return Response(event_stream(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 @app.route('/api/history/<user_id>')
 def get_history(user_id):
-    """Obter histórico de conversas do usuário"""
+    """
+    Obter histórico de conversas do usuário
+
+    Com ``?after_id=N`` retorna apenas as mensagens com id maior que N (em
+    páginas de até HISTORY_PAGE_SIZE), para o cliente completar o cache local.
+    """
     try:
-        history = db_manager.get_user_history(user_id)
-        return jsonify({'history': history})
+        if 'after_id' not in request.args:
+            history = db_manager.get_user_history(user_id)
+            return jsonify({'history': history})
+        
+        after_id = max(request.args.get('after_id', 0, type=int), 0)
+        return jsonify(_history_page(user_id, after_id, request.args.get('limit', type=int)))
     except Exception as e:
         return jsonify({'error': f'Erro ao obter histórico: {str(e)}'}), 500
 
+def _history_page(user_id: str, after_id: int, limit: Optional[int] = None) -> dict:
+    """Mensagens do usuário com id maior que ``after_id`` (HTTP e WebSocket)"""
+    limit = max(min(limit or config.HISTORY_PAGE_SIZE, config.HISTORY_PAGE_SIZE), 1)
+    page = db_manager.get_messages_page(after_id, limit, None, user_id)
+    latest = db_manager.get_recent_messages(user_id, 1)
+    return {
+        'history': [
+            {'id': row[0], 'message': row[2], 'is_user': row[3],
+             'created_at': row[4], 'parent_message_id': row[5]}
+            for row in page
+        ],
+        'has_more': len(page) >= limit,
+        # Permite ao cliente detectar um cache local mais novo que o servidor (histórico apagado)
+        'latest_id': latest[-1]['id'] if latest else 0
+    }
+
+# Chat via WebSocket: uma conexão por sessão do navegador (requer flask-sock)
+chat_sockets = ChatSocketServer(
+    app, config, chatbot, db_manager,
+    produce=_produce_chat_stream,
+    history_page=_history_page,
+    admission=admission['stream'],
+    rate_limiter=rate_limiter,
+    streams=stream_registry
+)
+
+@app.route('/api/history/<user_id>/export')
+def export_history(user_id):
+    """Exporta o histórico completo em NDJSON (use ?compress=gzip para comprimir)"""
+    chunks = export_ndjson(db_manager, user_id, config.EXPORT_BATCH_SIZE)
+    filename = f"history-{secure_filename(user_id) or 'user'}.ndjson"
+    if request.args.get('compress') == 'gzip':
+        return Response(gzip_chunks(chunks), mimetype='application/gzip',
+                        headers={'Content-Disposition': f'attachment; filename="{filename}.gz"'})
+    return Response(chunks, mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @app.route('/api/user', methods=['POST'])
 def create_user():
     """Criar ou atualizar dados do usuário"""
@@ -140,18 +413,32 @@ def create_user():
 
 @app.route('/api/health')
 def health_check():
-    """Verificar saúde da API"""
-    try:
-        gemini_available = chatbot.gemini_integration.is_available() if chatbot.gemini_integration else False
-    except Exception:
-        gemini_available = False
+    """Verificar saúde da API (snapshot mantido pelo monitor em segundo plano)"""
+    snapshot = health_monitor.snapshot()
     return jsonify({
-        'status': 'healthy',
+        'status': snapshot['status'],
         'timestamp': datetime.now().isoformat(),
-        'database': 'connected' if db_manager.test_connection() else 'disconnected',
-        'gemini': 'available' if gemini_available else 'unavailable'
+        'database': snapshot['database'],
+        'gemini': snapshot['gemini'],
+        'checked_at': snapshot['checked_at']
     })
 
+@app.route('/api/health/live')
+def health_live():
+    """Liveness: o processo está respondendo"""
+    return jsonify({'status': 'alive'})
+
+@app.route('/api/health/ready')
+def health_ready():
+    """Readiness: o banco de dados está acessível segundo a última verificação"""
+    snapshot = health_monitor.snapshot()
+    ready = health_monitor.is_ready()
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'database': snapshot['database'],
+        'checked_at': snapshot['checked_at']
+    }), 200 if ready else 503
+
 @app.route('/api/gemini/status')
 def gemini_status():
     """Detalhes sobre o estado da integração do Gemini"""
@@ -159,19 +446,130 @@ def gemini_status():
         info = chatbot.gemini_integration.get_model_info() if chatbot.gemini_integration else {'available': False}
     except Exception as e:
         info = {'available': False, 'error': str(e)}
+    info['latency'] = chatbot.get_latency_stats()
+    info['semantic_cache'] = chatbot.semantic_cache.get_stats() if chatbot.semantic_cache else {'enabled': False}
+    info['precomputed'] = chatbot.precomputed.get_stats()
+    info['faq'] = chatbot.faq.get_stats()
+    info['streams'] = stream_registry.stats()
+    info['admission'] = {route: controller.stats() for route, controller in admission.items()}
+    info['rate_limit'] = rate_limiter.get_stats()
+    info['websocket'] = chat_sockets.get_stats()
     return jsonify(info)
 
 @app.route('/api/gemini/test')
 def gemini_test():
-    """Faz um teste simples direto no Gemini"""
+    """Resultado da última verificação do Gemini (use ?refresh=1 para verificar agora)"""
     try:
         if not chatbot.gemini_integration or not chatbot.gemini_integration.is_available():
             return jsonify({'ok': False, 'error': 'Gemini indisponível'}), 400
-        resp = chatbot.gemini_integration.generate_response("Diga apenas: OK", None)
-        return jsonify({'ok': True, 'response': resp})
+        if request.args.get('refresh'):
+            snapshot = health_monitor.refresh(force_gemini=True)
+        else:
+            snapshot = health_monitor.snapshot()
+        status = snapshot['details'].get('gemini', {})
+        return jsonify({
+            'ok': status.get('status') == 'available',
+            'latency_ms': status.get('latency_ms'),
+            'error': status.get('error'),
+            'checked_at': status.get('checked_at')
+        })
     except Exception as e:
         return jsonify({'ok': False, 'error': str(e)}), 500
 
+def _require_admin():
+    """Retorna uma resposta de erro se o token administrativo for exigido e não conferir"""
+    if config.ADMIN_TOKEN and request.headers.get('X-Admin-Token') != config.ADMIN_TOKEN:
+        return jsonify({'error': 'Não autorizado'}), 401
+    return None
+
+@app.route('/api/admin/stats')
+def admin_stats():
+    """Estatísticas agregadas do armazenamento (todos os shards)"""
+    denied = _require_admin()
+    if denied:
+        return denied
+    try:
+        stats = db_manager.get_global_stats()
+        stats['response_templates'] = db_manager.get_template_stats()
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({'error': f'Erro ao obter estatísticas: {str(e)}'}), 500
+
+@app.route('/api/admin/usage')
+def admin_usage():
+    """
+    Tokens, acertos de cache e latência das respostas (message_usage)
+
+    Parâmetros: ``group_by`` (user, model, source ou day), ``order_by``
+    (tokens, latency ou messages), ``days`` (janela, padrão 7; 0 = tudo) e
+    ``limit`` (grupos retornados, padrão 20).
+    """
+    denied = _require_admin()
+    if denied:
+        return denied
+    group_by = request.args.get('group_by', 'user')
+    order_by = request.args.get('order_by', 'tokens')
+    if group_by not in USAGE_GROUPS or order_by not in USAGE_ORDERS:
+        return jsonify({'error': f"group_by deve ser um de {', '.join(USAGE_GROUPS)} "
+                                 f"e order_by um de {', '.join(USAGE_ORDERS)}"}), 400
+    days = max(request.args.get('days', 7, type=int), 0)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 1000)
+    # created_at é gravado em UTC (CURRENT_TIMESTAMP)
+    since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S') if days else None
+    try:
+        return jsonify(db_manager.get_usage_report(since, group_by, limit, order_by))
+    except Exception as e:
+        return jsonify({'error': f'Erro ao obter uso: {str(e)}'}), 500
+
+@app.route('/api/intents/classify', methods=['POST'])
+def intents_classify():
+    """Classifica um lote de mensagens em intenções (sem gerar respostas)"""
+    try:
+        data = request.get_json()
+        messages = data.get('messages', [])
+        if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+            return jsonify({'error': 'Envie uma lista de textos em "messages"'}), 400
+        if len(messages) > config.INTENTS_MAX_BATCH:
+            return jsonify({'error': f'Lote excede o limite de {config.INTENTS_MAX_BATCH} mensagens'}), 400
+        return jsonify({'intents': classify_intents(messages)})
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+# Análise de intenções em andamento (uma por vez)
+intent_analysis = {'running': False, 'last_result': None}
+intent_analysis_lock = threading.Lock()
+
+def _run_intent_analysis():
+    try:
+        intent_analysis['last_result'] = analyze_messages(db_manager)
+    except Exception as e:
+        print(f"[INTENCOES] Erro na análise: {e}")
+        intent_analysis['last_result'] = {'error': str(e)}
+    finally:
+        intent_analysis['running'] = False
+
+@app.route('/api/admin/intents', methods=['GET', 'POST'])
+def admin_intents():
+    """Distribuição de intenções por dia; POST recalcula em segundo plano"""
+    denied = _require_admin()
+    if denied:
+        return denied
+    if request.method == 'POST':
+        with intent_analysis_lock:
+            if intent_analysis['running']:
+                return jsonify({'status': 'running'}), 409
+            intent_analysis['running'] = True
+        threading.Thread(target=_run_intent_analysis, name='intent-analysis', daemon=True).start()
+        return jsonify({'status': 'started'}), 202
+    try:
+        return jsonify({
+            'running': intent_analysis['running'],
+            'last_run': intent_analysis['last_result'],
+            'stats': db_manager.get_intent_stats()
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erro ao obter intenções: {str(e)}'}), 500
+
 if __name__ == '__main__':
     # Validar configurações
     config_issues = config.validate_config()
@@ -0,0 +1,212 @@
+"""
+Pipeline de arquivos estáticos da interface
+
+Na inicialização cada arquivo de ``static/`` recebe um nome com o hash do
+conteúdo (``js/chat.3f2a9c1b7d4e.js``) e variantes gzip/brotli geradas uma
+única vez. Como o nome muda quando o conteúdo muda, as respostas podem ser
+cacheadas para sempre (``immutable``). A página principal é renderizada uma
+vez e servida com ETag; respostas JSON grandes são comprimidas.
+
+brotli é opcional: sem ele apenas gzip é gerado.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from flask import Response, abort, render_template, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+
+def compressible(mimetype: str) -> bool:
+    """Formatos de texto (imagens e fontes já são comprimidas)"""
+    return mimetype.startswith('text/') or mimetype in (
+        'application/javascript', 'application/json', 'image/svg+xml'
+    )
+
+
+class Asset:
+    """Conteúdo de um arquivo e suas variantes comprimidas"""
+
+    def __init__(self, data: bytes, mimetype: str, mtime: float = 0.0, compress: bool = True):
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.mimetype = mimetype
+        self.mtime = mtime
+        self.variants = {'identity': data}
+        if compress and len(data) > 256:
+            self.variants['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(data, quality=11)
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}-{encoding}"' if encoding != 'identity' else f'"{self.digest}"'
+
+
+def negotiate(available, accept_encoding: str) -> str:
+    """Melhor codificação aceita pelo cliente entre as disponíveis (br > gzip > identity)"""
+    accepted = {
+        part.split(';')[0].strip().lower()
+        for part in accept_encoding.split(',')
+        if not part.strip().endswith(';q=0')
+    }
+    for encoding in ('br', 'gzip'):
+        if encoding in available and encoding in accepted:
+            return encoding
+    return 'identity'
+
+
+def _send(asset: Asset, cache_control: str) -> Response:
+    encoding = negotiate(asset.variants, request.headers.get('Accept-Encoding', ''))
+    etag = asset.etag(encoding)
+    headers = {'Cache-Control': cache_control, 'ETag': etag, 'Vary': 'Accept-Encoding'}
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+
+
+class AssetPipeline:
+    """Integra os arquivos com hash, a página pré-renderizada e a compressão de JSON ao Flask"""
+
+    def __init__(self, app=None, cfg=None):
+        self.cfg = cfg
+        self.assets: Dict[str, Asset] = {}
+        self.fingerprints: Dict[str, str] = {}
+        self._index: Optional[Asset] = None
+        if app is not None:
+            self.init_app(app, cfg)
+
+    def init_app(self, app, cfg):
+        self.app = app
+        self.cfg = cfg
+        self.static_folder = app.static_folder
+        self.build()
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.context_processor(lambda: {'asset_url': self.url})
+        app.after_request(self._compress_json)
+
+    # Arquivos estáticos
+
+    def build(self):
+        """Lê e comprime todos os arquivos de static/"""
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                self._load(os.path.relpath(path, self.static_folder).replace(os.sep, '/'))
+        print(f"[ASSETS] {len(self.assets)} arquivos estáticos preparados"
+              f" ({'gzip + brotli' if brotli else 'gzip'})")
+
+    def _load(self, logical: str) -> Asset:
+        path = os.path.join(self.static_folder, logical)
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(logical)[0] or 'application/octet-stream'
+        old = self.assets.get(logical)
+        asset = Asset(data, mimetype, os.path.getmtime(path), compressible(mimetype))
+        if old is not None:
+            self.fingerprints.pop(self._fingerprinted(logical, old.digest), None)
+        self.assets[logical] = asset
+        self.fingerprints[self._fingerprinted(logical, asset.digest)] = logical
+        return asset
+
+    @staticmethod
+    def _fingerprinted(logical: str, digest: str) -> str:
+        root, ext = os.path.splitext(logical)
+        return f"{root}.{digest}{ext}"
+
+    def _current(self, logical: str) -> Optional[Asset]:
+        asset = self.assets.get(logical)
+        # Em modo debug, arquivos editados são recarregados sem reiniciar
+        if asset is not None and self.cfg.DEBUG:
+            path = os.path.join(self.static_folder, logical)
+            if os.path.exists(path) and os.path.getmtime(path) != asset.mtime:
+                asset = self._load(logical)
+        return asset
+
+    def url(self, logical: str) -> str:
+        """URL com hash de um arquivo de static/ (usada nos templates como asset_url)"""
+        asset = self._current(logical)
+        if asset is None:
+            return f"/static/{logical}"
+        return f"/assets/{self._fingerprinted(logical, asset.digest)}"
+
+    def serve(self, filename: str):
+        logical = self.fingerprints.get(filename)
+        if logical is None:
+            abort(404)
+        return _send(self.assets[logical], IMMUTABLE_CACHE)
+
+    # Página principal
+
+    def index(self) -> Response:
+        """Página principal renderizada uma única vez (revalidada via ETag)"""
+        if self._index is None or self.cfg.DEBUG:
+            html = render_template('index.html').encode('utf-8')
+            if self._index is None or html != self._index.variants['identity']:
+                self._index = Asset(html, 'text/html')
+        return _send(self._index, 'no-cache')
+
+    # Respostas JSON
+
+    def _compress_json(self, response):
+        if (
+            self.cfg.COMPRESS_MIN_SIZE <= 0
+            or response.mimetype != 'application/json'
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+        ):
+            return response
+        data = response.get_data()
+        if len(data) < self.cfg.COMPRESS_MIN_SIZE:
+            return response
+        available = ('br', 'gzip') if brotli is not None else ('gzip',)
+        encoding = negotiate(available, request.headers.get('Accept-Encoding', ''))
+        if encoding == 'identity':
+            return response
+        if encoding == 'br':
+            body = brotli.compress(data, quality=self.cfg.COMPRESS_LEVEL)
+        else:
+            body = gzip.compress(data, compresslevel=self.cfg.COMPRESS_LEVEL)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+if __name__ == "__main__":
+    # Gera os arquivos com hash e as variantes comprimidas em disco (para servir por um proxy)
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Gera arquivos estáticos com hash e variantes comprimidas")
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    parser.add_argument('--output', default='static_dist')
+    args = parser.parse_args()
+
+    manifest = {}
+    extensions = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+    for root, _, files in os.walk(args.static):
+        for name in files:
+            logical = os.path.relpath(os.path.join(root, name), args.static).replace(os.sep, '/')
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            with open(os.path.join(root, name), 'rb') as f:
+                asset = Asset(f.read(), mimetype, compress=compressible(mimetype))
+            target = AssetPipeline._fingerprinted(logical, asset.digest)
+            manifest[logical] = target
+            for encoding, data in asset.variants.items():
+                path = os.path.join(args.output, target + extensions[encoding])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(data)
+    with open(os.path.join(args.output, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"[ASSETS] {len(manifest)} arquivos gerados em {args.output}")
@@ -0,0 +1,304 @@
+"""
+Chat via WebSocket: uma conexão persistente por sessão do navegador
+
+Evita o custo de uma requisição HTTP (e do handshake SSE) por mensagem e
+permite várias respostas em andamento na mesma conexão. Cada mensagem é um
+objeto JSON com ``type``; as respostas carregam o ``id`` da requisição do
+cliente e o ``seq`` do evento.
+
+Cliente -> servidor::
+
+    {"type": "hello", "user_id": "u1"}                         abre (ou troca) a sessão
+    {"type": "send", "id": "c1", "message": "...", "use_gemini": true}
+    {"type": "history", "id": "c2", "after_id": 0, "limit": 100}
+    {"type": "ping"}
+
+Servidor -> cliente::
+
+    {"type": "ready", "user_id": "u1"}
+    {"type": "ack", "id": "c1", "message_id": 41, "token": "..."}  mensagem do usuário gravada
+    {"type": "meta", "id": "c1", "seq": 1, "stream_id": 41, "token": "..."}
+    {"type": "chunk", "id": "c1", "seq": 2, "text": "..."}
+    {"type": "end", "id": "c1", "seq": 3, "saved": true, "message_id": 42}
+    {"type": "history", "id": "c2", "history": [...], "has_more": false, "latest_id": 42}
+    {"type": "error", "id": "c1", "error": "..."}
+    {"type": "pong"}
+
+Depois do ``ack`` a mensagem já está gravada: se a conexão cair, o
+cliente não deve reenviá-la. A resposta também é registrada no
+StreamRegistry com o id da mensagem, então pode ser retomada por
+``GET /api/chat/stream/<message_id>`` com ``Last-Event-ID: <message_id>:<seq>``
+(o ``seq`` do último evento recebido pelo socket) e ``X-Stream-Token`` com o
+``token`` do ``ack``.
+
+O contexto da conversa enviado ao Gemini é lido do banco uma vez no
+``hello`` e depois mantido em memória pela sessão. Depende do flask-sock
+(opcional); sem ele o endpoint não é registrado e o cliente continua
+usando ``/api/chat`` e ``/api/chat/stream`` (SSE).
+"""
+import json
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from sse import EventWriter
+
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:
+    Sock = None
+    ConnectionClosed = Exception
+
+WS_PATH = '/api/chat/ws'
+# Rota cujo limite (RATE_LIMIT_ROUTES) vale para cada mensagem enviada pelo socket
+RATE_LIMIT_RULE = '/api/chat/stream'
+# Mensagens recentes mantidas como contexto (mesmo tamanho do contexto lido do banco)
+CONTEXT_MESSAGES = 6
+
+
+class SocketEventWriter(EventWriter):
+    """
+    EventWriter que guarda os eventos no stream registrado (retomada) e os
+    entrega como objetos JSON da requisição da sessão
+    """
+
+    def __init__(self, session: 'ChatSocketSession', request_id: Any, stream, flush_bytes: int = 0):
+        super().__init__(stream.stream_id, stream, flush_bytes)
+        self.session = session
+        self.request_id = request_id
+
+    def event(self, event: str, data: Any) -> str:
+        frame = super().event(event, data)
+        self.session.send(dict(data, type=event, id=self.request_id, seq=self.seq))
+        return frame
+
+
+class ChatSocketSession:
+    """Uma conexão WebSocket: lê as requisições e multiplexa as respostas"""
+
+    def __init__(self, server: 'ChatSocketServer', ws, ip: str):
+        self.server = server
+        self.ws = ws
+        self.ip = ip
+        self.user_id: Optional[str] = None
+        self.context = deque(maxlen=CONTEXT_MESSAGES)
+        self.closed = False
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def run(self):
+        """Atende a conexão até o cliente fechá-la (respostas em andamento continuam e são salvas)"""
+        try:
+            while True:
+                raw = self.ws.receive()
+                if raw is None:
+                    continue
+                self.handle(raw)
+        except ConnectionClosed:
+            pass
+        finally:
+            self.closed = True
+
+    def send(self, message: Dict) -> bool:
+        """Envia um objeto JSON (seguro entre threads); False se a conexão já fechou"""
+        if self.closed:
+            return False
+        try:
+            with self._send_lock:
+                self.ws.send(json.dumps(message, ensure_ascii=False))
+            return True
+        except ConnectionClosed:
+            self.closed = True
+            return False
+
+    def error(self, request_id: Any, error: str, **extra):
+        self.send(dict(extra, type='error', id=request_id, error=error))
+
+    def handle(self, raw):
+        try:
+            payload = json.loads(raw)
+            kind = payload.get('type')
+        except (ValueError, AttributeError):
+            self.error(None, 'Mensagem inválida (JSON esperado)')
+            return
+        handler = {
+            'hello': self._hello,
+            'send': self._send_message,
+            'history': self._history,
+            'ping': lambda _: self.send({'type': 'pong'})
+        }.get(kind)
+        if handler is None:
+            self.error(payload.get('id'), f'Tipo desconhecido: {kind}')
+            return
+        try:
+            handler(payload)
+        except Exception as e:
+            print(f"[WS] Erro ao tratar '{kind}': {e}")
+            self.error(payload.get('id'), f'Erro interno: {str(e)}')
+
+    def _hello(self, payload: Dict):
+        """Define o usuário da sessão e carrega o contexto recente do banco (uma única vez)"""
+        self.user_id = str(payload.get('user_id') or 'anonymous')
+        recent = self.server.db_manager.get_recent_messages(self.user_id, CONTEXT_MESSAGES)
+        with self._lock:
+            self.context = deque(recent, maxlen=CONTEXT_MESSAGES)
+        self.send({'type': 'ready', 'user_id': self.user_id})
+
+    def _remember(self, message: str, is_user: bool) -> str:
+        """Acrescenta uma mensagem ao contexto em memória e o devolve formatado"""
+        with self._lock:
+            self.context.append({'message': message, 'is_user': is_user})
+            return self.server.format_context(list(self.context))
+
+    def _send_message(self, payload: Dict):
+        request_id = payload.get('id')
+        message = str(payload.get('message') or '').strip()
+        use_gemini = bool(payload.get('use_gemini', False))
+        if self.user_id is None:
+            self.error(request_id, "Envie 'hello' com o user_id antes das mensagens")
+            return
+        if not message:
+            self.error(request_id, 'Mensagem não pode estar vazia')
+            return
+        # Contador do servidor: ids repetidos ou ausentes não escapam do limite
+        with self._lock:
+            if self._in_flight >= self.server.cfg.WS_MAX_IN_FLIGHT:
+                self.error(request_id, 'Muitas respostas em andamento nesta conexão')
+                return
+            self._in_flight += 1
+
+        try:
+            # Mesmo limite do streaming via SSE
+            limited = self.server.rate_limiter.check_event(RATE_LIMIT_RULE, self.ip, self.user_id)
+        except Exception:
+            self._finish()
+            raise
+        if limited is not None and not limited[0]:
+            self.server.count('rate_limited')
+            self.error(request_id, 'Muitas requisições. Tente novamente em instantes.',
+                       retry_after=max(1, round(limited[3])))
+            self._finish()
+            return
+
+        # A espera por uma vaga (admissão) não pode travar o loop de leitura da conexão
+        user_id = self.user_id
+        threading.Thread(target=self._respond, args=(request_id, message, user_id, use_gemini),
+                         name=f'ws-{user_id}', daemon=True).start()
+
+    def _respond(self, request_id: Any, message: str, user_id: str, use_gemini: bool):
+        """Admite, grava a mensagem e gera a resposta (thread própria por mensagem)"""
+        ticket = None
+        writer = None
+        try:
+            if use_gemini:
+                ticket = self.server.admission.acquire(user_id)
+                if ticket is None:
+                    if self.server.cfg.ADMISSION_OVERLOAD_MODE != 'degrade':
+                        self.error(request_id, 'Servidor sobrecarregado. Tente novamente em instantes.',
+                                   retry_after=self.server.cfg.ADMISSION_RETRY_AFTER)
+                        return
+                    print("[ADMISSAO] Sobrecarga - WebSocket sem Gemini")
+                    use_gemini = False
+
+            user_message_id = self.server.db_manager.save_message(user_id=user_id, message=message, is_user=True)
+            context = self._remember(message, True)
+            stream = self.server.streams.register(user_message_id)
+            self.server.count('messages')
+            # Antes de qualquer evento do produtor: o cliente não reenvia uma mensagem já gravada
+            self.send({'type': 'ack', 'id': request_id, 'message_id': user_message_id, 'token': stream.token})
+            writer = SocketEventWriter(self, request_id, stream, self.server.cfg.SSE_FLUSH_BYTES)
+
+            # A geração não depende da conexão: a resposta é salva mesmo se o cliente sair
+            full_text = self.server.produce(writer, message, user_id, use_gemini, user_message_id, context)
+            if user_id == self.user_id:
+                self._remember(full_text, False)
+        except Exception as e:
+            print(f"[WS] Erro na resposta de {user_id}: {e}")
+            if writer is None:
+                self.error(request_id, f'Erro interno: {str(e)}')
+            else:
+                writer.flush()
+                writer.event('error', {'error': str(e)})
+        finally:
+            if writer is not None:
+                writer.close()
+            if ticket:
+                ticket.release()
+            self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _history(self, payload: Dict):
+        if self.user_id is None:
+            self.error(payload.get('id'), "Envie 'hello' com o user_id antes do histórico")
+            return
+        try:
+            after_id = max(int(payload.get('after_id') or 0), 0)
+            limit = int(payload.get('limit') or 0) or None
+        except (TypeError, ValueError):
+            self.error(payload.get('id'), 'after_id e limit devem ser números')
+            return
+        page = self.server.history_page(self.user_id, after_id, limit)
+        self.send(dict(page, type='history', id=payload.get('id')))
+
+
+class ChatSocketServer:
+    """
+    Registra o endpoint ``WS_PATH`` no app (se o flask-sock estiver
+    instalado e ``WS_ENABLED``) e guarda as dependências das sessões
+    """
+
+    def __init__(self, app, cfg, chatbot, db_manager, produce: Callable, history_page: Callable,
+                 admission, rate_limiter, streams):
+        self.cfg = cfg
+        self.db_manager = db_manager
+        self.streams = streams
+        self.format_context = chatbot.format_context
+        self.produce = produce
+        self.history_page = history_page
+        self.admission = admission
+        self.rate_limiter = rate_limiter
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.stats = {'connections': 0, 'active': 0, 'messages': 0, 'rate_limited': 0}
+        self.init_app(app, cfg)
+
+    def init_app(self, app, cfg):
+        # A rota é registrada na inicialização: mudar WS_ENABLED exige reiniciar
+        if not cfg.WS_ENABLED:
+            return
+        if Sock is None:
+            print("[WS] flask-sock não instalado - chat apenas via HTTP/SSE")
+            return
+        app.config['SOCK_SERVER_OPTIONS'] = {
+            'ping_interval': cfg.WS_PING_INTERVAL or None,
+            'max_message_size': cfg.WS_MAX_MESSAGE_BYTES
+        }
+        sock = Sock(app)
+        sock.route(WS_PATH)(self._serve)
+        self.enabled = True
+        print(f"[WS] Chat via WebSocket em {WS_PATH}")
+
+    def _serve(self, ws):
+        from flask import request
+        ip = self.rate_limiter.client_ip(request)
+        self.count('connections')
+        self.count('active')
+        try:
+            ChatSocketSession(self, ws, ip).run()
+        finally:
+            self.count('active', -1)
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({'enabled': self.enabled, 'path': WS_PATH if self.enabled else None})
+        return stats
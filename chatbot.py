@@ -1,9 +1,52 @@
 import random
 import json
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from typing import Dict, List, Optional
-from database import DatabaseManager
+from storage import StorageBackend
 from gemini_integration import GeminiIntegration
+from config import config, config_store
+from profiling import span, timed, bind_context
+from semantic_cache import create_semantic_cache
+from intents import classify_intent
+from precomputed import PrecomputedAnswers
+from faq import FaqEngine
+
+# Respostas padrão por intenção (salvas por referência em response_templates)
+DEFAULT_RESPONSES = {
+    'greeting': [
+        "Olá! Como posso ajudá-lo hoje?",
+        "Oi! Estou aqui para conversar com você!",
+        "Olá! Que bom te ver por aqui!"
+    ],
+    'how_works': [
+        "Sou um chatbot inteligente que pode conversar sobre diversos tópicos. Posso responder perguntas, contar curiosidades e até mesmo usar IA avançada quando necessário!",
+        "Funciono através de processamento de linguagem natural e posso me conectar com APIs como o Gemini para respostas mais sofisticadas.",
+        "Sou programado para entender contexto e manter conversas naturais. Use a opção 'Usar Gemini AI' para respostas mais avançadas!"
+    ],
+    'curiosity': [
+        "Você sabia que o cérebro humano tem cerca de 86 bilhões de neurônios?",
+        "Curiosidade: A língua de uma girafa pode medir até 50 centímetros!",
+        "Interessante: O coração de uma baleia azul é tão grande que um humano poderia nadar através de suas artérias!",
+        "Fato curioso: O mel nunca estraga - arqueólogos encontraram mel comestível em tumbas egípcias de 3000 anos!"
+    ],
+    'gemini_info': [
+        "O Gemini é uma IA avançada do Google que pode gerar respostas mais sofisticadas e contextualizadas. Quando ativado, suas perguntas serão processadas por essa IA para respostas mais detalhadas.",
+        "Para usar o Gemini, marque a opção 'Usar Gemini AI' antes de enviar sua mensagem. Isso permitirá respostas mais inteligentes e contextualizadas!",
+        "O Gemini pode ajudar com análises complexas, explicações detalhadas e respostas mais criativas. Experimente ativá-lo para uma experiência mais avançada!"
+    ],
+    'default': [
+        "Interessante! Pode me contar mais sobre isso?",
+        "Entendo. Como posso ajudá-lo melhor?",
+        "Que legal! Tem mais alguma coisa que gostaria de saber?",
+        "Obrigado por compartilhar! O que mais posso fazer por você?"
+    ]
+}
+
 
 class ChatBot:
     """
@@ -11,43 +54,51 @@ class ChatBot:
     e integração com diferentes fontes de resposta
     """
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: StorageBackend):
         self.db_manager = db_manager
         self.responses = self._load_responses()
+        # Respostas padrão passam a ser salvas só como referência (template_id)
+        self.db_manager.register_response_templates(
+            [text for texts in self.responses.values() for text in texts]
+        )
         self.gemini_integration = None
+        
+        # Pool para chamadas ao Gemini (permite hedging e prazo máximo)
+        self._gemini_executor = ThreadPoolExecutor(
+            max_workers=config.GEMINI_MAX_WORKERS,
+            thread_name_prefix='gemini'
+        )
+        # Respostas que chegaram depois do prazo, reaproveitadas na próxima vez
+        self._late_responses = OrderedDict()
+        # Tokens cobrados sem mensagem própria (hedge perdedor, resposta
+        # atrasada descartada): somados à próxima resposta do mesmo usuário
+        self._carried_tokens = {}
+        self._stats_lock = threading.Lock()
+        self.latency_stats = {
+            'requests': 0,
+            'hedged': 0,
+            'hedge_wins': 0,
+            'timeouts': 0,
+            'late_cached': 0,
+            'late_hits': 0
+        }
+        
+        # Cache semântico de respostas do Gemini (opcional, SEMANTIC_CACHE_ENABLED)
+        self.semantic_cache = create_semantic_cache(config)
+        atexit.register(self._save_semantic_cache)
+        
         self._initialize_gemini()
+        config_store.subscribe(self._on_config_change)
+        
+        # Respostas pré-geradas para os prompts de sugestão (aquecimento iniciado pelo app)
+        self.precomputed = PrecomputedAnswers(db_manager, lambda: self.gemini_integration, config)
+        
+        # Perguntas frequentes respondidas localmente (respostas também salvas como modelos)
+        self.faq = FaqEngine(config, on_reload=self.db_manager.register_response_templates)
         
     def _load_responses(self) -> Dict[str, List[str]]:
         """Carrega respostas padrão do chatbot"""
-        return {
-            'greeting': [
-                "Olá! Como posso ajudá-lo hoje?",
-                "Oi! Estou aqui para conversar com você!",
-                "Olá! Que bom te ver por aqui!"
-            ],
-            'how_works': [
-                "Sou um chatbot inteligente que pode conversar sobre diversos tópicos. Posso responder perguntas, contar curiosidades e até mesmo usar IA avançada quando necessário!",
-                "Funciono através de processamento de linguagem natural e posso me conectar com APIs como o Gemini para respostas mais sofisticadas.",
-                "Sou programado para entender contexto e manter conversas naturais. Use a opção 'Usar Gemini AI' para respostas mais avançadas!"
-            ],
-            'curiosity': [
-                "Você sabia que o cérebro humano tem cerca de 86 bilhões de neurônios?",
-                "Curiosidade: A língua de uma girafa pode medir até 50 centímetros!",
-                "Interessante: O coração de uma baleia azul é tão grande que um humano poderia nadar através de suas artérias!",
-                "Fato curioso: O mel nunca estraga - arqueólogos encontraram mel comestível em tumbas egípcias de 3000 anos!"
-            ],
-            'gemini_info': [
-                "O Gemini é uma IA avançada do Google que pode gerar respostas mais sofisticadas e contextualizadas. Quando ativado, suas perguntas serão processadas por essa IA para respostas mais detalhadas.",
-                "Para usar o Gemini, marque a opção 'Usar Gemini AI' antes de enviar sua mensagem. Isso permitirá respostas mais inteligentes e contextualizadas!",
-                "O Gemini pode ajudar com análises complexas, explicações detalhadas e respostas mais criativas. Experimente ativá-lo para uma experiência mais avançada!"
-            ],
-            'default': [
-                "Interessante! Pode me contar mais sobre isso?",
-                "Entendo. Como posso ajudá-lo melhor?",
-                "Que legal! Tem mais alguma coisa que gostaria de saber?",
-                "Obrigado por compartilhar! O que mais posso fazer por você?"
-            ]
-        }
+        return {intent: list(texts) for intent, texts in DEFAULT_RESPONSES.items()}
     
     def process_message(self, message: str, user_id: str, use_gemini: bool = False) -> Dict:
         """
@@ -63,28 +114,33 @@ class ChatBot:
         """
         try:
             # Salvar mensagem do usuário
-            user_message_id = self.db_manager.save_message(
-                user_id=user_id,
-                message=message,
-                is_user=True
-            )
+            with span('save_message'):
+                user_message_id = self.db_manager.save_message(
+                    user_id=user_id,
+                    message=message,
+                    is_user=True
+                )
             
-            # Gerar resposta
+            # Gerar resposta (no caminho do Gemini, com tokens e latência para message_usage)
+            usage = None
             if use_gemini and self.gemini_integration and self.gemini_integration.is_available():
                 print("[GEMINI] Chamando Gemini para gerar resposta...")
-                response_text = self._get_gemini_response(message, user_id)
+                usage = {}
+                response_text = self._get_gemini_response(message, user_id, usage=usage)
             else:
                 if use_gemini:
                     print("[GEMINI] Gemini não disponível, usando resposta padrão")
                 response_text = self._get_default_response(message)
             
             # Salvar resposta do bot
-            bot_message_id = self.db_manager.save_message(
-                user_id=user_id,
-                message=response_text,
-                is_user=False,
-                parent_message_id=user_message_id
-            )
+            with span('save_message'):
+                bot_message_id = self.db_manager.save_message(
+                    user_id=user_id,
+                    message=response_text,
+                    is_user=False,
+                    parent_message_id=user_message_id,
+                    usage=usage
+                )
             
             return {
                 'message': response_text,
@@ -100,31 +156,113 @@ class ChatBot:
                 'message_id': None
             }
     
-    def _get_default_response(self, message: str) -> str:
-        """Gera resposta padrão baseada na mensagem"""
-        message_lower = message.lower()
+    def process_messages(self, batch: List[Dict], admission=None) -> List[Dict]:
+        """
+        Processa um lote de mensagens (uso offline/em massa)
         
-        # Detectar intenções
-        if any(word in message_lower for word in ['olá', 'oi', 'hello', 'hi']):
-            return random.choice(self.responses['greeting'])
+        Respostas padrão são resolvidas diretamente, chamadas ao Gemini são
+        distribuídas em um pool limitado de workers e todas as mensagens são
+        salvas em uma única transação.
         
-        elif any(word in message_lower for word in ['como', 'funciona', 'funcionar']):
-            return random.choice(self.responses['how_works'])
+        Args:
+            batch: Lista de dicts com message, user_id e use_gemini (opcional)
+            admission: AdmissionController que limita as chamadas ao Gemini (opcional)
+            
+        Returns:
+            Lista de dicts com resposta, timestamp e ID da mensagem, na mesma ordem do lote
+        """
+        results: List[Optional[Dict]] = [None] * len(batch)
+        responses: List[Optional[str]] = [None] * len(batch)
+        usages: List[Optional[Dict]] = [None] * len(batch)
+        gemini_indexes = []
+        gemini_ready = bool(self.gemini_integration and self.gemini_integration.is_available())
         
-        elif any(word in message_lower for word in ['curiosidade', 'curioso', 'sabia', 'fato']):
-            return random.choice(self.responses['curiosity'])
+        for index, item in enumerate(batch):
+            message = (item.get('message') or '').strip()
+            if not message:
+                results[index] = {'error': 'Mensagem não pode estar vazia'}
+            elif item.get('use_gemini', False) and gemini_ready:
+                gemini_indexes.append(index)
+            else:
+                responses[index] = self._get_default_response(message)
         
-        elif any(word in message_lower for word in ['gemini', 'ia', 'inteligência']) and 'conte' not in message_lower and 'piada' not in message_lower:
-            return random.choice(self.responses['gemini_info'])
+        if gemini_indexes:
+            print(f"[LOTE] Enviando {len(gemini_indexes)} mensagens ao Gemini")
+            
+            def generate(index: int) -> Optional[str]:
+                # Uma vaga do controle de admissão por chamada; None = recusada
+                message = batch[index]['message'].strip()
+                user_id = batch[index].get('user_id', 'anonymous')
+                ticket = admission.acquire(user_id) if admission is not None else None
+                if admission is not None and ticket is None:
+                    usages[index] = None
+                    if config.ADMISSION_OVERLOAD_MODE != 'degrade':
+                        return None
+                    print("[ADMISSAO] Sobrecarga - item do lote sem Gemini")
+                    return self._get_default_response(message)
+                try:
+                    return self._get_gemini_response(message, user_id, usage=usages[index])
+                finally:
+                    if ticket:
+                        ticket.release()
+            
+            with ThreadPoolExecutor(max_workers=config.BATCH_MAX_WORKERS, thread_name_prefix='batch') as executor:
+                futures = {}
+                for index in gemini_indexes:
+                    usages[index] = {}
+                    futures[index] = executor.submit(bind_context(generate), index)
+                for index, future in futures.items():
+                    try:
+                        responses[index] = future.result()
+                    except Exception as e:
+                        print(f"[LOTE] Erro ao usar Gemini: {e}")
+                        usages[index] = {'source': 'error'}
+                        responses[index] = self._get_default_response(batch[index]['message'])
+                    if responses[index] is None:
+                        results[index] = {'error': 'Servidor sobrecarregado. Tente novamente em instantes.'}
+        
+        pending = [index for index, result in enumerate(results) if result is None]
+        turns = [
+            {
+                'user_id': batch[index].get('user_id', 'anonymous'),
+                'message': batch[index]['message'].strip(),
+                'response': responses[index],
+                'usage': usages[index]
+            }
+            for index in pending
+        ]
+        with span('save_message'):
+            saved_ids = self.db_manager.save_conversation_turns(turns) if turns else []
+        
+        timestamp = datetime.now().isoformat()
+        for index, ids in zip(pending, saved_ids):
+            results[index] = {
+                'message': responses[index],
+                'timestamp': timestamp,
+                'message_id': ids[1] if ids else None
+            }
         
-        else:
-            return random.choice(self.responses['default'])
+        return results
+    
+    def _get_default_response(self, message: str) -> str:
+        """Gera resposta padrão baseada na mensagem"""
+        # Pergunta frequente antes das intenções (a regra 'como' captaria quase todas)
+        faq_response = self.faq.answer(message)
+        if faq_response is not None:
+            return faq_response
+        # Detectar intenções (regras compartilhadas com a análise em lote, intents.py)
+        return random.choice(self.responses[classify_intent(message)])
     
     def _initialize_gemini(self):
         """Inicializa integração com Gemini se disponível"""
         try:
-            # Tentar obter chave da API do banco de dados
-            api_key = self.db_manager.get_system_config('gemini_api_key')
+            # Chave da API vem do snapshot de configuração (ambiente ou system_config)
+            api_key = config.GEMINI_API_KEY
+            
+            # Conexões do transporte REST anterior não serão mais usadas
+            previous = getattr(self, 'gemini_integration', None)
+            if previous is not None:
+                previous.close()
             
             if api_key:
                 self.gemini_integration = GeminiIntegration(api_key)
@@ -133,32 +271,113 @@ class ChatBot:
                 else:
                     print("[AVISO] Gemini configurado mas não disponível")
             else:
+                self.gemini_integration = None
                 print("[INFO] Gemini não configurado - usando respostas padrão")
                 
         except Exception as e:
             print(f"[ERRO] Erro ao inicializar Gemini: {e}")
             self.gemini_integration = None
     
-    def _get_gemini_response(self, message: str, user_id: str = 'current_user') -> str:
+    def _on_config_change(self, old, new):
+        """Reinicializa o Gemini quando a chave, o modelo ou o transporte mudam"""
+        gemini_keys = ['GEMINI_API_KEY', 'GEMINI_MODEL', 'GEMINI_TRANSPORT', 'GEMINI_API_BASE',
+                       'GEMINI_POOL_SIZE', 'GEMINI_CONNECT_TIMEOUT', 'GEMINI_READ_TIMEOUT',
+                       'GEMINI_ROUTER_ENABLED', 'GEMINI_FAST_MODEL', 'GEMINI_STRONG_MODEL',
+                       'GEMINI_ROUTER_THRESHOLD', 'GEMINI_FAST_CONCURRENCY', 'GEMINI_STRONG_CONCURRENCY',
+                       'GEMINI_FAST_LATENCY_TARGET', 'GEMINI_STRONG_LATENCY_TARGET', 'GEMINI_ROUTER_WINDOW',
+                       'RESPONSE_CACHE_ENABLED', 'RESPONSE_CACHE_PATH', 'RESPONSE_CACHE_TTL',
+                       'RESPONSE_CACHE_MAX_ENTRIES']
+        if any(getattr(old, key) != getattr(new, key) for key in gemini_keys):
+            print(f"[CONFIG] Reinicializando Gemini (modelo: {new.GEMINI_MODEL})")
+            self._initialize_gemini()
+            # Respostas do modelo/chave anterior não são mais servidas; regerar
+            answer_keys = ['GEMINI_API_KEY', 'GEMINI_MODEL', 'GEMINI_API_BASE', 'GEMINI_ROUTER_ENABLED',
+                           'GEMINI_FAST_MODEL', 'GEMINI_STRONG_MODEL']
+            if any(getattr(old, key) != getattr(new, key) for key in answer_keys):
+                self.precomputed.invalidate()
+            self.precomputed.trigger(force=True)
+        elif old.PRECOMPUTED_PROMPTS != new.PRECOMPUTED_PROMPTS:
+            self.precomputed.trigger()
+        cache_keys = [key for key in new.as_dict() if key.startswith('SEMANTIC_CACHE_')]
+        if any(getattr(old, key) != getattr(new, key) for key in cache_keys):
+            print("[CONFIG] Recriando cache semântico")
+            self._save_semantic_cache()
+            self.semantic_cache = create_semantic_cache(new)
+    
+    def _get_gemini_response(self, message: str, user_id: str = 'current_user',
+                             hedge_delay: Optional[float] = None,
+                             deadline: Optional[float] = None,
+                             usage: Optional[Dict] = None) -> str:
         """
         Gera resposta usando integração com Gemini
+        
+        Args:
+            message: Mensagem do usuário
+            user_id: ID do usuário
+            hedge_delay: Segundos até disparar uma segunda requisição (padrão: GEMINI_HEDGE_DELAY)
+            deadline: Prazo máximo em segundos antes de usar a resposta padrão (padrão: GEMINI_HARD_TIMEOUT)
+            usage: Dict preenchido com a origem da resposta, tokens e latência (usage.py)
         """
+        usage = {} if usage is None else usage
         if not self.gemini_integration or not self.gemini_integration.is_available():
             print("[GEMINI] Fallback para resposta padrão - Gemini não disponível")
+            usage['source'] = 'error'
             return self._get_default_response(message)
         
         try:
+            # Resposta que chegou atrasada em uma chamada anterior
+            late_key = self._late_response_key(user_id, message)
+            late_response = self._pop_late_response(late_key)
+            if late_response is not None:
+                print("[GEMINI] Usando resposta atrasada armazenada anteriormente")
+                # Tokens da chamada que estourou o prazo, cobrados mesmo assim
+                usage.update(
+                    source='late',
+                    model=late_response.get('model'),
+                    prompt_tokens=late_response.get('prompt_tokens', 0),
+                    output_tokens=late_response.get('output_tokens', 0)
+                )
+                return late_response['response']
+            
+            # Prompt comum com resposta pré-gerada (sem chamada ao Gemini)
+            precomputed_response = self.precomputed.lookup(message)
+            if precomputed_response is not None:
+                print("[PRECOMPUTADO] Usando resposta pré-gerada")
+                usage['source'] = 'precomputed'
+                return precomputed_response
+            
             # Obter contexto da conversa recente
             context = self._get_conversation_context_for_gemini(user_id)
             print(f"[GEMINI] Contexto da conversa obtido: {len(context)} caracteres")
             
-            # Gerar resposta com Gemini
-            response = self.gemini_integration.generate_response(message, context)
+            # Pergunta similar já respondida (só sem conversa anterior)
+            cached_response = self.lookup_semantic_cache(message, user_id, context)
+            if cached_response is not None:
+                print("[CACHE] Usando resposta do cache semântico")
+                usage['source'] = 'semantic_cache'
+                return cached_response
+            
+            # Gerar resposta com Gemini (com hedging e prazo máximo)
+            response = self._generate_hedged(message, context, late_key, hedge_delay, deadline)
+            
+            if response is None:
+                print("[GEMINI] Fallback para resposta padrão - prazo máximo excedido")
+                usage['source'] = 'timeout'
+                return self._get_default_response(message)
             
+            usage.update(
+                source='response_cache' if response.get('cached') else 'gemini',
+                model=response.get('model'),
+                prompt_tokens=response.get('prompt_tokens', 0),
+                output_tokens=response.get('output_tokens', 0),
+                latency_ms=response.get('latency_ms')
+            )
             if response.get('success', False):
+                self.store_semantic_cache(message, user_id, context, response['response'])
                 return response['response']
             else:
                 print(f"[GEMINI] Fallback para resposta padrão - Gemini falhou: {response.get('error', 'Erro desconhecido')}")
+                usage['source'] = 'error'
                 # Se for erro de quota, mostrar mensagem específica
                 if 'quota' in response.get('error', '').lower() or '429' in response.get('error', ''):
                     return "Desculpe, o limite diário de requisições foi excedido. Tente novamente amanhã ou considere usar um plano pago."
@@ -166,27 +385,217 @@ class ChatBot:
                 
         except Exception as e:
             print(f"Erro ao usar Gemini: {e}")
+            usage['source'] = 'error'
             return self._get_default_response(message)
+        finally:
+            self._add_carried_tokens(user_id, usage)
+    
+    def _generate_hedged(self, message: str, context: str, late_key: tuple,
+                         hedge_delay: Optional[float] = None,
+                         deadline: Optional[float] = None) -> Optional[Dict]:
+        """
+        Chama o Gemini respeitando o SLO de latência.
+        
+        Se nenhuma resposta chegar em ``hedge_delay`` segundos, uma segunda
+        requisição é disparada e vence a primeira que terminar com sucesso.
+        Retorna None se o prazo ``deadline`` passar; nesse caso a resposta
+        atrasada é guardada para a próxima mensagem igual do usuário.
+        """
+        hedge_delay = config.GEMINI_HEDGE_DELAY if hedge_delay is None else hedge_delay
+        deadline = config.GEMINI_HARD_TIMEOUT if deadline is None else deadline
+        expires_at = time.monotonic() + deadline
+        self._increment_stat('requests')
+        
+        def submit():
+            # Copia o contexto para que os spans da thread do pool entrem na requisição
+            return self._gemini_executor.submit(
+                bind_context(self.gemini_integration.generate_response), message, context
+            )
+        
+        futures = [submit()]
+        hedge_at = time.monotonic() + hedge_delay if 0 < hedge_delay < deadline else None
+        pending = set(futures)
+        last_response = None
+        
+        while pending:
+            now = time.monotonic()
+            if now >= expires_at:
+                break
+            
+            wait_until = min(hedge_at, expires_at) if hedge_at else expires_at
+            done, pending = wait(pending, timeout=max(0, wait_until - now), return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                response = future.result()
+                if response.get('success', False):
+                    if len(futures) > 1 and future is futures[1]:
+                        self._increment_stat('hedge_wins')
+                    # A outra requisição também é cobrada: tokens somados a esta resposta
+                    # (se já terminou) ou à próxima do usuário (se ainda estiver em andamento)
+                    for other in done - {future}:
+                        response = self._merge_tokens(response, other.result())
+                    for other in pending:
+                        if not other.cancel():
+                            other.add_done_callback(lambda f: self._carry_tokens(late_key[0], f))
+                    return response
+                last_response = self._merge_tokens(response, last_response)
+            
+            # Disparar requisição hedged se a primeira ainda não respondeu
+            if hedge_at and time.monotonic() >= hedge_at and not done:
+                hedge_at = None
+                print(f"[GEMINI] Sem resposta em {hedge_delay:.2f}s - disparando requisição hedged")
+                self._increment_stat('hedged')
+                hedge_future = submit()
+                futures.append(hedge_future)
+                pending.add(hedge_future)
+            elif done:
+                hedge_at = None
+        
+        if not pending:
+            # Todas as requisições falharam dentro do prazo
+            return last_response
+        
+        self._increment_stat('timeouts')
+        for future in pending:
+            future.add_done_callback(lambda f: self._store_late_response(late_key, f))
+        return None
+    
+    def _semantic_scope(self, user_id: str) -> str:
+        return '' if config.SEMANTIC_CACHE_SCOPE == 'global' else user_id
+    
+    @staticmethod
+    def _standalone(message: str, context: str) -> bool:
+        """
+        True se o contexto não tem mensagens anteriores à pergunta
+        
+        As respostas do Gemini dependem do contexto ("Explique melhor"), então o
+        cache semântico só guarda e serve perguntas que abrem a conversa.
+        """
+        return not context or context == f"Usuário: {message}"
     
+    def lookup_semantic_cache(self, message: str, user_id: str, context: str) -> Optional[str]:
+        """Resposta do Gemini para uma pergunta similar, se o cache estiver ativo"""
+        cache = self.semantic_cache
+        if cache is None or not self._standalone(message, context):
+            return None
+        with span('semantic_cache'):
+            return cache.lookup(message, self._semantic_scope(user_id))
+    
+    def store_semantic_cache(self, message: str, user_id: str, context: str, response: str):
+        cache = self.semantic_cache
+        if cache is not None and response and self._standalone(message, context):
+            cache.store(message, response, self._semantic_scope(user_id))
+    
+    def _save_semantic_cache(self):
+        if self.semantic_cache is not None:
+            self.semantic_cache.save()
+    
+    def _late_response_key(self, user_id: str, message: str) -> tuple:
+        """Chave usada para reaproveitar respostas atrasadas"""
+        return (user_id, ' '.join(message.lower().split()))
+    
+    def _store_late_response(self, key: tuple, future):
+        """Guarda uma resposta do Gemini que chegou depois do prazo"""
+        try:
+            if future.cancelled():
+                return
+            response = future.result()
+        except Exception:
+            return
+        if not response.get('success', False):
+            return
+        
+        with self._stats_lock:
+            if key in self._late_responses:
+                # Duas chamadas atrasadas para a mesma mensagem: só uma é reaproveitada
+                self._carry_locked(key[0], response)
+                return
+            self._late_responses[key] = response
+            while len(self._late_responses) > config.GEMINI_LATE_CACHE_SIZE:
+                (user_id, _), evicted = self._late_responses.popitem(last=False)
+                self._carry_locked(user_id, evicted)
+            self.latency_stats['late_cached'] += 1
+    
+    def _pop_late_response(self, key: tuple) -> Optional[Dict]:
+        """Remove e retorna uma resposta atrasada armazenada, se houver"""
+        with self._stats_lock:
+            response = self._late_responses.pop(key, None)
+            if response is not None:
+                self.latency_stats['late_hits'] += 1
+            return response
+    
+    @staticmethod
+    def _merge_tokens(response: Dict, other: Optional[Dict]) -> Dict:
+        """``response`` com os tokens de ``other`` somados (cópia)"""
+        if not other:
+            return response
+        return dict(
+            response,
+            prompt_tokens=response.get('prompt_tokens', 0) + other.get('prompt_tokens', 0),
+            output_tokens=response.get('output_tokens', 0) + other.get('output_tokens', 0)
+        )
+    
+    def _carry_tokens(self, user_id: str, future):
+        """Guarda os tokens de uma requisição que terminou sem mensagem própria"""
+        try:
+            response = future.result()
+        except Exception:
+            return
+        with self._stats_lock:
+            self._carry_locked(user_id, response)
+    
+    def _carry_locked(self, user_id: str, response: Dict):
+        prompt_tokens = response.get('prompt_tokens', 0)
+        output_tokens = response.get('output_tokens', 0)
+        if prompt_tokens or output_tokens:
+            carried = self._carried_tokens.setdefault(user_id, [0, 0])
+            carried[0] += prompt_tokens
+            carried[1] += output_tokens
+    
+    def _add_carried_tokens(self, user_id: str, usage: Dict):
+        """Soma ao uso desta resposta os tokens guardados para o usuário"""
+        with self._stats_lock:
+            carried = self._carried_tokens.pop(user_id, None)
+        if carried:
+            usage['prompt_tokens'] = usage.get('prompt_tokens', 0) + carried[0]
+            usage['output_tokens'] = usage.get('output_tokens', 0) + carried[1]
+    
+    def _increment_stat(self, name: str):
+        with self._stats_lock:
+            self.latency_stats[name] += 1
+    
+    def get_latency_stats(self) -> Dict:
+        """Obtém contadores de hedging e timeouts do Gemini"""
+        with self._stats_lock:
+            stats = dict(self.latency_stats)
+            stats['late_cache_size'] = len(self._late_responses)
+            stats['carried_tokens'] = sum(sum(tokens) for tokens in self._carried_tokens.values())
+        stats['hedge_delay'] = config.GEMINI_HEDGE_DELAY
+        stats['hard_timeout'] = config.GEMINI_HARD_TIMEOUT
+        return stats
+    
+    @timed('conversation_context')
     def _get_conversation_context_for_gemini(self, user_id: str = 'current_user') -> str:
         """Obtém contexto da conversa para o Gemini"""
         try:
             # Pegar as últimas 6 mensagens para dar contexto ao Gemini
             recent_messages = self.db_manager.get_recent_messages(user_id, 6)
-            if not recent_messages:
-                return ""
-            
-            # Construir contexto da conversa
-            context_parts = []
-            for msg in recent_messages[-6:]:  # Pegar apenas as últimas 6 mensagens
-                role = "Usuário" if msg['is_user'] else "Assistente"
-                context_parts.append(f"{role}: {msg['message']}")
-            
-            return "\n".join(context_parts)
+            return self.format_context(recent_messages)
         except Exception as e:
             print(f"[GEMINI] Erro ao obter contexto: {e}")
             return ""
     
+    @staticmethod
+    def format_context(messages: List[Dict]) -> str:
+        """Formata mensagens recentes (dicts com message e is_user) como contexto do Gemini"""
+        # Construir contexto da conversa
+        context_parts = []
+        for msg in messages[-6:]:  # Pegar apenas as últimas 6 mensagens
+            role = "Usuário" if msg['is_user'] else "Assistente"
+            context_parts.append(f"{role}: {msg['message']}")
+        
+        return "\n".join(context_parts)
+    
     def set_gemini_integration(self, gemini_client):
         """Define o cliente Gemini para integração futura"""
         self.gemini_integration = gemini_client
@@ -1,74 +1,457 @@
 """
 Arquivo de configuração do ChatBot
+
+As configurações são lidas uma única vez em um snapshot imutável e
+versionado (``Config``). O ``ConfigStore`` troca o snapshot inteiro quando o
+.env ou a tabela system_config mudam (ou ao receber SIGHUP), então a leitura
+nos caminhos críticos não precisa de lock.
 """
 import os
-from dotenv import load_dotenv
+import signal
+import threading
+from typing import Callable, Dict, List, Mapping, Optional
+from dotenv import load_dotenv, find_dotenv, dotenv_values
+
+# Variáveis do processo antes do .env (têm precedência sobre o arquivo)
+_PROCESS_ENV = dict(os.environ)
+DOTENV_PATH = find_dotenv()
 
 # Carregar variáveis de ambiente
-load_dotenv()
+load_dotenv(DOTENV_PATH)
 
 class Config:
-    """Configurações base da aplicação"""
-    
-    # Configurações do Flask
-    SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
-    DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
-    
-    # Configurações do banco de dados
-    DATABASE_PATH = os.getenv('DATABASE_PATH', 'chatbot.db')
-    
-    # Configurações do servidor
-    HOST = os.getenv('HOST', '0.0.0.0')
-    PORT = int(os.getenv('PORT', 5000))
-    
-    # Configurações do Gemini
-    GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
-    GEMINI_MAX_OUTPUT_TOKENS = int(os.getenv('GEMINI_MAX_OUTPUT_TOKENS', 256))
-    GEMINI_TEMPERATURE = float(os.getenv('GEMINI_TEMPERATURE', 0.7))
-    GEMINI_STREAMING_ENABLED = os.getenv('GEMINI_STREAMING_ENABLED', 'true').lower() == 'true'
-    GEMINI_SYSTEM_PROMPT = os.getenv('GEMINI_SYSTEM_PROMPT')
-    GEMINI_SAFETY_SETTINGS_ENABLED = os.getenv('GEMINI_SAFETY_SETTINGS_ENABLED', 'true').lower() == 'true'
-    GEMINI_SAFETY_CATEGORIES = os.getenv('GEMINI_SAFETY_CATEGORIES', '').split(',') if os.getenv('GEMINI_SAFETY_CATEGORIES') else []
-    GEMINI_LOG_REQUESTS = os.getenv('GEMINI_LOG_REQUESTS', 'true').lower() == 'true'
-    
-    # Configurações de segurança
-    MAX_MESSAGE_LENGTH = 2000
-    MAX_HISTORY_MESSAGES = 100
-    
-    # Configurações de UI
-    AUTO_SCROLL_ENABLED = os.getenv('AUTO_SCROLL_ENABLED', 'true').lower() == 'true'
-    SOUND_NOTIFICATIONS_ENABLED = os.getenv('SOUND_NOTIFICATIONS_ENABLED', 'true').lower() == 'true'
-    
-    # Configurações de Log
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-    
-    @classmethod
-    def validate_config(cls):
+    """Snapshot imutável das configurações da aplicação"""
+    
+    def __init__(self, env: Mapping[str, str], version: int = 1):
+        getenv = env.get
+        self.VERSION = version
+        
+        # Configurações do Flask
+        self.SECRET_KEY = getenv('SECRET_KEY', 'your-secret-key-change-this')
+        self.DEBUG = getenv('DEBUG', 'True').lower() == 'true'
+        
+        # Configurações do banco de dados
+        self.DATABASE_PATH = getenv('DATABASE_PATH', 'chatbot.db')
+        self.STORAGE_BACKEND = getenv('STORAGE_BACKEND', 'sqlite').lower()  # sqlite, sharded, memory ou remote
+        self.STORAGE_SHARDS = int(getenv('STORAGE_SHARDS', 4))
+        # 0 = uma conexão por operação (apenas sqlite; shards sempre usam pool e WAL)
+        self.STORAGE_POOL_SIZE = int(getenv('STORAGE_POOL_SIZE', 4 if self.STORAGE_BACKEND == 'sharded' else 0))
+        self.STORAGE_REMOTE_URL = getenv('STORAGE_REMOTE_URL', 'http://127.0.0.1:8765/')
+        
+        # Configurações do servidor
+        self.HOST = getenv('HOST', '0.0.0.0')
+        self.PORT = int(getenv('PORT', 5000))
+        
+        # Configurações do Gemini
+        self.GEMINI_API_KEY = getenv('GEMINI_API_KEY')
+        self.GEMINI_MODEL = getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+        self.GEMINI_MAX_OUTPUT_TOKENS = int(getenv('GEMINI_MAX_OUTPUT_TOKENS', 50))
+        self.GEMINI_TEMPERATURE = float(getenv('GEMINI_TEMPERATURE', 0.3))
+        self.GEMINI_TOP_P = float(getenv('GEMINI_TOP_P', 0.7))
+        self.GEMINI_TOP_K = int(getenv('GEMINI_TOP_K', 10))
+        self.GEMINI_STREAMING_ENABLED = getenv('GEMINI_STREAMING_ENABLED', 'true').lower() == 'true'
+        self.GEMINI_SYSTEM_PROMPT = getenv('GEMINI_SYSTEM_PROMPT')
+        self.GEMINI_SAFETY_SETTINGS_ENABLED = getenv('GEMINI_SAFETY_SETTINGS_ENABLED', 'true').lower() == 'true'
+        self.GEMINI_SAFETY_CATEGORIES = getenv('GEMINI_SAFETY_CATEGORIES', '').split(',') if getenv('GEMINI_SAFETY_CATEGORIES') else []
+        self.GEMINI_LOG_REQUESTS = getenv('GEMINI_LOG_REQUESTS', 'true').lower() == 'true'
+        
+        # Configurações de latência do Gemini (requisições "hedged" e prazo máximo)
+        self.GEMINI_HEDGE_DELAY = float(getenv('GEMINI_HEDGE_DELAY', 1.5))
+        self.GEMINI_HARD_TIMEOUT = float(getenv('GEMINI_HARD_TIMEOUT', 8.0))
+        self.GEMINI_MAX_WORKERS = int(getenv('GEMINI_MAX_WORKERS', 8))
+        self.GEMINI_LATE_CACHE_SIZE = int(getenv('GEMINI_LATE_CACHE_SIZE', 256))
+        
+        # Transporte do Gemini: 'sdk' (google-generativeai) ou 'rest' (pool HTTP keep-alive próprio)
+        self.GEMINI_TRANSPORT = getenv('GEMINI_TRANSPORT', 'sdk').lower()
+        self.GEMINI_API_BASE = getenv('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com/v1beta')
+        self.GEMINI_POOL_SIZE = int(getenv('GEMINI_POOL_SIZE', 8))
+        self.GEMINI_CONNECT_TIMEOUT = float(getenv('GEMINI_CONNECT_TIMEOUT', 3.0))
+        self.GEMINI_READ_TIMEOUT = float(getenv('GEMINI_READ_TIMEOUT', 30.0))
+        
+        # Roteamento entre um modelo rápido e um forte, pela complexidade da mensagem
+        self.GEMINI_ROUTER_ENABLED = getenv('GEMINI_ROUTER_ENABLED', 'false').lower() == 'true'
+        self.GEMINI_FAST_MODEL = getenv('GEMINI_FAST_MODEL', 'gemini-1.5-flash-8b')
+        self.GEMINI_STRONG_MODEL = getenv('GEMINI_STRONG_MODEL', self.GEMINI_MODEL)
+        self.GEMINI_ROUTER_THRESHOLD = float(getenv('GEMINI_ROUTER_THRESHOLD', 0.5))
+        self.GEMINI_FAST_CONCURRENCY = int(getenv('GEMINI_FAST_CONCURRENCY', 8))
+        self.GEMINI_STRONG_CONCURRENCY = int(getenv('GEMINI_STRONG_CONCURRENCY', 4))
+        self.GEMINI_FAST_LATENCY_TARGET = float(getenv('GEMINI_FAST_LATENCY_TARGET', 1.5))  # segundos (p90)
+        self.GEMINI_STRONG_LATENCY_TARGET = float(getenv('GEMINI_STRONG_LATENCY_TARGET', 4.0))
+        self.GEMINI_ROUTER_WINDOW = int(getenv('GEMINI_ROUTER_WINDOW', 100))  # latências recentes por modelo
+        
+        # Respostas pré-geradas para os prompts mais comuns (botões de sugestão)
+        self.PRECOMPUTED_ENABLED = getenv('PRECOMPUTED_ENABLED', 'true').lower() == 'true'
+        self.PRECOMPUTED_PROMPTS = getenv(
+            'PRECOMPUTED_PROMPTS', 'Como você funciona?|Me conte uma curiosidade|Como posso usar o Gemini?'
+        ).split('|')
+        self.PRECOMPUTED_TTL = float(getenv('PRECOMPUTED_TTL', 21600))  # segundos até renovar
+        self.PRECOMPUTED_REFRESH_INTERVAL = float(getenv('PRECOMPUTED_REFRESH_INTERVAL', 600))
+        
+        # Perguntas frequentes respondidas localmente (BM25) antes das intenções (sem Gemini)
+        self.FAQ_ENABLED = getenv('FAQ_ENABLED', 'true').lower() == 'true'
+        self.FAQ_PATH = getenv('FAQ_PATH', 'faq.jsonl')
+        self.FAQ_THRESHOLD = float(getenv('FAQ_THRESHOLD', 0.5))  # confiança mínima (0-1)
+        self.FAQ_RELOAD_INTERVAL = float(getenv('FAQ_RELOAD_INTERVAL', 30))  # segundos entre verificações do arquivo
+        
+        # Limite de requisições por usuário/IP (janela deslizante); rota=requisições/segundos
+        self.RATE_LIMIT_ENABLED = getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+        self.RATE_LIMIT_ROUTES = getenv(
+            'RATE_LIMIT_ROUTES',
+            '/api/chat=30/60;/api/chat/stream=30/60;/api/chat/batch=5/60;/api/intents/classify=10/60'
+        )
+        self.RATE_LIMIT_DEFAULT = getenv('RATE_LIMIT_DEFAULT', '300/60')  # demais rotas /api/
+        self.RATE_LIMIT_IP_MULTIPLIER = int(getenv('RATE_LIMIT_IP_MULTIPLIER', 5))
+        self.RATE_LIMIT_TRUST_PROXY = getenv('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'
+        self.RATE_LIMIT_BACKEND = getenv('RATE_LIMIT_BACKEND', 'memory').lower()  # memory ou sqlite
+        self.RATE_LIMIT_SHARDS = int(getenv('RATE_LIMIT_SHARDS', 64))
+        self.RATE_LIMIT_SQLITE_PATH = getenv('RATE_LIMIT_SQLITE_PATH', 'rate_limits.db')
+        
+        # Gravação amostrada do tráfego para replay (python traffic.py replay)
+        self.TRAFFIC_RECORD_ENABLED = getenv('TRAFFIC_RECORD_ENABLED', 'false').lower() == 'true'
+        self.TRAFFIC_RECORD_SAMPLE_RATE = float(getenv('TRAFFIC_RECORD_SAMPLE_RATE', 0.01))
+        self.TRAFFIC_RECORD_DIR = getenv('TRAFFIC_RECORD_DIR', 'recordings')
+        self.TRAFFIC_RECORD_MAX_BYTES = int(getenv('TRAFFIC_RECORD_MAX_BYTES', 50 * 1024 * 1024))
+        self.TRAFFIC_RECORD_MAX_FILES = int(getenv('TRAFFIC_RECORD_MAX_FILES', 10))
+        self.TRAFFIC_RECORD_MAX_BODY = int(getenv('TRAFFIC_RECORD_MAX_BODY', 4096))
+        # Corpos completos (texto das conversas); desligado, os campos de texto são mascarados
+        self.TRAFFIC_RECORD_BODIES = getenv('TRAFFIC_RECORD_BODIES', 'false').lower() == 'true'
+        self.TRAFFIC_RECORD_QUEUE_SIZE = int(getenv('TRAFFIC_RECORD_QUEUE_SIZE', 10000))
+        
+        # Cache de respostas do Gemini compartilhado entre workers (SQLite em modo WAL)
+        self.RESPONSE_CACHE_ENABLED = getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+        self.RESPONSE_CACHE_PATH = getenv('RESPONSE_CACHE_PATH', 'response_cache.db')
+        self.RESPONSE_CACHE_TTL = float(getenv('RESPONSE_CACHE_TTL', 3600))  # segundos
+        self.RESPONSE_CACHE_MAX_ENTRIES = int(getenv('RESPONSE_CACHE_MAX_ENTRIES', 10000))
+        
+        # Cache semântico de respostas do Gemini (requer NumPy)
+        self.SEMANTIC_CACHE_ENABLED = getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+        self.SEMANTIC_CACHE_THRESHOLD = float(getenv('SEMANTIC_CACHE_THRESHOLD', 0.8))
+        self.SEMANTIC_CACHE_MAX_ENTRIES = int(getenv('SEMANTIC_CACHE_MAX_ENTRIES', 2048))
+        self.SEMANTIC_CACHE_TTL = float(getenv('SEMANTIC_CACHE_TTL', 86400))  # 0 = sem expiração
+        self.SEMANTIC_CACHE_DIM = int(getenv('SEMANTIC_CACHE_DIM', 1024))
+        self.SEMANTIC_CACHE_INDEX = getenv('SEMANTIC_CACHE_INDEX', 'flat').lower()  # flat ou ivf
+        self.SEMANTIC_CACHE_NLIST = int(getenv('SEMANTIC_CACHE_NLIST', 16))
+        self.SEMANTIC_CACHE_NPROBE = int(getenv('SEMANTIC_CACHE_NPROBE', 2))
+        self.SEMANTIC_CACHE_SCOPE = getenv('SEMANTIC_CACHE_SCOPE', 'user').lower()  # user ou global
+        self.SEMANTIC_CACHE_PATH = getenv('SEMANTIC_CACHE_PATH', 'semantic_cache.npz')
+        
+        # Configurações do streaming SSE
+        self.SSE_HEARTBEAT_INTERVAL = float(getenv('SSE_HEARTBEAT_INTERVAL', 15))
+        self.SSE_FLUSH_BYTES = int(getenv('SSE_FLUSH_BYTES', 0))
+        self.SSE_RETRY_MS = int(getenv('SSE_RETRY_MS', 2000))
+        self.SSE_REPLAY_TTL = float(getenv('SSE_REPLAY_TTL', 120))
+        self.SSE_REPLAY_MAX_STREAMS = int(getenv('SSE_REPLAY_MAX_STREAMS', 256))
+        self.SSE_REPLAY_MAX_EVENTS = int(getenv('SSE_REPLAY_MAX_EVENTS', 512))  # por stream; acima disso os chunks são fundidos
+        
+        # Chat via WebSocket (/api/chat/ws; requer flask-sock, lido só na inicialização)
+        self.WS_ENABLED = getenv('WS_ENABLED', 'true').lower() == 'true'
+        self.WS_PING_INTERVAL = float(getenv('WS_PING_INTERVAL', 25))  # 0 desativa
+        self.WS_MAX_IN_FLIGHT = int(getenv('WS_MAX_IN_FLIGHT', 4))  # respostas simultâneas por conexão
+        self.WS_MAX_MESSAGE_BYTES = int(getenv('WS_MAX_MESSAGE_BYTES', 65536))
+        
+        # Controle de admissão (backpressure) das rotas de chat com Gemini
+        self.ADMISSION_MAX_IN_FLIGHT = int(getenv('ADMISSION_MAX_IN_FLIGHT', 16))
+        self.ADMISSION_MAX_QUEUE = int(getenv('ADMISSION_MAX_QUEUE', 32))
+        self.ADMISSION_QUEUE_TIMEOUT = float(getenv('ADMISSION_QUEUE_TIMEOUT', 2.0))
+        self.ADMISSION_MAX_PER_USER = int(getenv('ADMISSION_MAX_PER_USER', 2))
+        self.ADMISSION_OVERLOAD_MODE = getenv('ADMISSION_OVERLOAD_MODE', 'shed').lower()  # shed ou degrade
+        self.ADMISSION_RETRY_AFTER = int(getenv('ADMISSION_RETRY_AFTER', 2))
+        
+        # Processamento em lote (/api/chat/batch)
+        self.BATCH_MAX_SIZE = int(getenv('BATCH_MAX_SIZE', 1000))
+        self.BATCH_MAX_WORKERS = int(getenv('BATCH_MAX_WORKERS', 4))
+        self.INTENTS_MAX_BATCH = int(getenv('INTENTS_MAX_BATCH', 100000))  # /api/intents/classify
+        
+        # Exportação/importação do histórico (history_io.py)
+        self.EXPORT_BATCH_SIZE = int(getenv('EXPORT_BATCH_SIZE', 1000))
+        self.IMPORT_BATCH_SIZE = int(getenv('IMPORT_BATCH_SIZE', 5000))
+        
+        # Monitor de saúde (intervalos em segundos)
+        self.HEALTH_CHECK_INTERVAL = float(getenv('HEALTH_CHECK_INTERVAL', 10))
+        self.HEALTH_GEMINI_CHECK_INTERVAL = float(getenv('HEALTH_GEMINI_CHECK_INTERVAL', 60))
+        
+        # Configurações de segurança
+        self.ADMIN_TOKEN = getenv('ADMIN_TOKEN')  # Exigido em /api/admin/* quando definido
+        self.MAX_MESSAGE_LENGTH = 2000
+        self.MAX_HISTORY_MESSAGES = 100
+        
+        # Tamanho máximo das páginas de /api/history/<user_id>?after_id=N
+        self.HISTORY_PAGE_SIZE = int(getenv('HISTORY_PAGE_SIZE', 500))
+        
+        # Compressão de respostas JSON (0 desativa)
+        self.COMPRESS_MIN_SIZE = int(getenv('COMPRESS_MIN_SIZE', 1024))
+        self.COMPRESS_LEVEL = int(getenv('COMPRESS_LEVEL', 6))
+        
+        # Configurações de UI
+        self.AUTO_SCROLL_ENABLED = getenv('AUTO_SCROLL_ENABLED', 'true').lower() == 'true'
+        self.SOUND_NOTIFICATIONS_ENABLED = getenv('SOUND_NOTIFICATIONS_ENABLED', 'true').lower() == 'true'
+        
+        # Configurações de Log
+        self.LOG_LEVEL = getenv('LOG_LEVEL', 'INFO')
+        
+        # Instrumentação de desempenho (Server-Timing e captura de perfis)
+        self.PROFILING_ENABLED = getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+        self.PROFILING_REQUEST_TOGGLE = getenv('PROFILING_REQUEST_TOGGLE', str(self.DEBUG)).lower() == 'true'
+        self.PROFILING_SAMPLE_RATE = float(getenv('PROFILING_SAMPLE_RATE', 0.0))
+        self.PROFILING_PROFILER = getenv('PROFILING_PROFILER', 'cprofile').lower()  # cprofile ou pyinstrument
+        self.PROFILING_DIR = getenv('PROFILING_DIR', 'profiles')
+        
+        # Recarga de configurações (intervalo de verificação do .env/system_config)
+        self.CONFIG_WATCH_INTERVAL = float(getenv('CONFIG_WATCH_INTERVAL', 5))
+    
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("Configuração imutável - use config_store.override()")
+        object.__setattr__(self, name, value)
+    
+    def freeze(self) -> 'Config':
+        object.__setattr__(self, '_frozen', True)
+        return self
+    
+    def as_dict(self) -> Dict:
+        return {k: v for k, v in vars(self).items() if k.isupper()}
+    
+    def validate_config(self):
         """Valida as configurações da aplicação"""
         issues = []
         
-        if cls.SECRET_KEY == 'your-secret-key-change-this':
+        if self.SECRET_KEY == 'your-secret-key-change-this':
             issues.append("[AVISO] SECRET_KEY não foi alterada - use uma chave segura em produção")
         
-        if not cls.GEMINI_API_KEY:
+        if not self.GEMINI_API_KEY:
             issues.append("[INFO] GEMINI_API_KEY não configurada - Gemini não estará disponível")
-        elif cls.GEMINI_API_KEY == 'your_gemini_api_key_here':
+        elif self.GEMINI_API_KEY == 'your_gemini_api_key_here':
             issues.append("[AVISO] GEMINI_API_KEY não foi configurada - substitua pela sua chave real")
         
         # Validar configurações do Gemini
-        if cls.GEMINI_TEMPERATURE < 0 or cls.GEMINI_TEMPERATURE > 2:
+        if self.GEMINI_TEMPERATURE < 0 or self.GEMINI_TEMPERATURE > 2:
             issues.append("[AVISO] GEMINI_TEMPERATURE deve estar entre 0 e 2")
         
-        if cls.GEMINI_MAX_OUTPUT_TOKENS < 1 or cls.GEMINI_MAX_OUTPUT_TOKENS > 8192:
+        if self.GEMINI_MAX_OUTPUT_TOKENS < 1 or self.GEMINI_MAX_OUTPUT_TOKENS > 8192:
             issues.append("[AVISO] GEMINI_MAX_OUTPUT_TOKENS deve estar entre 1 e 8192")
         
+        if self.GEMINI_TRANSPORT not in ('sdk', 'rest'):
+            issues.append("[AVISO] GEMINI_TRANSPORT deve ser 'sdk' ou 'rest'")
+        
+        if self.GEMINI_ROUTER_ENABLED and not 0 <= self.GEMINI_ROUTER_THRESHOLD <= 1:
+            issues.append("[AVISO] GEMINI_ROUTER_THRESHOLD deve estar entre 0 e 1")
+        
+        if self.GEMINI_ROUTER_ENABLED and min(self.GEMINI_FAST_CONCURRENCY, self.GEMINI_STRONG_CONCURRENCY) < 1:
+            issues.append("[AVISO] GEMINI_FAST_CONCURRENCY e GEMINI_STRONG_CONCURRENCY devem ser maiores que 0")
+        
+        if self.GEMINI_POOL_SIZE < 1:
+            issues.append("[AVISO] GEMINI_POOL_SIZE deve ser maior que 0")
+        
+        if self.GEMINI_HARD_TIMEOUT <= 0:
+            issues.append("[AVISO] GEMINI_HARD_TIMEOUT deve ser maior que 0")
+        elif self.GEMINI_HEDGE_DELAY >= self.GEMINI_HARD_TIMEOUT:
+            issues.append("[INFO] GEMINI_HEDGE_DELAY >= GEMINI_HARD_TIMEOUT - requisições hedged nunca serão disparadas")
+        
+        if self.STORAGE_BACKEND not in ('sqlite', 'sharded', 'memory', 'remote'):
+            issues.append("[AVISO] STORAGE_BACKEND deve ser 'sqlite', 'sharded', 'memory' ou 'remote' - usando SQLite")
+        elif self.STORAGE_BACKEND == 'sharded' and self.STORAGE_POOL_SIZE <= 0:
+            issues.append("[AVISO] STORAGE_POOL_SIZE deve ser maior que 0 com shards - usando 4 conexões por shard")
+        
+        if self.ADMISSION_OVERLOAD_MODE not in ('shed', 'degrade'):
+            issues.append("[AVISO] ADMISSION_OVERLOAD_MODE deve ser 'shed' ou 'degrade'")
+        
+        if self.SEMANTIC_CACHE_INDEX not in ('flat', 'ivf'):
+            issues.append("[AVISO] SEMANTIC_CACHE_INDEX deve ser 'flat' ou 'ivf'")
+        
+        if self.SEMANTIC_CACHE_SCOPE not in ('user', 'global'):
+            issues.append("[AVISO] SEMANTIC_CACHE_SCOPE deve ser 'user' ou 'global'")
+        
+        if self.RATE_LIMIT_BACKEND not in ('memory', 'sqlite'):
+            issues.append("[AVISO] RATE_LIMIT_BACKEND deve ser 'memory' ou 'sqlite'")
+        
+        if self.RATE_LIMIT_IP_MULTIPLIER < 1 or self.RATE_LIMIT_SHARDS < 1:
+            issues.append("[AVISO] RATE_LIMIT_IP_MULTIPLIER e RATE_LIMIT_SHARDS devem ser maiores que 0")
+        
+        if not 0 <= self.TRAFFIC_RECORD_SAMPLE_RATE <= 1:
+            issues.append("[AVISO] TRAFFIC_RECORD_SAMPLE_RATE deve estar entre 0 e 1")
+        
+        if self.TRAFFIC_RECORD_MAX_FILES < 1:
+            issues.append("[AVISO] TRAFFIC_RECORD_MAX_FILES deve ser maior que 0")
+        
+        if self.RESPONSE_CACHE_ENABLED and (self.RESPONSE_CACHE_TTL <= 0 or self.RESPONSE_CACHE_MAX_ENTRIES < 1):
+            issues.append("[AVISO] RESPONSE_CACHE_TTL e RESPONSE_CACHE_MAX_ENTRIES devem ser maiores que 0")
+        
+        if self.PRECOMPUTED_ENABLED and self.PRECOMPUTED_REFRESH_INTERVAL <= 0:
+            issues.append("[AVISO] PRECOMPUTED_REFRESH_INTERVAL deve ser maior que 0")
+        
+        if self.FAQ_ENABLED and not 0 < self.FAQ_THRESHOLD <= 1:
+            issues.append("[AVISO] FAQ_THRESHOLD deve estar entre 0 e 1")
+        
+        if self.FAQ_ENABLED and not os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.FAQ_PATH)):
+            issues.append(f"[AVISO] Arquivo do FAQ não encontrado: {self.FAQ_PATH}")
+        
+        if self.WS_MAX_IN_FLIGHT < 1 or self.WS_MAX_MESSAGE_BYTES < 1 or self.WS_PING_INTERVAL < 0:
+            issues.append("[AVISO] WS_MAX_IN_FLIGHT e WS_MAX_MESSAGE_BYTES devem ser maiores que 0 e WS_PING_INTERVAL não negativo")
+        
+        if not 0 <= self.PROFILING_SAMPLE_RATE <= 1:
+            issues.append("[AVISO] PROFILING_SAMPLE_RATE deve estar entre 0 e 1")
+        
+        if self.PROFILING_PROFILER not in ('cprofile', 'pyinstrument'):
+            issues.append("[AVISO] PROFILING_PROFILER deve ser 'cprofile' ou 'pyinstrument' - usando cProfile")
+        
         # Validar nível de log
         valid_log_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
-        if cls.LOG_LEVEL not in valid_log_levels:
+        if self.LOG_LEVEL not in valid_log_levels:
             issues.append(f"[AVISO] LOG_LEVEL deve ser um dos seguintes: {', '.join(valid_log_levels)}")
         
         return issues
 
+# Ajustes que a tabela system_config pode sobrepor ao ambiente (modelo,
+# geração, limites); segredos, caminhos e backends valem só pelo ambiente
+DB_TUNABLES = frozenset((
+    'GEMINI_MODEL', 'GEMINI_MAX_OUTPUT_TOKENS', 'GEMINI_TEMPERATURE', 'GEMINI_TOP_P', 'GEMINI_TOP_K',
+    'GEMINI_SYSTEM_PROMPT', 'GEMINI_HEDGE_DELAY', 'GEMINI_HARD_TIMEOUT',
+    'GEMINI_FAST_MODEL', 'GEMINI_STRONG_MODEL', 'GEMINI_ROUTER_THRESHOLD',
+    'FAQ_THRESHOLD', 'SEMANTIC_CACHE_THRESHOLD',
+    'RATE_LIMIT_ENABLED', 'RATE_LIMIT_ROUTES', 'RATE_LIMIT_DEFAULT', 'RATE_LIMIT_IP_MULTIPLIER',
+    'ADMISSION_MAX_IN_FLIGHT', 'ADMISSION_MAX_QUEUE', 'ADMISSION_QUEUE_TIMEOUT', 'ADMISSION_MAX_PER_USER',
+    'ADMISSION_OVERLOAD_MODE', 'ADMISSION_RETRY_AFTER',
+    'MAX_MESSAGE_LENGTH', 'MAX_HISTORY_MESSAGES', 'AUTO_SCROLL_ENABLED', 'SOUND_NOTIFICATIONS_ENABLED'
+))
+
+class ConfigStore:
+    """
+    Mantém o snapshot atual das configurações e o recarrega quando o .env,
+    a tabela system_config ou um SIGHUP indicam mudança.
+    
+    Valores em system_config (chave em minúsculas, ex.: ``gemini_model``)
+    sobrepõem o ambiente apenas para as chaves de ``DB_TUNABLES``, permitindo
+    ajustes sem reiniciar os workers. ``gemini_api_key`` é usada apenas
+    quando a variável de ambiente não está definida; as demais chaves são
+    ignoradas (uma linha no banco não troca segredos nem o local do banco).
+    """
+    
+    def __init__(self, dotenv_path: Optional[str] = DOTENV_PATH):
+        self.dotenv_path = dotenv_path
+        self.db_manager = None
+        self._overrides = {}
+        self._listeners: List[Callable[[Config, Config], None]] = []
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self._fingerprint = None
+        self._current = self._build(version=1)
+    
+    def current(self) -> Config:
+        """Snapshot atual (leitura sem lock)"""
+        return self._current
+    
+    def attach_database(self, db_manager):
+        """Passa a considerar a tabela system_config do banco"""
+        self.db_manager = db_manager
+        self.reload()
+    
+    def subscribe(self, listener: Callable[[Config, Config], None]):
+        """Registra ``listener(antigo, novo)`` chamado após cada recarga com mudanças"""
+        self._listeners.append(listener)
+    
+    def override(self, **values) -> Config:
+        """Sobrepõe valores em memória (útil em testes e ajustes administrativos)"""
+        with self._lock:
+            self._overrides.update({k: str(v) for k, v in values.items()})
+        return self.reload()
+    
+    def reload(self) -> Config:
+        """Relê .env e system_config e publica um novo snapshot se algo mudou"""
+        with self._lock:
+            old = self._current
+            try:
+                new = self._build(version=old.VERSION + 1)
+            except Exception as e:
+                print(f"[CONFIG] Erro ao recarregar configurações - mantendo versão {old.VERSION}: {e}")
+                return old
+            old_values, new_values = old.as_dict(), new.as_dict()
+            changed = [k for k in new_values if k != 'VERSION' and new_values[k] != old_values.get(k)]
+            if not changed:
+                return old
+            self._current = new
+        
+        print(f"[CONFIG] Configurações recarregadas (versão {new.VERSION}): {', '.join(sorted(changed))}")
+        for listener in self._listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                print(f"[CONFIG] Erro ao aplicar nova configuração: {e}")
+        return new
+    
+    def start_watcher(self, interval: float = 5.0):
+        """Verifica periodicamente se o .env ou o system_config mudaram"""
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._fingerprint = self._source_fingerprint()
+        
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    fingerprint = self._source_fingerprint()
+                    if fingerprint != self._fingerprint:
+                        self._fingerprint = fingerprint
+                        self.reload()
+                except Exception as e:
+                    print(f"[CONFIG] Erro ao verificar mudanças: {e}")
+        
+        self._watcher = threading.Thread(target=watch, name='config-watcher', daemon=True)
+        self._watcher.start()
+    
+    def stop_watcher(self):
+        self._stop.set()
+    
+    def install_signal_handler(self) -> bool:
+        """Recarrega as configurações ao receber SIGHUP (não disponível no Windows)"""
+        if not hasattr(signal, 'SIGHUP') or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
+        return True
+    
+    def _build(self, version: int) -> Config:
+        env = {}
+        if self.dotenv_path and os.path.exists(self.dotenv_path):
+            env.update({k: v for k, v in dotenv_values(self.dotenv_path).items() if v is not None})
+        env.update(_PROCESS_ENV)
+        
+        if self.db_manager is not None:
+            ignored = []
+            for key, value in self.db_manager.get_all_system_config().items():
+                name = key.upper()
+                if value is None:
+                    continue
+                if name == 'GEMINI_API_KEY':
+                    env.setdefault(name, value)
+                elif name in DB_TUNABLES:
+                    env[name] = value
+                else:
+                    ignored.append(key)
+            if ignored:
+                print(f"[CONFIG] system_config ignorado (só pelo ambiente): {', '.join(sorted(ignored))}")
+        
+        env.update(self._overrides)
+        return Config(env, version).freeze()
+    
+    def _source_fingerprint(self):
+        dotenv_mtime = None
+        if self.dotenv_path and os.path.exists(self.dotenv_path):
+            dotenv_mtime = os.path.getmtime(self.dotenv_path)
+        db_version = self.db_manager.get_system_config_version() if self.db_manager else None
+        return dotenv_mtime, db_version
+
+
+class ConfigProxy:
+    """Acesso por atributo ao snapshot atual (ex.: ``config.GEMINI_MODEL``)"""
+    
+    def __init__(self, store: ConfigStore):
+        object.__setattr__(self, '_store', store)
+    
+    def __getattr__(self, name):
+        return getattr(self._store.current(), name)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("Configuração imutável - use config_store.override()")
+
 # Instância de configuração
-config = Config()
+config_store = ConfigStore()
+config = ConfigProxy(config_store)
@@ -1,22 +1,79 @@
 import sqlite3
 import json
+import queue
+import threading
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 import os
 
+from usage import USAGE_FIELDS, build_usage_report, usage_values
+
+# Mensagens com o texto das respostas padrão resolvido (messages.template_id)
+MESSAGES_JOIN = 'messages m LEFT JOIN response_templates t ON t.id = m.template_id'
+MESSAGE_COLUMNS = 'm.id, m.user_id, COALESCE(t.text, m.message), m.is_user, m.created_at, m.parent_message_id'
+# Inserção de uma linha de message_usage (usage.py)
+USAGE_INSERT = (f"INSERT INTO message_usage (message_id, user_id, {', '.join(USAGE_FIELDS)}) "
+                f"VALUES ({', '.join('?' * (len(USAGE_FIELDS) + 2))})")
+# Expressão SQL de cada agrupamento dos relatórios de uso
+USAGE_GROUP_SQL = {
+    'user': 'user_id',
+    'model': "COALESCE(model, '')",
+    'source': 'source',
+    'day': 'DATE(created_at)'
+}
+
+
 class DatabaseManager:
     """
     Classe para gerenciar operações com o banco de dados SQLite
     """
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: int = 0):
         self.db_path = db_path
+        # Com pool_size > 0 as conexões são reaproveitadas (modo WAL) e as
+        # escritas passam por um único writer
+        self._pool = None
+        self._write_lock = threading.Lock()
+        # Respostas canônicas (texto -> id em response_templates): respostas do
+        # bot com um desses textos são salvas só com o template_id
+        self._templates: Dict[str, int] = {}
+        if pool_size > 0:
+            self._pool = queue.Queue()
+            for _ in range(pool_size):
+                self._pool.put(None)
         self.init_database()
     
+    @contextmanager
+    def _connect(self, write: bool = False):
+        """Conexão com o banco (do pool, se habilitado) dentro de uma transação"""
+        if self._pool is None:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+            return
+        
+        conn = self._pool.get()
+        try:
+            if conn is None:
+                conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+            with self._write_lock if write else nullcontext():
+                with conn:
+                    yield conn
+        finally:
+            if conn is not None:
+                conn.row_factory = None
+            self._pool.put(conn)
+    
     def init_database(self):
         """Inicializa o banco de dados e cria as tabelas necessárias"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect(write=True) as conn:
                 cursor = conn.cursor()
                 
                 # Tabela de usuários
@@ -40,11 +97,37 @@ class DatabaseManager:
                         is_user BOOLEAN NOT NULL,
                         parent_message_id INTEGER,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        template_id INTEGER,
                         FOREIGN KEY (parent_message_id) REFERENCES messages (id),
-                        FOREIGN KEY (user_id) REFERENCES users (user_id)
+                        FOREIGN KEY (user_id) REFERENCES users (user_id),
+                        FOREIGN KEY (template_id) REFERENCES response_templates (id)
+                    )
+                ''')
+                
+                # Respostas padrão armazenadas uma única vez (messages.template_id)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS response_templates (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        text TEXT UNIQUE NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
                 
+                # Migração de bancos anteriores à coluna template_id
+                columns = [row[1] for row in cursor.execute('PRAGMA table_info(messages)')]
+                if 'template_id' not in columns:
+                    cursor.execute('ALTER TABLE messages ADD COLUMN template_id INTEGER REFERENCES response_templates (id)')
+                    print("[MIGRAÇÃO] Coluna messages.template_id adicionada")
+                
+                # Respostas padrão já cadastradas (por este ou por outro processo)
+                cursor.execute('SELECT text, id FROM response_templates')
+                self._templates = dict(cursor.fetchall())
+                
+                # Índice para consultas por usuário (histórico, exportação)
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_messages_user ON messages (user_id, id)
+                ''')
+                
                 # Tabela de configurações do sistema
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS system_config (
@@ -55,6 +138,48 @@ class DatabaseManager:
                     )
                 ''')
                 
+                # Distribuição de intenções por dia (gerada por intents.py)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS intent_stats (
+                        day TEXT NOT NULL,
+                        intent TEXT NOT NULL,
+                        messages INTEGER NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (day, intent)
+                    )
+                ''')
+                
+                # Respostas pré-geradas para os prompts mais comuns (precomputed.py)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS precomputed_answers (
+                        prompt_key TEXT PRIMARY KEY,
+                        prompt TEXT NOT NULL,
+                        response TEXT NOT NULL,
+                        model TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Tokens e latência das respostas do bot (usage.py)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS message_usage (
+                        message_id INTEGER PRIMARY KEY,
+                        user_id TEXT NOT NULL,
+                        source TEXT NOT NULL,
+                        model TEXT,
+                        prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                        output_tokens INTEGER NOT NULL DEFAULT 0,
+                        cache_hit BOOLEAN NOT NULL DEFAULT 0,
+                        latency_ms REAL,
+                        first_chunk_ms REAL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (message_id) REFERENCES messages (id)
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_message_usage_created ON message_usage (created_at)
+                ''')
+                
                 # Inserir configurações padrão
                 cursor.execute('''
                     INSERT OR IGNORE INTO system_config (config_key, config_value) 
@@ -71,7 +196,7 @@ class DatabaseManager:
     def test_connection(self) -> bool:
         """Testa a conexão com o banco de dados"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT 1")
                 return True
@@ -81,7 +206,7 @@ class DatabaseManager:
     def create_or_update_user(self, user_data: Dict) -> bool:
         """Cria ou atualiza dados do usuário"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect(write=True) as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -102,18 +227,22 @@ class DatabaseManager:
             return False
     
     def save_message(self, user_id: str, message: str, is_user: bool, 
-                    parent_message_id: Optional[int] = None) -> Optional[int]:
-        """Salva uma mensagem no banco de dados"""
+                    parent_message_id: Optional[int] = None,
+                    usage: Optional[Dict] = None) -> Optional[int]:
+        """Salva uma mensagem no banco de dados (e o uso de tokens/latência, se informado)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            message, template_id = self._intern(message, is_user)
+            with self._connect(write=True) as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
-                    INSERT INTO messages (user_id, message, is_user, parent_message_id)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, message, is_user, parent_message_id))
+                    INSERT INTO messages (user_id, message, is_user, parent_message_id, template_id)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, message, is_user, parent_message_id, template_id))
                 
                 message_id = cursor.lastrowid
+                if usage:
+                    cursor.execute(USAGE_INSERT, (message_id, user_id) + usage_values(usage))
                 conn.commit()
                 return message_id
                 
@@ -121,18 +250,57 @@ class DatabaseManager:
             print(f"Erro ao salvar mensagem: {e}")
             return None
     
+    def save_conversation_turns(self, turns: List[Dict]) -> List[Optional[tuple]]:
+        """
+        Salva vários pares (mensagem do usuário, resposta do bot) em uma única transação
+        
+        Args:
+            turns: Lista de dicts com user_id, message, response e usage (opcional)
+            
+        Returns:
+            Lista com (id da mensagem do usuário, id da resposta) na mesma ordem
+        """
+        try:
+            with self._connect(write=True) as conn:
+                cursor = conn.cursor()
+                ids = []
+                
+                for turn in turns:
+                    cursor.execute('''
+                        INSERT INTO messages (user_id, message, is_user, parent_message_id)
+                        VALUES (?, ?, ?, ?)
+                    ''', (turn['user_id'], turn['message'], True, None))
+                    user_message_id = cursor.lastrowid
+                    
+                    response, template_id = self._intern(turn['response'], False)
+                    cursor.execute('''
+                        INSERT INTO messages (user_id, message, is_user, parent_message_id, template_id)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (turn['user_id'], response, False, user_message_id, template_id))
+                    bot_message_id = cursor.lastrowid
+                    if turn.get('usage'):
+                        cursor.execute(USAGE_INSERT, (bot_message_id, turn['user_id']) + usage_values(turn['usage']))
+                    ids.append((user_message_id, bot_message_id))
+                
+                conn.commit()
+                return ids
+                
+        except Exception as e:
+            print(f"Erro ao salvar mensagens em lote: {e}")
+            return [None] * len(turns)
+    
     def get_user_history(self, user_id: str, limit: int = 50) -> List[Dict]:
         """Obtém histórico de mensagens do usuário"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
                 cursor.execute('''
-                    SELECT id, message, is_user, created_at, parent_message_id
-                    FROM messages 
-                    WHERE user_id = ? 
-                    ORDER BY created_at ASC
+                    SELECT m.id, COALESCE(t.text, m.message) AS message, m.is_user, m.created_at, m.parent_message_id
+                    FROM messages m LEFT JOIN response_templates t ON t.id = m.template_id
+                    WHERE m.user_id = ? 
+                    ORDER BY m.created_at ASC, m.id ASC
                     LIMIT ?
                 ''', (user_id, limit))
                 
@@ -155,15 +323,15 @@ class DatabaseManager:
     def get_recent_messages(self, user_id: str, limit: int = 10) -> List[Dict]:
         """Obtém mensagens recentes do usuário"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
                 
                 cursor.execute('''
-                    SELECT id, message, is_user, created_at
-                    FROM messages 
-                    WHERE user_id = ? 
-                    ORDER BY created_at DESC
+                    SELECT m.id, COALESCE(t.text, m.message) AS message, m.is_user, m.created_at
+                    FROM messages m LEFT JOIN response_templates t ON t.id = m.template_id
+                    WHERE m.user_id = ? 
+                    ORDER BY m.created_at DESC, m.id DESC
                     LIMIT ?
                 ''', (user_id, limit))
                 
@@ -185,7 +353,7 @@ class DatabaseManager:
     def get_user_stats(self, user_id: str) -> Dict:
         """Obtém estatísticas do usuário"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # Contar mensagens
@@ -220,12 +388,349 @@ class DatabaseManager:
             print(f"Erro ao obter estatísticas: {e}")
             return {}
     
+    def get_global_stats(self) -> Dict:
+        """Obtém estatísticas agregadas de todo o banco (uso administrativo)"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT COUNT(*), COALESCE(SUM(is_user), 0), COUNT(DISTINCT user_id)
+                    FROM messages
+                ''')
+                total_messages, user_messages, active_users = cursor.fetchone()
+                
+                cursor.execute('SELECT COUNT(*) FROM users')
+                registered_users = cursor.fetchone()[0]
+                
+                return {
+                    'total_messages': total_messages,
+                    'user_messages': user_messages,
+                    'bot_messages': total_messages - user_messages,
+                    'active_users': active_users,
+                    'registered_users': registered_users,
+                    'size_bytes': os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+                }
+                
+        except Exception as e:
+            print(f"Erro ao obter estatísticas globais: {e}")
+            return {}
+    
+    def get_messages_page(self, after_id: int = 0, limit: int = 10000,
+                          is_user: Optional[bool] = None,
+                          user_id: Optional[str] = None) -> List[tuple]:
+        """
+        Página de mensagens com id > after_id, em ordem de id (paginação por
+        chave, para percorrer a tabela inteira em blocos)
+        
+        Erros do banco são propagados: em uma varredura, uma página vazia
+        por falha seria confundida com o fim da tabela.
+        
+        Returns:
+            Lista de tuplas (id, user_id, message, is_user, created_at, parent_message_id)
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            conditions, params = ['m.id > ?'], [after_id]
+            if is_user is not None:
+                conditions.append('m.is_user = ?')
+                params.append(bool(is_user))
+            if user_id is not None:
+                conditions.append('m.user_id = ?')
+                params.append(user_id)
+            cursor.execute(f'''
+                SELECT {MESSAGE_COLUMNS} FROM {MESSAGES_JOIN}
+                WHERE {' AND '.join(conditions)} ORDER BY m.id LIMIT ?
+            ''', params + [limit])
+            return [(row[0], row[1], row[2], bool(row[3]), row[4], row[5]) for row in cursor.fetchall()]
+    
+    def iter_messages(self, user_id: Optional[str] = None, batch_size: int = 1000) -> Iterator[List[Dict]]:
+        """
+        Percorre as mensagens (de um usuário ou de todos) em ordem de id, em
+        páginas de ``batch_size`` lidas com get_messages_page
+        
+        Cada página usa uma conexão própria e uma leitura curta: uma
+        exportação lenta não prende uma conexão do pool nem mantém uma
+        transação de leitura aberta (o que impediria o checkpoint do WAL).
+        """
+        after_id = 0
+        while True:
+            page = self.get_messages_page(after_id, batch_size, None, user_id)
+            if not page:
+                return
+            yield [
+                {
+                    'id': row[0],
+                    'user_id': row[1],
+                    'message': row[2],
+                    'is_user': row[3],
+                    'created_at': row[4],
+                    'parent_message_id': row[5]
+                }
+                for row in page
+            ]
+            after_id = page[-1][0]
+    
+    def drop_secondary_indexes(self) -> List[str]:
+        """Remove os índices da tabela messages (carga em massa); retorna o SQL para recriá-los"""
+        with self._connect(write=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT name, sql FROM sqlite_master
+                WHERE type = 'index' AND tbl_name = 'messages' AND sql IS NOT NULL
+            ''')
+            indexes = cursor.fetchall()
+            for name, _ in indexes:
+                cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+            return [sql for _, sql in indexes]
+    
+    def restore_indexes(self, statements: List[str]):
+        """Recria índices removidos por drop_secondary_indexes"""
+        with self._connect(write=True) as conn:
+            for statement in statements:
+                conn.execute(statement)
+    
+    def insert_messages(self, rows: List[Dict], id_map: Optional[Dict[int, int]] = None) -> List[int]:
+        """
+        Insere mensagens prontas (user_id, message, is_user, created_at,
+        parent_message_id) em uma única transação; retorna os novos ids
+        
+        Com ``id_map`` (id original -> id novo, compartilhado entre lotes), o
+        parent_message_id é remapeado e o id de cada linha é registrado.
+        """
+        with self._connect(write=True) as conn:
+            cursor = conn.cursor()
+            ids = []
+            for row in rows:
+                parent_id = row.get('parent_message_id')
+                if id_map is not None:
+                    parent_id = id_map.get(parent_id)
+                message, template_id = self._intern(row['message'], row['is_user'])
+                cursor.execute('''
+                    INSERT INTO messages (user_id, message, is_user, parent_message_id, created_at, template_id)
+                    VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+                ''', (row['user_id'], message, bool(row['is_user']), parent_id, row.get('created_at'), template_id))
+                ids.append(cursor.lastrowid)
+                if id_map is not None and row.get('id') is not None:
+                    id_map[row['id']] = cursor.lastrowid
+            return ids
+    
+    def replace_intent_stats(self, rows: List[tuple]) -> bool:
+        """Substitui a distribuição de intenções por (dia, intenção, mensagens)"""
+        try:
+            with self._connect(write=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM intent_stats')
+                cursor.executemany('''
+                    INSERT INTO intent_stats (day, intent, messages, updated_at)
+                    VALUES (?, ?, ?, ?)
+                ''', [(day, intent, count, datetime.now().isoformat()) for day, intent, count in rows])
+                conn.commit()
+                return True
+                
+        except Exception as e:
+            print(f"Erro ao salvar estatísticas de intenções: {e}")
+            return False
+    
+    def get_intent_stats(self) -> List[Dict]:
+        """Obtém a distribuição de intenções por dia"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT day, intent, messages, updated_at FROM intent_stats
+                    ORDER BY day, intent
+                ''')
+                return [
+                    {'day': day, 'intent': intent, 'messages': count, 'updated_at': updated_at}
+                    for day, intent, count, updated_at in cursor.fetchall()
+                ]
+                
+        except Exception as e:
+            print(f"Erro ao obter estatísticas de intenções: {e}")
+            return []
+    
+    def get_precomputed_answers(self) -> List[Dict]:
+        """Obtém todas as respostas pré-geradas"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT prompt_key, prompt, response, model, updated_at FROM precomputed_answers
+                ''')
+                return [
+                    {'prompt_key': key, 'prompt': prompt, 'response': response,
+                     'model': model, 'updated_at': updated_at}
+                    for key, prompt, response, model, updated_at in cursor.fetchall()
+                ]
+                
+        except Exception as e:
+            print(f"Erro ao obter respostas pré-geradas: {e}")
+            return []
+    
+    def save_precomputed_answer(self, prompt_key: str, prompt: str, response: str,
+                                model: Optional[str] = None) -> bool:
+        """Cria ou substitui a resposta pré-gerada de um prompt"""
+        try:
+            with self._connect(write=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO precomputed_answers (prompt_key, prompt, response, model, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (prompt_key, prompt, response, model, datetime.now().isoformat()))
+                conn.commit()
+                return True
+                
+        except Exception as e:
+            print(f"Erro ao salvar resposta pré-gerada: {e}")
+            return False
+    
+    def delete_precomputed_answers(self, prompt_keys: List[str]) -> bool:
+        """Remove as respostas pré-geradas dos prompts informados"""
+        try:
+            with self._connect(write=True) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('DELETE FROM precomputed_answers WHERE prompt_key = ?',
+                                   [(key,) for key in prompt_keys])
+                conn.commit()
+                return True
+                
+        except Exception as e:
+            print(f"Erro ao remover respostas pré-geradas: {e}")
+            return False
+    
+    def _intern(self, message: str, is_user: bool) -> tuple:
+        """(texto a gravar, template_id): respostas padrão do bot viram só a referência"""
+        template_id = None if is_user else self._templates.get(message)
+        return ('' if template_id else message), template_id
+    
+    def register_response_templates(self, texts: List[str]) -> Dict[str, int]:
+        """Cadastra as respostas padrão (idempotente) e passa a salvá-las por referência"""
+        try:
+            with self._connect(write=True) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('INSERT OR IGNORE INTO response_templates (text) VALUES (?)',
+                                   [(text,) for text in texts])
+                cursor.execute('SELECT text, id FROM response_templates')
+                self._templates = dict(cursor.fetchall())
+                return dict(self._templates)
+                
+        except Exception as e:
+            print(f"Erro ao cadastrar respostas padrão: {e}")
+            return {}
+    
+    def compact_messages(self, batch_size: int = 5000, vacuum: bool = False) -> Dict:
+        """
+        Converte respostas já salvas com o texto completo de uma resposta
+        padrão em referências (em lotes por faixa de id, para não segurar a
+        escrita); com ``vacuum`` o arquivo é reescrito para liberar o espaço
+        """
+        report = {'converted': 0, 'bytes_saved': 0, 'size_before': self._file_size(), 'size_after': None}
+        with self._connect() as conn:
+            max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM messages').fetchone()[0]
+        
+        for start in range(0, max_id, batch_size):
+            with self._connect(write=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(message AS BLOB))), 0) FROM messages
+                    WHERE id > ? AND id <= ? AND is_user = 0 AND template_id IS NULL
+                      AND message IN (SELECT text FROM response_templates)
+                ''', (start, start + batch_size))
+                converted, saved = cursor.fetchone()
+                if converted:
+                    cursor.execute('''
+                        UPDATE messages
+                        SET template_id = (SELECT id FROM response_templates WHERE text = messages.message),
+                            message = ''
+                        WHERE id > ? AND id <= ? AND is_user = 0 AND template_id IS NULL
+                          AND message IN (SELECT text FROM response_templates)
+                    ''', (start, start + batch_size))
+                    report['converted'] += converted
+                    report['bytes_saved'] += saved
+        
+        if vacuum:
+            # VACUUM não pode rodar dentro de uma transação
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            try:
+                conn.execute('VACUUM')
+            finally:
+                conn.close()
+        report['size_after'] = self._file_size()
+        print(f"[COMPACTAÇÃO] {self.db_path}: {report}")
+        return report
+    
+    def get_template_stats(self) -> Dict:
+        """Quantas respostas estão salvas por referência e o texto que deixou de ser duplicado"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT COUNT(*) FROM response_templates')
+                templates = cursor.fetchone()[0]
+                cursor.execute('''
+                    SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(t.text AS BLOB))), 0)
+                    FROM messages m JOIN response_templates t ON t.id = m.template_id
+                ''')
+                interned, bytes_saved = cursor.fetchone()
+                cursor.execute('''
+                    SELECT COUNT(*) FROM messages
+                    WHERE is_user = 0 AND template_id IS NULL
+                      AND message IN (SELECT text FROM response_templates)
+                ''')
+                pending = cursor.fetchone()[0]
+                return {
+                    'templates': templates,
+                    'interned_messages': interned,
+                    'bytes_saved': bytes_saved,
+                    'pending_compaction': pending
+                }
+                
+        except Exception as e:
+            print(f"Erro ao obter estatísticas de respostas padrão: {e}")
+            return {}
+    
+    def get_usage_rows(self, since: Optional[str] = None, group_by: str = 'user') -> List[tuple]:
+        """Somas parciais de message_usage por grupo (formato de usage.build_usage_report)"""
+        expression = USAGE_GROUP_SQL[group_by]
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {expression}, COUNT(*), SUM(prompt_tokens), SUM(output_tokens), SUM(cache_hit),
+                           COALESCE(SUM(latency_ms), 0), COUNT(latency_ms), MAX(latency_ms),
+                           COALESCE(SUM(first_chunk_ms), 0), COUNT(first_chunk_ms)
+                    FROM message_usage
+                    WHERE created_at >= ?
+                    GROUP BY 1
+                ''', (since or '',))
+                return cursor.fetchall()
+                
+        except Exception as e:
+            print(f"Erro ao obter uso de tokens: {e}")
+            return []
+    
+    def get_usage_report(self, since: Optional[str] = None, group_by: str = 'user',
+                         limit: int = 20, order_by: str = 'tokens') -> Dict:
+        """Tokens, acertos de cache e latência agregados por usuário, modelo, origem ou dia"""
+        return build_usage_report(self.get_usage_rows(since, group_by), group_by, limit, order_by, since)
+    
+    def _file_size(self) -> int:
+        """Tamanho do banco em disco (arquivo principal + WAL)"""
+        return sum(os.path.getsize(path) for path in (self.db_path, self.db_path + '-wal') if os.path.exists(path))
+    
     def clear_user_history(self, user_id: str) -> bool:
-        """Limpa histórico de mensagens do usuário"""
+        """
+        Limpa histórico de mensagens do usuário
+        
+        O uso das respostas (message_usage) é apagado junto: cada linha aponta
+        para uma mensagem e identifica o usuário. Os relatórios de uso deixam
+        de contar os tokens das conversas apagadas.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect(write=True) as conn:
                 cursor = conn.cursor()
                 
+                cursor.execute('DELETE FROM message_usage WHERE user_id = ?', (user_id,))
                 cursor.execute('DELETE FROM messages WHERE user_id = ?', (user_id,))
                 conn.commit()
                 return True
@@ -237,7 +742,7 @@ class DatabaseManager:
     def get_system_config(self, config_key: str) -> Optional[str]:
         """Obtém configuração do sistema"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -251,10 +756,34 @@ class DatabaseManager:
             print(f"Erro ao obter configuração: {e}")
             return None
     
+    def get_all_system_config(self) -> Dict[str, Optional[str]]:
+        """Obtém todas as configurações do sistema"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT config_key, config_value FROM system_config')
+                return dict(cursor.fetchall())
+                
+        except Exception as e:
+            print(f"Erro ao obter configurações: {e}")
+            return {}
+    
+    def get_system_config_version(self) -> Optional[tuple]:
+        """Retorna uma assinatura barata da tabela system_config para detectar mudanças"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT COUNT(*), MAX(updated_at) FROM system_config')
+                return cursor.fetchone()
+                
+        except Exception as e:
+            print(f"Erro ao verificar configurações: {e}")
+            return None
+    
     def set_system_config(self, config_key: str, config_value: str) -> bool:
         """Define configuração do sistema"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect(write=True) as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
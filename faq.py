@@ -0,0 +1,475 @@
+"""
+Respostas locais para perguntas frequentes (BM25)
+
+As perguntas de ``FAQ_PATH`` (um JSON por linha: id, question, alternatives,
+keywords e answer) formam um índice invertido em memória. Cada forma da
+pergunta (a principal e as alternativas) é um documento curto; o texto passa
+pela mesma normalização do cache semântico (minúsculas, sem acentos e sem
+pontuação), perde as palavras vazias e é reduzido a um radical simples de
+português (plural, -mente, -ção, terminações verbais).
+
+A consulta é pontuada com BM25 e a confiança é a pontuação dividida pela
+pontuação ideal (a maior entre a da própria consulta e a do documento):
+palavras da mensagem que não existem no FAQ, ou partes da pergunta que a
+mensagem não cobre, derrubam a confiança. Só respostas com confiança acima
+de ``FAQ_THRESHOLD`` e que cobrem todos os termos da mensagem (em alguma
+forma da pergunta) são usadas: "limpar o histórico do navegador" não vira
+a resposta sobre o histórico do chat. O resto segue para as intenções.
+
+Alterações no arquivo são aplicadas de forma incremental (só as perguntas
+novas, alteradas ou removidas entram/saem do índice).
+
+Uso (benchmark de latência e acerto):
+    python faq.py bench [--path faq.jsonl] [--synthetic 5000]
+"""
+import hashlib
+import heapq
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from semantic_cache import normalize_text
+
+# Palavras vazias (já sem acento) ignoradas na indexação e na consulta
+STOPWORDS = frozenset('''
+a o as os um uma uns umas de do da dos das em no na nos nas num numa por pelo pela pelos pelas
+para pra pro ao aos com sem e ou mas que se me te lhe nos vos eu tu voce voces ele ela eles elas
+meu minha meus minhas seu sua seus suas isso isto esse essa este esta aquilo ja ha so tambem
+muito mais menos tao como qual quais quem onde quando porque por que o que e sao ser foi tem ter
+posso pode podem consigo quero preciso gostaria faco fazer quanto quantos quanta quantas algum alguma alguns algumas todo toda todos todas la aqui ai ne
+'''.split())
+
+# Sufixos removidos pelo radicalizador (do mais longo para o mais curto)
+SUFFIXES = sorted([
+    'amentos', 'imentos', 'amento', 'imento', 'mente', 'idade', 'acao', 'icao', 'cao',
+    'ando', 'endo', 'indo', 'aram', 'eram', 'iram', 'ado', 'ada', 'ido', 'ida',
+    'avel', 'ivel', 'ar', 'er', 'ir'
+], key=len, reverse=True)
+MIN_STEM = 3
+
+
+def stem(word: str) -> str:
+    """Radical aproximado de uma palavra normalizada (sem acentos)"""
+    if len(word) <= MIN_STEM or word.isdigit():
+        return word
+    if word.endswith('ns'):
+        word = word[:-2] + 'm'
+    elif word.endswith(('oes', 'aes')):
+        word = word[:-3] + 'ao'
+    elif word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    if word[-1] in 'aeo' and len(word) > MIN_STEM:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Termos indexáveis: normalizados, sem palavras vazias e radicalizados"""
+    return [stem(word) for word in normalize_text(text).split() if word not in STOPWORDS]
+
+
+class FaqIndex:
+    """
+    Índice invertido BM25 com inclusão e remoção incrementais
+
+    ``postings`` mapeia termo -> {doc_id: frequência}; o comprimento médio
+    dos documentos é mantido por soma, então incluir ou remover um documento
+    não exige reconstruir o índice.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def add_document(self, doc_id: str, text: str):
+        if doc_id in self.doc_terms:
+            self.remove_document(doc_id)
+        terms = tokenize(text)
+        self.doc_terms[doc_id] = tuple(terms)
+        self.total_length += len(terms)
+        for term in terms:
+            postings = self.postings.setdefault(term, {})
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+
+    def remove_document(self, doc_id: str):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= len(terms)
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def idf(self, term: str) -> float:
+        """IDF do BM25 (sempre positivo); termos fora do índice têm o maior valor"""
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.doc_terms) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, limit: int = 3) -> List[Tuple[str, float, float]]:
+        """Melhores documentos como (doc_id, pontuação BM25, confiança 0-1)"""
+        terms = set(tokenize(query))
+        if not terms or not self.doc_terms:
+            return []
+        avg_length = self.total_length / len(self.doc_terms) or 1.0
+        k1, b = self.k1, self.b
+        idf = {term: self.idf(term) for term in terms}
+        scores: Dict[str, float] = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            weight = idf[term]
+            for doc_id, tf in postings.items():
+                length = len(self.doc_terms[doc_id])
+                norm = tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * norm
+
+        query_ideal = sum(idf.values())
+        results = []
+        for doc_id, score in heapq.nlargest(limit, scores.items(), key=lambda item: item[1]):
+            doc_ideal = sum(self.idf(term) for term in set(self.doc_terms[doc_id]))
+            confidence = min(1.0, score / max(query_ideal, doc_ideal))
+            results.append((doc_id, score, confidence))
+        return results
+
+
+def resolve_path(path: str) -> str:
+    """Caminhos relativos partem da pasta do projeto (o FAQ é distribuído junto)"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+
+
+def _entry_hash(entry: Dict) -> str:
+    payload = json.dumps(entry, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def load_entries(path: str) -> Dict[str, Dict]:
+    """Lê o arquivo do FAQ; linhas inválidas são ignoradas com aviso"""
+    entries = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                entry = json.loads(line)
+                entry_id = str(entry.get('id') or number)
+                if not entry.get('question') or not entry.get('answer'):
+                    raise ValueError('question e answer são obrigatórios')
+            except ValueError as e:
+                print(f"[FAQ] Linha {number} ignorada em {path}: {e}")
+                continue
+            entries[entry_id] = entry
+    return entries
+
+
+def _variants(entry: Dict) -> Iterable[str]:
+    yield entry['question']
+    for alternative in entry.get('alternatives') or []:
+        yield alternative
+    keywords = entry.get('keywords') or []
+    if keywords:
+        yield ' '.join(keywords)
+
+
+class FaqEngine:
+    """
+    Responde perguntas frequentes a partir do índice BM25
+
+    O arquivo é verificado no máximo a cada ``FAQ_RELOAD_INTERVAL`` segundos
+    (pela data de modificação) e só as entradas alteradas são reindexadas.
+    ``on_reload`` recebe as respostas carregadas (ex.: para registrá-las
+    como modelos de resposta no banco).
+    """
+
+    def __init__(self, cfg, on_reload: Optional[Callable[[List[str]], None]] = None):
+        self.cfg = cfg
+        self.on_reload = on_reload
+        self.index = FaqIndex()
+        self._entries: Dict[str, Dict] = {}
+        self._hashes: Dict[str, str] = {}
+        self._path = None
+        self._mtime = None
+        self._checked = 0.0
+        self._checked_path = None
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'below_threshold': 0, 'reloads': 0,
+                      'lookup_ms_total': 0.0}
+        if cfg.FAQ_ENABLED:
+            self._checked = time.monotonic()
+            self._checked_path = cfg.FAQ_PATH
+            self.reload()
+
+    def reload(self, force: bool = False) -> Dict[str, int]:
+        """Reindexa as entradas novas, alteradas e removidas; retorna as contagens"""
+        path = resolve_path(self.cfg.FAQ_PATH)
+        changes = {'added': 0, 'updated': 0, 'removed': 0}
+        try:
+            mtime = os.path.getmtime(path)
+            if not force and path == self._path and mtime == self._mtime:
+                return changes
+            entries = load_entries(path)
+        except OSError as e:
+            print(f"[FAQ] Não foi possível ler {path}: {e}")
+            return changes
+
+        hashes = {entry_id: _entry_hash(entry) for entry_id, entry in entries.items()}
+        with self._lock:
+            for entry_id in list(self._entries):
+                if entry_id not in entries:
+                    self._remove_entry(entry_id)
+                    changes['removed'] += 1
+            for entry_id, entry in entries.items():
+                previous = self._hashes.get(entry_id)
+                if previous == hashes[entry_id]:
+                    continue
+                if previous is not None:
+                    self._remove_entry(entry_id)
+                    changes['updated'] += 1
+                else:
+                    changes['added'] += 1
+                self._add_entry(entry_id, entry, hashes[entry_id])
+            self._path = path
+            self._mtime = mtime
+            self.stats['reloads'] += 1
+
+        if any(changes.values()):
+            print(f"[FAQ] {len(self._entries)} perguntas indexadas de {path} "
+                  f"(+{changes['added']} ~{changes['updated']} -{changes['removed']})")
+            if self.on_reload is not None:
+                self.on_reload(self.answers())
+        return changes
+
+    def _add_entry(self, entry_id: str, entry: Dict, entry_hash: str):
+        entry = dict(entry, variants=0)
+        terms = set()
+        for number, text in enumerate(_variants(entry)):
+            self.index.add_document(f'{entry_id}#{number}', text)
+            terms.update(self.index.doc_terms[f'{entry_id}#{number}'])
+            entry['variants'] = number + 1
+        # Vocabulário da entrada (todas as formas), para exigir cobertura da mensagem
+        entry['terms'] = frozenset(terms)
+        self._entries[entry_id] = entry
+        self._hashes[entry_id] = entry_hash
+
+    def _remove_entry(self, entry_id: str):
+        entry = self._entries.pop(entry_id)
+        self._hashes.pop(entry_id, None)
+        for number in range(entry['variants']):
+            self.index.remove_document(f'{entry_id}#{number}')
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.cfg.FAQ_RELOAD_INTERVAL and self.cfg.FAQ_PATH == self._checked_path:
+            return
+        self._checked = now
+        self._checked_path = self.cfg.FAQ_PATH
+        self.reload()
+
+    def search(self, message: str, limit: int = 3) -> List[Dict]:
+        """
+        Perguntas mais parecidas com a mensagem (uma por entrada), sem aplicar o limiar
+
+        ``missing`` lista os termos da mensagem ausentes da entrada.
+        """
+        query_terms = set(tokenize(message))
+        with self._lock:
+            found = self.index.search(message, limit * 2)
+            results, seen = [], set()
+            for doc_id, score, confidence in found:
+                entry_id = doc_id.rsplit('#', 1)[0]
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                entry = self._entries[entry_id]
+                results.append({
+                    'id': entry_id,
+                    'question': entry['question'],
+                    'answer': entry['answer'],
+                    'score': round(score, 4),
+                    'confidence': round(confidence, 4),
+                    'missing': sorted(query_terms - entry['terms'])
+                })
+        return results[:limit]
+
+    def lookup(self, message: str) -> Optional[Dict]:
+        """Melhor entrada que cobre a mensagem com confiança acima de FAQ_THRESHOLD (ou None)"""
+        if not self.cfg.FAQ_ENABLED:
+            return None
+        started = time.perf_counter()
+        self._maybe_reload()
+        results = self.search(message, limit=1)
+        match = results[0] if results and is_match(results[0], self.cfg.FAQ_THRESHOLD) else None
+        with self._lock:
+            self.stats['lookups'] += 1
+            self.stats['lookup_ms_total'] += (time.perf_counter() - started) * 1000
+            if match:
+                self.stats['hits'] += 1
+            elif results:
+                self.stats['below_threshold'] += 1
+        return match
+
+    def answer(self, message: str) -> Optional[str]:
+        match = self.lookup(message)
+        return match['answer'] if match else None
+
+    def answers(self) -> List[str]:
+        return [entry['answer'] for entry in self._entries.values()]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['lookups']
+        stats['avg_lookup_ms'] = round(stats.pop('lookup_ms_total') / lookups, 4) if lookups else 0.0
+        stats.update({
+            'enabled': self.cfg.FAQ_ENABLED,
+            'path': self._path,
+            'entries': len(self._entries),
+            'documents': len(self.index),
+            'terms': len(self.index.postings),
+            'threshold': self.cfg.FAQ_THRESHOLD,
+            'hit_rate': round(stats['hits'] / lookups, 3) if lookups else 0.0
+        })
+        return stats
+
+
+def is_match(result: Dict, threshold: float) -> bool:
+    """Resultado de ``FaqEngine.search`` aceito como resposta"""
+    return result['confidence'] >= threshold and not result['missing']
+
+
+# Consultas rotuladas para o benchmark: (mensagem, id esperado ou None = deve ir ao Gemini)
+BENCH_QUERIES = [
+    ('como faço para limpar o histórico?', 'limpar-historico'),
+    ('quero apagar minhas conversas', 'limpar-historico'),
+    ('dá pra exportar as mensagens?', 'exportar-historico'),
+    ('como baixar o histórico da conversa', 'exportar-historico'),
+    ('como ativar o gemini', 'ativar-gemini'),
+    ('onde pego a api key do gemini?', 'chave-api'),
+    ('vocês guardam as minhas mensagens?', 'privacidade'),
+    ('recebi erro 429', 'limite-mensagens'),
+    ('quantos caracteres cabem numa mensagem?', 'tamanho-mensagem'),
+    ('você fala inglês?', 'idiomas'),
+    ('por que o chat está tão lento?', 'respostas-lentas'),
+    ('a quota do gemini acabou', 'erro-quota'),
+    ('como troco meu nome?', 'mudar-nome'),
+    ('funciona no celular?', 'celular'),
+    ('posso mandar uma foto?', 'anexos'),
+    ('tem tema escuro?', 'tema-escuro'),
+    ('você lembra das mensagens anteriores?', 'contexto'),
+    ('encontrei um bug', 'reportar-problema'),
+    ('olá, tudo bem?', None),
+    ('me conte uma curiosidade', None),
+    ('qual a capital da frança?', None),
+    ('explique a teoria da relatividade', None),
+    ('escreva um poema sobre o mar', None),
+    ('como você funciona?', None),
+    # Quase-acertos: palavras do FAQ em perguntas gerais (devem seguir para o Gemini)
+    ('qual o limite de caracteres de um tweet?', None),
+    ('como mudar o tema do vscode para escuro?', None),
+    ('como reportar um bug no github?', None),
+    ('como exportar uma planilha do excel?', None),
+    ('como limpar o histórico do navegador?', None),
+    ('qual o limite de upload do google drive?', None),
+    ('como trocar o nome de usuário no instagram?', None),
+    ('o whatsapp funciona no celular sem internet?', None),
+    ('como configurar a chave ssh no github?', None),
+    ('o chatgpt lembra das conversas anteriores?', None),
+    ('por que meu computador está lento?', None),
+    ('como mandar uma foto por email?', None),
+]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def _synthetic_engine(cfg, size: int, seed: int = 7) -> 'FaqEngine':
+    """Motor com o FAQ real mais ``size`` perguntas sintéticas (vocabulário aleatório)"""
+    engine = FaqEngine(cfg)
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice('abcdefghijlmnoprstuv') for _ in range(rng.randint(4, 9)))
+                  for _ in range(20000)]
+    with engine._lock:
+        for number in range(size):
+            entry = {
+                'question': ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(4, 10))),
+                'alternatives': [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(3, 8)))],
+                'answer': f'resposta sintética {number}'
+            }
+            engine._add_entry(f'synthetic-{number}', entry, '')
+    return engine
+
+
+def run_benchmark(cfg, synthetic: int = 5000, rounds: int = 200):
+    engine = FaqEngine(cfg)
+    correct = answered = false_positives = 0
+    print(f"[FAQ] Acerto em {len(BENCH_QUERIES)} consultas rotuladas (limiar {cfg.FAQ_THRESHOLD})")
+    for message, expected in BENCH_QUERIES:
+        results = engine.search(message, limit=1)
+        best = results[0] if results else None
+        match = best if best and is_match(best, cfg.FAQ_THRESHOLD) else None
+        got = match['id'] if match else None
+        if expected is None:
+            false_positives += got is not None
+        else:
+            answered += got is not None
+            correct += got == expected
+        status = 'ok' if got == expected else 'ERRO'
+        detail = f"{best['id']} ({best['confidence']:.2f})" if best else '-'
+        print(f"  [{status:4}] {message!r:45} -> {got or 'Gemini':20} melhor: {detail}")
+    positives = sum(1 for _, expected in BENCH_QUERIES if expected)
+    print(f"  recall@1: {correct / positives:.2f} | precisão: {correct / answered if answered else 0:.2f} "
+          f"| falsos positivos: {false_positives}/{len(BENCH_QUERIES) - positives}")
+
+    for label, target in (('FAQ real', engine), (f'FAQ + {synthetic} sintéticas', _synthetic_engine(cfg, synthetic))):
+        timings = []
+        for _ in range(rounds):
+            for message, _ in BENCH_QUERIES:
+                started = time.perf_counter()
+                target.search(message, limit=1)
+                timings.append((time.perf_counter() - started) * 1000)
+        print(f"[FAQ] {label}: {len(target.index)} documentos, {len(target.index.postings)} termos | "
+              f"p50 {_percentile(timings, 0.5):.3f} ms | p99 {_percentile(timings, 0.99):.3f} ms")
+
+    started = time.perf_counter()
+    engine.reload(force=True)
+    print(f"[FAQ] Recarga incremental sem alterações: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+def main():
+    import argparse
+    from config import config_store
+
+    parser = argparse.ArgumentParser(description='Benchmark do FAQ local (BM25)')
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--path', default=None, help='Arquivo do FAQ (padrão: FAQ_PATH)')
+    parser.add_argument('--synthetic', type=int, default=5000, help='Perguntas sintéticas no teste de escala')
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    cfg = config_store.override(FAQ_PATH=args.path) if args.path else config_store.current()
+    run_benchmark(cfg, args.synthetic, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
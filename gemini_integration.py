@@ -2,9 +2,169 @@
 Módulo para integração futura com a API do Google Gemini
 """
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
 from typing import Optional, Dict, Any
-import google.generativeai as genai
 from datetime import datetime
+from config import config_store
+from gemini_rest import RestModel
+from intents import classify_intent
+from profiling import span, timed
+from response_cache import cache_key, create_response_cache
+from usage import token_counts
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+
+# Peso de cada intenção no escore de complexidade (intents.py)
+INTENT_WEIGHTS = {
+    'greeting': -0.3,
+    'how_works': 0.05,
+    'curiosity': 0.05,
+    'gemini_info': 0.0,
+    'default': 0.2
+}
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class ModelRouter:
+    """
+    Escolhe entre um modelo rápido/barato e um mais forte para cada mensagem
+    
+    O escore (0 a 1) combina tamanho da mensagem, intenção detectada e
+    tamanho do contexto; mensagens acima do limiar vão para o modelo forte.
+    O limiar se ajusta pela latência recente: se o modelo forte passa do seu
+    alvo, menos mensagens vão para ele (e o contrário se o rápido estiver
+    lento). Cada modelo tem um limite de requisições simultâneas; se o
+    escolhido estiver lotado e o outro tiver vaga, a mensagem vai para o outro.
+    """
+    
+    TIERS = ('fast', 'strong')
+    
+    def __init__(self, cfg):
+        self.models = {'fast': cfg.GEMINI_FAST_MODEL, 'strong': cfg.GEMINI_STRONG_MODEL or cfg.GEMINI_MODEL}
+        self.threshold = cfg.GEMINI_ROUTER_THRESHOLD
+        self.targets = {'fast': cfg.GEMINI_FAST_LATENCY_TARGET, 'strong': cfg.GEMINI_STRONG_LATENCY_TARGET}
+        self.capacity = {'fast': cfg.GEMINI_FAST_CONCURRENCY, 'strong': cfg.GEMINI_STRONG_CONCURRENCY}
+        self.wait_timeout = cfg.GEMINI_HARD_TIMEOUT
+        self._slots = {tier: threading.BoundedSemaphore(self.capacity[tier]) for tier in self.TIERS}
+        self._latencies = {tier: deque(maxlen=cfg.GEMINI_ROUTER_WINDOW) for tier in self.TIERS}
+        self._lock = threading.Lock()
+        self._in_flight = {tier: 0 for tier in self.TIERS}
+        self._counts = {tier: {'routed': 0, 'spilled_in': 0, 'errors': 0} for tier in self.TIERS}
+        self._recent = deque(maxlen=20)
+    
+    def score(self, message: str, context: Optional[str] = None) -> float:
+        """Complexidade estimada da mensagem (0 = trivial, 1 = complexa)"""
+        value = min(len(message.split()) / 30, 1.0) * 0.6
+        value += INTENT_WEIGHTS.get(classify_intent(message), 0.0)
+        if context:
+            value += min(len(context) / 1500, 1.0) * 0.2
+        if message.count('?') > 1 or '\n' in message.strip():
+            value += 0.1
+        return max(0.0, min(1.0, value))
+    
+    def _latency_ratio(self, tier: str) -> float:
+        """Quanto o p90 recente passa do alvo (0 = dentro do alvo, 1 = o dobro ou mais)"""
+        latencies = self._latencies[tier]
+        if len(latencies) < 5 or self.targets[tier] <= 0:
+            return 0.0
+        return max(0.0, min(1.0, _percentile(latencies, 0.9) / self.targets[tier] - 1))
+    
+    def effective_threshold(self) -> float:
+        with self._lock:
+            adjustment = 0.3 * (self._latency_ratio('strong') - self._latency_ratio('fast'))
+        return max(0.0, min(1.0, self.threshold + adjustment))
+    
+    def _acquire(self, tier: str) -> tuple:
+        """Reserva uma vaga no modelo escolhido (ou no outro, se o escolhido estiver lotado)"""
+        other = 'strong' if tier == 'fast' else 'fast'
+        if self._slots[tier].acquire(blocking=False):
+            return tier, False
+        if self._slots[other].acquire(blocking=False):
+            return other, True
+        if self._slots[tier].acquire(timeout=self.wait_timeout):
+            return tier, False
+        raise TimeoutError(f"Limite de requisições simultâneas do modelo {self.models[tier]}")
+    
+    @contextmanager
+    def dispatch(self, message: str, context: Optional[str] = None):
+        """
+        Escolhe o modelo e reserva a vaga durante a chamada; a latência e o
+        resultado entram nas estatísticas ao sair do bloco
+        """
+        score = self.score(message, context)
+        threshold = self.effective_threshold()
+        chosen = 'strong' if score >= threshold else 'fast'
+        tier, spilled = self._acquire(chosen)
+        decision = {
+            'tier': tier,
+            'model': self.models[tier],
+            'score': round(score, 3),
+            'threshold': round(threshold, 3),
+            'spilled': spilled
+        }
+        with self._lock:
+            self._in_flight[tier] += 1
+            self._counts[tier]['routed'] += 1
+            self._counts[tier]['spilled_in'] += int(spilled)
+            self._recent.append(dict(decision, at=datetime.now().isoformat()))
+        print(f"[ROTEADOR] {tier} ({decision['model']}) - escore {score:.2f}, limiar {threshold:.2f}"
+              f"{' (vaga no outro modelo)' if spilled else ''}")
+        
+        started = time.perf_counter()
+        failed = cancelled = False
+        try:
+            yield decision
+        except GeneratorExit:
+            # Stream fechado pelo consumidor no meio: libera a vaga sem contar latência nem erro
+            cancelled = True
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._in_flight[tier] -= 1
+                if failed:
+                    self._counts[tier]['errors'] += 1
+                elif not cancelled:
+                    self._latencies[tier].append(elapsed)
+            self._slots[tier].release()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        threshold = self.effective_threshold()
+        with self._lock:
+            tiers = {}
+            for tier in self.TIERS:
+                latencies = self._latencies[tier]
+                tiers[tier] = dict(
+                    self._counts[tier],
+                    model=self.models[tier],
+                    in_flight=self._in_flight[tier],
+                    capacity=self.capacity[tier],
+                    latency_target_ms=round(self.targets[tier] * 1000, 1),
+                    latency_p50_ms=round(_percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+                    latency_p90_ms=round(_percentile(latencies, 0.9) * 1000, 1) if latencies else None,
+                    samples=len(latencies)
+                )
+            return {
+                'enabled': True,
+                'base_threshold': self.threshold,
+                'effective_threshold': round(threshold, 3),
+                'tiers': tiers,
+                'recent_decisions': list(self._recent)
+            }
+
 
 class GeminiIntegration:
     """
@@ -15,6 +175,12 @@ class GeminiIntegration:
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         self.model = None
         self.chat_session = None
+        self.transport = None
+        # Modelos por nível quando o roteador está ativo (GEMINI_ROUTER_ENABLED)
+        self.router = None
+        self.models: Dict[str, Any] = {}
+        # Cache de respostas compartilhado entre workers (RESPONSE_CACHE_ENABLED)
+        self.response_cache = None
         
         if self.api_key:
             self.initialize_gemini()
@@ -22,16 +188,61 @@ class GeminiIntegration:
     def initialize_gemini(self):
         """Inicializa a conexão com a API do Gemini"""
         try:
-            from config import config
+            cfg = config_store.current()
+            self.transport = cfg.GEMINI_TRANSPORT
+            if self.transport == 'sdk' and genai is None:
+                print("[AVISO] google-generativeai não instalado - usando o transporte REST")
+                self.transport = 'rest'
+            
+            if self.transport == 'rest':
+                # Cliente HTTP próprio: pool keep-alive e timeouts configuráveis
+                self.model = RestModel(
+                    self.api_key,
+                    cfg.GEMINI_MODEL,
+                    base_url=cfg.GEMINI_API_BASE,
+                    pool_size=cfg.GEMINI_POOL_SIZE,
+                    connect_timeout=cfg.GEMINI_CONNECT_TIMEOUT,
+                    read_timeout=cfg.GEMINI_READ_TIMEOUT
+                )
+            else:
+                genai.configure(api_key=self.api_key)
+                # Usar configurações do snapshot atual
+                self.model = genai.GenerativeModel(cfg.GEMINI_MODEL)
+            print(f"[OK] Gemini API inicializada com sucesso! Modelo: {cfg.GEMINI_MODEL} ({self.transport})")
             
-            genai.configure(api_key=self.api_key)
-            # Usar configurações do arquivo .env
-            self.model = genai.GenerativeModel(config.GEMINI_MODEL)
-            print(f"[OK] Gemini API inicializada com sucesso! Modelo: {config.GEMINI_MODEL}")
+            if cfg.GEMINI_ROUTER_ENABLED:
+                self.router = ModelRouter(cfg)
+                self.models = {tier: self._model_for(name) for tier, name in self.router.models.items()}
+                print(f"[OK] Roteador de modelos ativo: {self.router.models['fast']} / {self.router.models['strong']}")
+            
+            self.response_cache = create_response_cache(cfg)
         except Exception as e:
             print(f"[ERRO] Erro ao inicializar Gemini API: {e}")
             self.model = None
     
+    def _model_for(self, model_name: str):
+        """Instância de um modelo no transporte atual"""
+        if isinstance(self.model, RestModel):
+            # Mesmo host: todos os modelos compartilham o pool de conexões
+            return self.model.for_model(model_name)
+        return genai.GenerativeModel(model_name)
+    
+    def _cache_key(self, prompt: str) -> Optional[str]:
+        """Chave do prompt no cache de respostas (None se o cache estiver desativado)"""
+        if self.response_cache is None:
+            return None
+        if self.router is not None:
+            model_name = '|'.join(self.router.models[tier] for tier in ('fast', 'strong'))
+        else:
+            model_name = getattr(self.model, 'model_name', '')
+        return cache_key(model_name, prompt, self._generation_config())
+    
+    def _dispatch(self, message: str, context: Optional[str]):
+        """Decisão do roteador (ou None, com o modelo padrão) durante a chamada"""
+        if self.router is None:
+            return nullcontext(None)
+        return self.router.dispatch(message, context)
+    
     def generate_response(self, message: str, context: Optional[str] = None) -> Dict[str, Any]:
         """
         Gera resposta usando a API do Gemini
@@ -68,27 +279,51 @@ class GeminiIntegration:
             else:
                 prompt = f"{language_instruction}\n\nMensagem do usuário: {message}"
             
-            # Usar configurações do .env
-            from config import config
-            
-            # Gerar resposta com configurações otimizadas
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'max_output_tokens': 50,  # Limitar a 50 tokens para respostas curtas
-                    'temperature': 0.3,  # Criatividade moderada para respostas naturais
-                    'top_p': 0.7,  # Focar nas respostas mais prováveis
-                    'top_k': 10   # Limitar opções de vocabulário
+            # Mesmo prompt já respondido (por qualquer worker)
+            started = time.perf_counter()
+            key = self._cache_key(prompt)
+            cached = self.response_cache.get(key) if key else None
+            if cached is not None:
+                # Modelo que gerou a resposta guardada (com o roteador, não necessariamente o padrão)
+                cached_response, cached_model = cached
+                return {
+                    'response': cached_response,
+                    'timestamp': datetime.now().isoformat(),
+                    'model': cached_model or getattr(self.model, 'model_name', None),
+                    'tier': None,
+                    'cached': True,
+                    'prompt_tokens': 0,
+                    'output_tokens': 0,
+                    'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+                    'success': True
                 }
-            )
             
-            # Limpar e formatar o texto da resposta
-            clean_text = self._clean_response_text(response.text)
+            # Gerar resposta com as configurações do snapshot atual
+            with self._dispatch(message, context) as decision:
+                model = self.models[decision['tier']] if decision else self.model
+                started = time.perf_counter()
+                with span('generate_content'):
+                    response = model.generate_content(
+                        prompt,
+                        generation_config=self._generation_config()
+                    )
+                latency_ms = round((time.perf_counter() - started) * 1000, 2)
+                
+                # Limpar e formatar o texto da resposta
+                clean_text = self._clean_response_text(response.text)
             
+            if key:
+                self.response_cache.put(key, clean_text, getattr(model, 'model_name', None))
+            # Tokens cobrados (usage_metadata), para a contabilização por mensagem
+            prompt_tokens, output_tokens = token_counts(response)
             return {
                 'response': clean_text,
                 'timestamp': datetime.now().isoformat(),
-                'model': getattr(self.model, 'model_name', os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')),
+                'model': getattr(model, 'model_name', os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')),
+                'tier': decision['tier'] if decision else None,
+                'prompt_tokens': prompt_tokens,
+                'output_tokens': output_tokens,
+                'latency_ms': latency_ms,
                 'success': True
             }
             
@@ -127,6 +362,10 @@ class GeminiIntegration:
         """
         if not self.model:
             return False
+        if self.transport == 'rest':
+            # O cliente REST só faz chamadas avulsas (generateContent)
+            print("[AVISO] Sessões de chat exigem GEMINI_TRANSPORT=sdk - usando chamadas avulsas")
+            return False
         
         try:
             # Prompt padrão para forçar pt-BR
@@ -191,6 +430,14 @@ class GeminiIntegration:
         """Limpa a sessão de chat atual"""
         self.chat_session = None
     
+    def close(self):
+        """Fecha as conexões mantidas pelo transporte REST e pelo cache de respostas"""
+        if isinstance(self.model, RestModel):
+            self.model.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
+    
+    @timed('clean_response_text')
     def _clean_response_text(self, text: str) -> str:
         """Limpa e formata o texto da resposta"""
         import re
@@ -232,26 +479,63 @@ class GeminiIntegration:
         """Verifica se a integração com Gemini está disponível"""
         return self.model is not None and self.api_key is not None
     
+    def probe(self) -> Dict[str, Any]:
+        """
+        Verificação barata de disponibilidade (contagem de tokens, sem geração de conteúdo)
+        """
+        if not self.model:
+            return {'ok': False, 'error': 'Gemini API não inicializada'}
+        
+        started = time.perf_counter()
+        try:
+            self.model.count_tokens("ping")
+            return {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+        except Exception as e:
+            return {
+                'ok': False,
+                'error': str(e),
+                'latency_ms': round((time.perf_counter() - started) * 1000, 2)
+            }
+    
     def get_model_info(self) -> Dict[str, Any]:
         """Obtém informações sobre o modelo Gemini"""
         if not self.model:
             return {'available': False}
         
-        from config import config
+        cfg = config_store.current()
         
         return {
             'available': True,
-            'model_name': config.GEMINI_MODEL,
+            'model_name': cfg.GEMINI_MODEL,
             'api_key_set': bool(self.api_key),
             'chat_session_active': self.chat_session is not None,
-            'max_output_tokens': config.GEMINI_MAX_OUTPUT_TOKENS,
-            'temperature': config.GEMINI_TEMPERATURE,
-            'streaming_enabled': config.GEMINI_STREAMING_ENABLED
+            'max_output_tokens': cfg.GEMINI_MAX_OUTPUT_TOKENS,
+            'temperature': cfg.GEMINI_TEMPERATURE,
+            'streaming_enabled': cfg.GEMINI_STREAMING_ENABLED,
+            'transport': self.transport,
+            'connection_pool': self.model.pool.get_stats() if isinstance(self.model, RestModel) else None,
+            'router': self.router.get_stats() if self.router else {'enabled': False},
+            'response_cache': self.response_cache.get_stats() if self.response_cache else {'enabled': False},
+            'config_version': cfg.VERSION
+        }
+    
+    def _generation_config(self) -> Dict[str, Any]:
+        """Parâmetros de geração lidos do snapshot de configuração atual"""
+        cfg = config_store.current()
+        return {
+            'max_output_tokens': cfg.GEMINI_MAX_OUTPUT_TOKENS,  # Respostas curtas por padrão (50)
+            'temperature': cfg.GEMINI_TEMPERATURE,  # Criatividade moderada para respostas naturais
+            'top_p': cfg.GEMINI_TOP_P,  # Focar nas respostas mais prováveis
+            'top_k': cfg.GEMINI_TOP_K   # Limitar opções de vocabulário
         }
 
-    def generate_stream(self, message: str, context: Optional[str] = None):
+    def generate_stream(self, message: str, context: Optional[str] = None,
+                        usage: Optional[Dict[str, Any]] = None):
         """
         Gera resposta em streaming (yield de trechos de texto) usando a API do Gemini
+        
+        Se ``usage`` for informado, recebe ao final a origem, o modelo, os
+        tokens, a latência total e o tempo até o primeiro trecho (em ms).
         """
         if not self.model:
             yield ''
@@ -269,29 +553,60 @@ class GeminiIntegration:
             )
         else:
             prompt = f"{language_instruction}\n\nMensagem do usuário: {message}"
+        usage = {} if usage is None else usage
+        started = time.perf_counter()
+        key = self._cache_key(prompt)
+        cached = self.response_cache.get(key) if key else None
+        if cached is not None:
+            cached_response, cached_model = cached
+            elapsed = round((time.perf_counter() - started) * 1000, 2)
+            usage.update(source='response_cache', model=cached_model or getattr(self.model, 'model_name', None),
+                         latency_ms=elapsed, first_chunk_ms=elapsed)
+            yield cached_response
+            return
         try:
-            from config import config
-            
-            response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    'max_output_tokens': 50,  # Limitar a 50 tokens para respostas curtas
-                    'temperature': 0.3,  # Criatividade moderada para respostas naturais
-                    'top_p': 0.7,  # Focar nas respostas mais prováveis
-                    'top_k': 10   # Limitar opções de vocabulário
-                },
-                stream=True
-            )
-            for chunk in response:
+            # Texto bruto dos trechos: o cache guarda a resposta inteira limpa de uma vez
+            # (a limpeza por trecho remove os espaços das bordas e juntaria palavras)
+            parts = []
+            last_chunk = None
+            # A vaga do roteador fica reservada entre os yields; se o consumidor
+            # fechar o gerador (GeneratorExit) a conexão é fechada e a vaga liberada
+            with self._dispatch(message, context) as decision:
+                model = self.models[decision['tier']] if decision else self.model
+                usage.update(source='gemini', model=getattr(model, 'model_name', None))
+                started = time.perf_counter()
+                response = model.generate_content(
+                    prompt,
+                    generation_config=self._generation_config(),
+                    stream=True
+                )
                 try:
-                    if hasattr(chunk, 'text') and chunk.text:
-                        # Limpar e formatar o texto do chunk
-                        clean_text = self._clean_response_text(chunk.text)
-                        yield clean_text
-                except Exception:
-                    continue
+                    for chunk in response:
+                        # A contagem de tokens é acumulada: vale a do último trecho
+                        last_chunk = chunk
+                        try:
+                            if hasattr(chunk, 'text') and chunk.text:
+                                # Limpar e formatar o texto do chunk
+                                clean_text = self._clean_response_text(chunk.text)
+                                if not parts:
+                                    usage['first_chunk_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                                parts.append(chunk.text)
+                                yield clean_text
+                        except Exception:
+                            continue
+                finally:
+                    close = getattr(response, 'close', None)
+                    if close is not None:
+                        close()
+            prompt_tokens, output_tokens = token_counts(last_chunk)
+            usage.update(prompt_tokens=prompt_tokens, output_tokens=output_tokens,
+                         latency_ms=round((time.perf_counter() - started) * 1000, 2))
+            if key and parts:
+                self.response_cache.put(key, self._clean_response_text(''.join(parts)),
+                                        getattr(model, 'model_name', None))
         except Exception as e:
             error_msg = str(e)
+            usage.update(source='error', latency_ms=round((time.perf_counter() - started) * 1000, 2))
             
             # Tratar erros específicos
             if 'quota' in error_msg.lower() or '429' in error_msg:
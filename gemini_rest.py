@@ -0,0 +1,258 @@
+"""
+Cliente REST do Gemini com pool de conexões keep-alive
+
+Alternativa ao SDK ``google.generativeai`` (selecionada por
+``GEMINI_TRANSPORT=rest``): fala direto com o endpoint ``generateContent``
+(como o ``server.js``), reaproveita conexões HTTP/1.1 entre requisições e
+usa timeouts separados de conexão e de leitura. O streaming usa
+``streamGenerateContent?alt=sse`` e é lido linha a linha.
+
+``RestModel`` expõe o mesmo subconjunto de ``GenerativeModel`` usado por
+``GeminiIntegration`` (``generate_content``, ``count_tokens``,
+``model_name``), então o resto do código não muda com o transporte.
+"""
+import copy
+import http.client
+import json
+import queue
+import socket
+import ssl
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+DEFAULT_API_BASE = 'https://generativelanguage.googleapis.com/v1beta'
+
+# Erros de uma conexão keep-alive que o servidor já fechou: repetir em uma conexão nova
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                 ConnectionResetError, BrokenPipeError)
+
+
+class GeminiRestError(Exception):
+    """Resposta de erro da API (a mensagem inclui o status HTTP, como no SDK)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status} {message}")
+        self.status = status
+
+
+class ConnectionPool:
+    """
+    Pool de conexões HTTP(S) para um único host
+
+    No máximo ``size`` requisições simultâneas; conexões ociosas são
+    reaproveitadas (a mais recente primeiro, que tem menos chance de ter
+    sido fechada pelo servidor).
+    """
+
+    def __init__(self, base_url: str, size: int = 8, connect_timeout: float = 3.0,
+                 read_timeout: float = 30.0):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == 'https' else 80)
+        self.base_path = parts.path.rstrip('/')
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._ssl_context = ssl.create_default_context() if self.scheme == 'https' else None
+        self._lock = threading.Lock()
+        self.stats = {'connections_opened': 0, 'requests': 0, 'reused': 0, 'retries': 0}
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.scheme == 'https':
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.connect_timeout,
+                                               context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        # Depois de conectado, o timeout do socket vale para cada leitura
+        conn.sock.settimeout(self.read_timeout)
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self.stats['connections_opened'] += 1
+        return conn
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.connect_timeout + self.read_timeout):
+            raise TimeoutError("Pool de conexões do Gemini esgotado")
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            try:
+                return self._new_connection(), False
+            except Exception:
+                self._slots.release()
+                raise
+
+    def _release(self, conn: Optional[http.client.HTTPConnection]):
+        if conn is not None:
+            self._idle.put(conn)
+        self._slots.release()
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None):
+        """
+        Envia a requisição e retorna ``(conn, response)``; chame
+        ``finish(conn, response)`` depois de ler o corpo
+        """
+        conn, reused = self._acquire()
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['reused'] += int(reused)
+        try:
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                return conn, conn.getresponse()
+            except _STALE_ERRORS:
+                if not reused:
+                    raise
+                # Conexão ociosa fechada pelo servidor: uma nova tentativa em conexão nova
+                conn.close()
+                with self._lock:
+                    self.stats['retries'] += 1
+                conn = self._new_connection()
+                conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            self._release(None)
+            raise
+
+    def finish(self, conn: http.client.HTTPConnection, response, reusable: bool = True):
+        """Devolve a conexão ao pool (ou a fecha se a resposta não foi lida até o fim)"""
+        if reusable and response.isclosed() and not response.will_close:
+            self._release(conn)
+        else:
+            conn.close()
+            self._release(None)
+
+    def close(self):
+        """Fecha as conexões ociosas"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({'size': self.size, 'idle': self._idle.qsize()})
+        return stats
+
+
+class _Text:
+    """Resposta (ou trecho de streaming) com o atributo ``text``, como no SDK"""
+
+    def __init__(self, payload: Dict):
+        self.payload = payload
+
+    @property
+    def text(self) -> str:
+        candidates = self.payload.get('candidates') or []
+        if not candidates:
+            feedback = self.payload.get('promptFeedback', {})
+            raise ValueError(f"Resposta sem candidatos ({feedback.get('blockReason', 'desconhecido')})")
+        parts = (candidates[0].get('content') or {}).get('parts') or []
+        return ''.join(part.get('text', '') for part in parts)
+
+    @property
+    def usage_metadata(self) -> Optional[SimpleNamespace]:
+        """Contagem de tokens com os nomes de atributo do SDK (None se ausente)"""
+        usage = self.payload.get('usageMetadata')
+        if not usage:
+            return None
+        return SimpleNamespace(
+            prompt_token_count=usage.get('promptTokenCount', 0),
+            candidates_token_count=usage.get('candidatesTokenCount', 0),
+            total_token_count=usage.get('totalTokenCount', 0)
+        )
+
+
+def _camel(key: str) -> str:
+    head, *rest = key.split('_')
+    return head + ''.join(word.title() for word in rest)
+
+
+class RestModel:
+    """Modelo do Gemini acessado via REST (mesma interface usada do GenerativeModel)"""
+
+    def __init__(self, api_key: str, model_name: str, base_url: str = DEFAULT_API_BASE,
+                 pool_size: int = 8, connect_timeout: float = 3.0, read_timeout: float = 30.0):
+        self.model_name = model_name
+        self.pool = ConnectionPool(base_url, pool_size, connect_timeout, read_timeout)
+        self._headers = {
+            'Content-Type': 'application/json',
+            'x-goog-api-key': api_key,
+            'Connection': 'keep-alive'
+        }
+
+    def for_model(self, model_name: str) -> 'RestModel':
+        """Outro modelo no mesmo host, compartilhando o pool de conexões"""
+        model = copy.copy(self)
+        model.model_name = model_name
+        return model
+
+    def _path(self, method: str) -> str:
+        name = self.model_name if self.model_name.startswith('models/') else f'models/{self.model_name}'
+        return f'/{name}:{method}'
+
+    @staticmethod
+    def _body(prompt: str, generation_config: Optional[Dict] = None) -> bytes:
+        body: Dict[str, Any] = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        if generation_config:
+            body['generationConfig'] = {_camel(key): value for key, value in generation_config.items()}
+        return json.dumps(body).encode('utf-8')
+
+    def _error(self, response) -> GeminiRestError:
+        raw = response.read()
+        try:
+            error = json.loads(raw).get('error', {})
+            message = f"{error.get('status', '')} {error.get('message', '')}".strip()
+        except ValueError:
+            message = raw[:200].decode('utf-8', 'replace')
+        return GeminiRestError(response.status, message or response.reason)
+
+    def _post_json(self, method: str, body: bytes) -> Dict:
+        conn, response = self.pool.request('POST', self._path(method), body, self._headers)
+        try:
+            if response.status != 200:
+                raise self._error(response)
+            return json.loads(response.read())
+        finally:
+            self.pool.finish(conn, response)
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict] = None,
+                         stream: bool = False):
+        if stream:
+            return self._stream(self._body(prompt, generation_config))
+        return _Text(self._post_json('generateContent', self._body(prompt, generation_config)))
+
+    def _stream(self, body: bytes) -> Iterator[_Text]:
+        conn, response = self.pool.request('POST', self._path('streamGenerateContent') + '?alt=sse',
+                                           body, self._headers)
+        finished = False
+        try:
+            if response.status != 200:
+                finished = True
+                raise self._error(response)
+            # Eventos SSE: cada linha "data: {...}" é uma resposta parcial completa
+            for line in response:
+                line = line.strip()
+                if line.startswith(b'data:'):
+                    yield _Text(json.loads(line[5:]))
+            finished = True
+        finally:
+            # Stream abandonado no meio: a conexão não pode ser reaproveitada
+            self.pool.finish(conn, response, reusable=finished)
+
+    def count_tokens(self, prompt: str) -> Dict:
+        body = json.dumps({'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}).encode('utf-8')
+        return self._post_json('countTokens', body)
+
+    def close(self):
+        self.pool.close()
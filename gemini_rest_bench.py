@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos transportes do Gemini contra um servidor local que imita a API
+
+Compara o cliente REST com pool keep-alive (``gemini_rest.RestModel``), o
+mesmo cliente abrindo uma conexão por requisição e o SDK
+``google.generativeai`` (transporte REST, apontado para o servidor local).
+Mede a latência sequencial (custo de abrir conexão), a vazão com várias
+threads e o streaming. Uso:
+
+    python gemini_rest_bench.py --requests 300 --threads 8 --latency 5 --tls
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Adicionar o diretório atual ao path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from gemini_rest import ConnectionPool, RestModel
+
+MODEL = 'gemini-1.5-flash'
+GENERATION_CONFIG = {'max_output_tokens': 50, 'temperature': 0.3, 'top_p': 0.7, 'top_k': 10}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """generateContent, streamGenerateContent (SSE) e countTokens com latência simulada"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Como um servidor de produção: sem Nagle (cabeçalho e corpo saem em writes separados)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        # Contagem de tokens aproximada (4 bytes por token), como no usageMetadata da API
+        prompt_tokens = len(self.rfile.read(int(self.headers.get('Content-Length', 0)))) // 4
+        time.sleep(self.server.latency)
+        path, _, query = self.path.partition('?')
+        if path.endswith(':streamGenerateContent'):
+            # alt=sse: eventos SSE (cliente REST); sem ele, um array JSON incremental (SDK)
+            sse = 'alt=sse' in query
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream' if sse else 'application/json')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for index in range(self.server.chunks):
+                payload = json.dumps(self._candidate(f'parte {index} ', prompt_tokens, 2 * (index + 1)))
+                if sse:
+                    piece = f"data: {payload}\r\n\r\n"
+                else:
+                    piece = ('[' if index == 0 else ',') + payload
+                self._write_chunk(piece.encode('utf-8'))
+                time.sleep(self.server.latency / 4)
+            if not sse:
+                self._write_chunk(b']')
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        if path.endswith(':countTokens'):
+            body = {'totalTokens': 1}
+        else:
+            body = self._candidate("Olá! Sou um assistente de testes 🤖", prompt_tokens, 9)
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    @staticmethod
+    def _candidate(text, prompt_tokens=0, output_tokens=0):
+        return {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]},
+                                'finishReason': 'STOP', 'index': 0}],
+                'usageMetadata': {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': output_tokens,
+                                  'totalTokenCount': prompt_tokens + output_tokens}}
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in(latency_ms, chunks, certfile=None):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.chunks = chunks
+    server.connections = 0
+    server.lock = threading.Lock()
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_certificate(workdir):
+    """Certificado autoassinado para 127.0.0.1 (requer o binário openssl)"""
+    path = os.path.join(workdir, 'stand-in.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-keyout', path, '-out', path, '-subj', '/CN=127.0.0.1',
+        '-addext', 'subjectAltName=IP:127.0.0.1'
+    ], check=True, capture_output=True)
+    return path
+
+
+class NoReusePool(ConnectionPool):
+    """Uma conexão nova por requisição (referência para o custo de conexão)"""
+
+    def finish(self, conn, response, reusable=True):
+        conn.close()
+        self._release(None)
+
+
+def rest_client(base_url, pool_size, reuse=True):
+    model = RestModel('bench-key', MODEL, base_url=base_url, pool_size=pool_size)
+    if not reuse:
+        model.pool = NoReusePool(base_url, pool_size)
+    return model
+
+
+def sdk_client(base_url):
+    import google.generativeai as genai
+    genai.configure(api_key='bench-key', transport='rest',
+                    client_options={'api_endpoint': base_url.rsplit('/v1beta', 1)[0]})
+    return genai.GenerativeModel(MODEL)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(name, model, server, requests, threads, stream_requests):
+    def call(_):
+        started = time.perf_counter()
+        text = model.generate_content("Olá", generation_config=GENERATION_CONFIG).text
+        assert text
+        return time.perf_counter() - started
+
+    server.connections = 0
+    # Sequencial: latência por requisição (inclui abrir conexão quando não há reuso)
+    latencies = [call(i) for i in range(requests)]
+    sequential_connections = server.connections
+
+    # Concorrente: vazão
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(call, range(requests)))
+    throughput = requests / (time.perf_counter() - started)
+
+    # Streaming: tempo até o primeiro trecho e total
+    first_chunk, total = [], []
+    for _ in range(stream_requests):
+        started = time.perf_counter()
+        for index, chunk in enumerate(model.generate_content("Olá", generation_config=GENERATION_CONFIG,
+                                                             stream=True)):
+            if index == 0:
+                first_chunk.append(time.perf_counter() - started)
+        total.append(time.perf_counter() - started)
+
+    print(f"{name:<26} p50 {percentile(latencies, 0.5) * 1000:>7.2f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:>7.2f} ms  "
+          f"conexões {sequential_connections:>4}/{requests:<5} "
+          f"vazão {throughput:>7.0f} req/s  "
+          f"stream 1º trecho {percentile(first_chunk, 0.5) * 1000:>6.2f} ms  "
+          f"total {percentile(total, 0.5) * 1000:>7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos transportes do Gemini (servidor local)")
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=5.0, help="Latência simulada do modelo (ms)")
+    parser.add_argument('--chunks', type=int, default=8, help="Trechos por resposta em streaming")
+    parser.add_argument('--stream-requests', type=int, default=20)
+    parser.add_argument('--tls', action='store_true', help="HTTPS com certificado autoassinado (requer openssl)")
+    parser.add_argument('--skip-sdk', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        certfile = None
+        if args.tls:
+            if not shutil.which('openssl'):
+                print("❌ --tls requer o binário openssl")
+                return False
+            certfile = make_certificate(workdir)
+            # Os dois clientes passam a confiar no certificado do servidor local
+            os.environ['SSL_CERT_FILE'] = os.environ['REQUESTS_CA_BUNDLE'] = certfile
+        server = start_stand_in(args.latency, args.chunks, certfile)
+        scheme = 'https' if certfile else 'http'
+        base_url = f"{scheme}://127.0.0.1:{server.server_port}/v1beta"
+
+        print(f"⏱️ Transportes do Gemini ({scheme}, latência simulada {args.latency} ms, "
+              f"{args.threads} threads)")
+        print("=" * 50)
+        clients = [
+            ('rest (pool keep-alive)', lambda: rest_client(base_url, args.pool_size)),
+            ('rest (sem reuso)', lambda: rest_client(base_url, args.pool_size, reuse=False)),
+        ]
+        if not args.skip_sdk:
+            clients.append(('sdk (google-generativeai)', lambda: sdk_client(base_url)))
+        for name, factory in clients:
+            try:
+                run(name, factory(), server, args.requests, args.threads, args.stream_requests)
+            except ImportError as e:
+                print(f"{name:<26} indisponível ({e})")
+        server.shutdown()
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,99 @@
+"""
+Monitor de saúde em segundo plano para os endpoints de status
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+
+class HealthMonitor:
+    """
+    Verifica periodicamente o banco de dados e o Gemini e guarda o último
+    resultado, para que os endpoints de saúde respondam sem fazer I/O.
+
+    O snapshot é substituído por inteiro a cada verificação, então a leitura
+    não precisa de lock.
+    """
+
+    def __init__(self, db_manager, gemini_provider: Callable[[], Optional[object]],
+                 interval: float = 10.0, gemini_interval: float = 60.0):
+        self.db_manager = db_manager
+        self.gemini_provider = gemini_provider
+        self.interval = interval
+        self.gemini_interval = gemini_interval
+        self._gemini_checked_at = 0.0
+        self._gemini_status = {'status': 'unknown'}
+        self._snapshot = {
+            'status': 'starting',
+            'database': 'unknown',
+            'gemini': 'unknown',
+            'checked_at': None,
+            'details': {}
+        }
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Inicia a thread de verificação"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self) -> Dict:
+        """Último resultado das verificações"""
+        return self._snapshot
+
+    def is_ready(self) -> bool:
+        return self._snapshot['database'] == 'connected'
+
+    def refresh(self, force_gemini: bool = False) -> Dict:
+        """Executa as verificações agora e atualiza o snapshot"""
+        with self._refresh_lock:
+            started = time.perf_counter()
+            database_ok = self.db_manager.test_connection()
+            database_ms = (time.perf_counter() - started) * 1000
+
+            now = time.monotonic()
+            if force_gemini or now - self._gemini_checked_at >= self.gemini_interval:
+                self._gemini_status = self._probe_gemini()
+                self._gemini_checked_at = now
+
+            gemini_ok = self._gemini_status.get('status') == 'available'
+            self._snapshot = {
+                'status': 'healthy' if database_ok else 'unhealthy',
+                'database': 'connected' if database_ok else 'disconnected',
+                'gemini': 'available' if gemini_ok else 'unavailable',
+                'checked_at': datetime.now().isoformat(),
+                'details': {
+                    'database': {'latency_ms': round(database_ms, 2)},
+                    'gemini': self._gemini_status
+                }
+            }
+            return self._snapshot
+
+    def _probe_gemini(self) -> Dict:
+        gemini = self.gemini_provider()
+        if not gemini or not gemini.is_available():
+            return {'status': 'unavailable', 'checked_at': datetime.now().isoformat()}
+        result = gemini.probe()
+        return {
+            'status': 'available' if result['ok'] else 'error',
+            'latency_ms': result.get('latency_ms'),
+            'error': result.get('error'),
+            'checked_at': datetime.now().isoformat()
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[SAUDE] Erro ao verificar saúde: {e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,160 @@
+"""
+Exportação e importação do histórico de conversas em NDJSON (opcionalmente gzip)
+
+A exportação percorre as mensagens em páginas por id (``iter_messages``,
+uma conexão curta por página) e gera o arquivo em blocos, então a memória
+usada não depende do tamanho do histórico. A importação grava em lotes
+(uma transação por lote) preservando created_at; com ``--drop-indexes``
+(servidor parado) os índices da tabela messages são removidos durante a
+carga e recriados no final.
+
+Uso:
+
+    python history_io.py export --user abc123 --gzip -o historico.ndjson.gz
+    python history_io.py import historico.ndjson.gz
+    python history_io.py import --drop-indexes historico.ndjson.gz   # servidor parado
+"""
+import gzip
+import json
+import sys
+import time
+import zlib
+from itertools import islice
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+
+from database import DatabaseManager
+
+
+def export_ndjson(backend, user_id: Optional[str] = None, batch_size: int = 1000) -> Iterator[bytes]:
+    """Uma linha JSON por mensagem (em ordem de id), em blocos de ``batch_size``"""
+    for rows in backend.iter_messages(user_id, batch_size):
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Comprime um fluxo de blocos no formato gzip sem acumulá-lo em memória"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: cabeçalho gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def open_input(path: str) -> IO[bytes]:
+    """Abre um arquivo NDJSON (gzip detectado pelo conteúdo); '-' lê da entrada padrão"""
+    stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    # peek() não consome os bytes lidos
+    if stream.peek(2)[:2] == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def read_ndjson(stream: IO[bytes]) -> Iterator[Dict]:
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _batches(records: Iterable[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_ndjson(backend, records: Iterable[Dict], batch_size: int = 5000,
+                  drop_indexes: bool = False) -> Dict:
+    """
+    Importa mensagens exportadas por ``export_ndjson``.
+
+    Os ids são novos; parent_message_id é remapeado para os ids gerados
+    (a exportação está em ordem de id, então o pai sempre vem antes) e
+    created_at é preservado.
+
+    ``drop_indexes`` remove os índices da tabela messages durante a carga
+    (bancos SQLite locais); só deve ser usado com o servidor parado, já que
+    as consultas do chat ficariam sem índice até o fim da importação.
+    """
+    from sharding import ShardedStorage
+
+    started = time.perf_counter()
+    if not drop_indexes:
+        targets = []
+    elif isinstance(backend, ShardedStorage):
+        targets = backend.shards
+    elif isinstance(backend, DatabaseManager):
+        targets = [backend]
+    else:
+        print("[IMPORTACAO] Backend sem índices locais - drop_indexes ignorado")
+        targets = []
+
+    imported = batches = 0
+    indexes = [target.drop_secondary_indexes() for target in targets]
+    id_map: Dict[int, int] = {}
+    try:
+        for batch in _batches(records, batch_size):
+            backend.insert_messages(batch, id_map)
+            imported += len(batch)
+            batches += 1
+            print(f"[IMPORTACAO] {imported} mensagens importadas")
+    finally:
+        # Recriar os índices uma única vez, mesmo se a carga falhar
+        for target, statements in zip(targets, indexes):
+            target.restore_indexes(statements)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'messages': imported,
+        'batches': batches,
+        'indexes_rebuilt': sum(len(statements) for statements in indexes),
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(imported / elapsed) if elapsed else 0
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import contextlib
+
+    from config import config
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export_cmd = sub.add_parser('export', help="Exporta o histórico em NDJSON")
+    export_cmd.add_argument('--user', default=None, help="Apenas um usuário (padrão: todos)")
+    export_cmd.add_argument('--gzip', action='store_true', help="Comprimir a saída")
+    export_cmd.add_argument('-o', '--output', default='-', help="Arquivo de saída (padrão: saída padrão)")
+    export_cmd.add_argument('--batch-size', type=int, default=config.EXPORT_BATCH_SIZE)
+
+    import_cmd = sub.add_parser('import', help="Importa um arquivo NDJSON (ou .ndjson.gz)")
+    import_cmd.add_argument('input', help="Arquivo de entrada ('-' para a entrada padrão)")
+    import_cmd.add_argument('--batch-size', type=int, default=config.IMPORT_BATCH_SIZE)
+    import_cmd.add_argument('--drop-indexes', action='store_true',
+                            help="Remover os índices durante a carga (apenas com o servidor parado)")
+
+    args = parser.parse_args()
+    # Mensagens de log vão para stderr, para não misturar com a exportação em stdout
+    stdout = sys.stdout.buffer
+    with contextlib.redirect_stdout(sys.stderr):
+        backend = create_storage(config)
+        if args.command == 'export':
+            chunks = export_ndjson(backend, args.user, args.batch_size)
+            if args.gzip:
+                chunks = gzip_chunks(chunks)
+            output = stdout if args.output == '-' else open(args.output, 'wb')
+            try:
+                for chunk in chunks:
+                    output.write(chunk)
+            finally:
+                if output is not stdout:
+                    output.close()
+        else:
+            with open_input(args.input) as stream:
+                result = import_ndjson(backend, read_ndjson(stream), args.batch_size,
+                                       drop_indexes=args.drop_indexes)
+            print(json.dumps(result, indent=2, ensure_ascii=False))
@@ -0,0 +1,170 @@
+"""
+Classificação de intenções das mensagens (sem escolher resposta)
+
+As regras são as mesmas usadas pelas respostas padrão do ChatBot: cada
+intenção casa por substring de palavras-chave, na ordem abaixo, e a
+primeira que casar vence. ``classify_intents`` classifica listas grandes de
+uma vez: cada texto distinto é classificado uma única vez (mensagens de
+chat se repetem muito - "oi", "obrigado", sugestões da interface).
+"""
+import re
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+
+# (intenção, palavras-chave, palavras que excluem a intenção) - em ordem de prioridade
+INTENT_RULES = [
+    ('greeting', ['olá', 'oi', 'hello', 'hi'], []),
+    ('how_works', ['como', 'funciona', 'funcionar'], []),
+    ('curiosity', ['curiosidade', 'curioso', 'sabia', 'fato'], []),
+    ('gemini_info', ['gemini', 'ia', 'inteligência'], ['conte', 'piada'])
+]
+DEFAULT_INTENT = 'default'
+
+
+def _compile(words: List[str]) -> Optional[re.Pattern]:
+    return re.compile('|'.join(re.escape(word) for word in words)) if words else None
+
+
+_PATTERNS = [(intent, _compile(words), _compile(excluded)) for intent, words, excluded in INTENT_RULES]
+
+
+def classify_intent(message: str) -> str:
+    """Intenção de uma mensagem"""
+    text = message.lower()
+    for intent, pattern, excluded in _PATTERNS:
+        if pattern.search(text) and not (excluded and excluded.search(text)):
+            return intent
+    return DEFAULT_INTENT
+
+
+def classify_intents(messages: List[str]) -> List[str]:
+    """Intenções de uma lista de mensagens, na mesma ordem"""
+    labels = {message: classify_intent(message) for message in set(messages)}
+    return list(map(labels.__getitem__, messages))
+
+
+def iter_messages(backend, batch_size: int = 50000, is_user: Optional[bool] = True) -> Iterator[List[tuple]]:
+    """Percorre a tabela de mensagens em blocos (paginação por id)"""
+    after_id = 0
+    while True:
+        page = backend.get_messages_page(after_id, batch_size, is_user)
+        if not page:
+            return
+        yield page
+        after_id = page[-1][0]
+
+
+def analyze_messages(backend, batch_size: int = 50000) -> Dict:
+    """
+    Classifica todas as mensagens dos usuários e grava a distribuição por
+    dia em ``intent_stats``
+
+    Um erro de leitura no meio da varredura interrompe a análise sem
+    substituir a distribuição anterior por contagens parciais.
+    """
+    started = time.perf_counter()
+    counts: Counter = Counter()
+    rows = 0
+    for page in iter_messages(backend, batch_size, is_user=True):
+        labels = classify_intents([row[2] for row in page])
+        counts.update(zip((str(row[4])[:10] for row in page), labels))
+        rows += len(page)
+    backend.replace_intent_stats([(day, intent, count) for (day, intent), count in counts.items()])
+
+    elapsed = time.perf_counter() - started
+    totals: Counter = Counter()
+    for (_, intent), count in counts.items():
+        totals[intent] += count
+    print(f"[INTENCOES] {rows} mensagens classificadas em {elapsed:.2f}s")
+    return {
+        'messages': rows,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed) if elapsed else 0,
+        'intents': dict(totals)
+    }
+
+
+def _build_benchmark_db(path: str, rows: int):
+    """Cria um banco com ``rows`` mensagens sintéticas (metade de usuários)"""
+    import random
+    import sqlite3
+    from database import DatabaseManager
+
+    DatabaseManager(path)
+    samples = [
+        "Olá, tudo bem?", "Como você funciona?", "Me conte uma curiosidade", "O que é o Gemini?",
+        "Conte uma piada sobre IA", "Qual a previsão do tempo para amanhã?", "Obrigado pela ajuda!",
+        "Você sabia que o mel nunca estraga?", "Preciso de ajuda com meu pedido", "Tchau"
+    ]
+    rng = random.Random(0)
+
+    def message(i):
+        # ~30% das mensagens têm texto único (pedidos, nomes, números)
+        text = rng.choice(samples)
+        return f"{text} pedido {i}" if i % 10 < 3 else text
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    with conn:
+        for start in range(0, rows, 100000):
+            conn.executemany(
+                'INSERT INTO messages (user_id, message, is_user, created_at) VALUES (?, ?, ?, ?)',
+                ((f'user_{i % 5000}', message(i), i % 2 == 0,
+                  f'2024-{(i // 200000) % 12 + 1:02d}-{(i // 7000) % 28 + 1:02d} 12:00:00')
+                 for i in range(start, min(rows, start + 100000)))
+            )
+    conn.close()
+
+
+if __name__ == "__main__":
+    # Análise completa da tabela de mensagens e benchmark
+    import argparse
+    import json
+    import os
+    import sys
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Distribuição de intenções das mensagens armazenadas")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    analyze_cmd = sub.add_parser('analyze', help="Classifica as mensagens do banco configurado e grava intent_stats")
+    analyze_cmd.add_argument('--batch-size', type=int, default=50000)
+
+    bench_cmd = sub.add_parser('bench', help="Mede mensagens/s em um banco sintético")
+    bench_cmd.add_argument('--rows', type=int, default=2000000)
+    bench_cmd.add_argument('--batch-size', type=int, default=50000)
+
+    args = parser.parse_args()
+    if args.command == 'analyze':
+        from config import config
+        from storage import create_storage
+        result = analyze_messages(create_storage(config), args.batch_size)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        sys.exit(0)
+
+    from database import DatabaseManager
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'intents-bench.db')
+        print(f"⏳ Gerando {args.rows} mensagens sintéticas...")
+        _build_benchmark_db(path, args.rows)
+        backend = DatabaseManager(path, pool_size=1)
+
+        # Comparação com a classificação mensagem por mensagem
+        page = backend.get_messages_page(0, args.batch_size, True)
+        messages = [row[2] for row in page]
+        started = time.perf_counter()
+        single = [classify_intent(message) for message in messages]
+        single_elapsed = time.perf_counter() - started
+        started = time.perf_counter()
+        batch = classify_intents(messages)
+        batch_elapsed = time.perf_counter() - started
+        assert single == batch, "classify_intents diverge de classify_intent"
+        print(f"{len(set(messages))} textos distintos em {len(messages)} mensagens")
+        print(f"classify_intent (uma a uma): {len(messages) / single_elapsed:>12.0f} mensagens/s")
+        print(f"classify_intents (em lote):  {len(messages) / batch_elapsed:>12.0f} mensagens/s")
+
+        result = analyze_messages(backend, args.batch_size)
+        print(f"analyze_messages (SQLite -> intent_stats): {result['rows_per_second']:>8} mensagens/s")
+        print(json.dumps(result['intents'], indent=2, ensure_ascii=False))
@@ -0,0 +1,201 @@
+"""
+Respostas pré-geradas para os prompts mais comuns (botões de sugestão)
+
+Os prompts de ``PRECOMPUTED_PROMPTS`` são respondidos pelo Gemini na
+inicialização e periodicamente, e as respostas ficam na tabela
+``precomputed_answers``. Uma mensagem igual a um desses prompts (ignorando
+maiúsculas, espaços e pontuação final) é respondida da memória, sem chamada
+ao Gemini. Respostas mais velhas que ``PRECOMPUTED_TTL`` continuam sendo
+servidas enquanto uma nova é gerada em segundo plano.
+
+Só são servidas respostas de prompts ainda presentes em
+``PRECOMPUTED_PROMPTS`` e geradas por um dos modelos configurados; as
+demais são removidas do banco. Ao trocar a chave ou o modelo todas são
+descartadas (``invalidate``) antes de serem geradas de novo.
+"""
+import re
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+def normalize_prompt(message: str) -> str:
+    """Chave do prompt: minúsculas, espaços únicos, sem pontuação final"""
+    return re.sub(r'[\s?!.]+$', '', ' '.join(message.lower().split()))
+
+
+class PrecomputedAnswers:
+    """
+    Armazena e renova as respostas pré-geradas
+
+    As respostas são carregadas do banco para um dicionário substituído por
+    inteiro a cada atualização, então a consulta não precisa de lock.
+    """
+
+    def __init__(self, db_manager, gemini_provider: Callable[[], Optional[object]], cfg):
+        self.db_manager = db_manager
+        self.gemini_provider = gemini_provider
+        self.cfg = cfg
+        self._answers: Dict[str, Dict] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._force = False
+        self._thread = None
+        self.stats = {'hits': 0, 'stale_hits': 0, 'generated': 0, 'failures': 0}
+        self.load()
+
+    def load(self):
+        """Carrega as respostas salvas (sobrevivem a reinicializações), sem as obsoletas"""
+        rows = self.db_manager.get_precomputed_answers()
+        self._answers = {row['prompt_key']: row for row in rows if self._is_current(row)}
+        self._delete([row['prompt_key'] for row in rows if row['prompt_key'] not in self._answers])
+
+    def prompts(self) -> List[str]:
+        return [prompt for prompt in self.cfg.PRECOMPUTED_PROMPTS if prompt.strip()]
+
+    def _prompt_keys(self) -> set:
+        return {normalize_prompt(prompt) for prompt in self.prompts()}
+
+    def _is_current(self, row: Dict) -> bool:
+        """Prompt ainda configurado e resposta gerada por um dos modelos atuais"""
+        models = {name.split('/')[-1] for name in
+                  (self.cfg.GEMINI_MODEL, self.cfg.GEMINI_FAST_MODEL, self.cfg.GEMINI_STRONG_MODEL) if name}
+        return (row['prompt_key'] in self._prompt_keys()
+                and (row.get('model') or '').split('/')[-1] in models)
+
+    def _delete(self, keys: List[str]):
+        if keys and self.db_manager.delete_precomputed_answers(keys):
+            print(f"[PRECOMPUTADO] {len(keys)} resposta(s) obsoleta(s) removida(s)")
+
+    def prune(self):
+        """Descarta as respostas de prompts removidos de PRECOMPUTED_PROMPTS ou de outro modelo"""
+        answers = self._answers
+        current = {key: row for key, row in answers.items() if self._is_current(row)}
+        if len(current) != len(answers):
+            self._answers = current
+            self._delete([key for key in answers if key not in current])
+
+    def invalidate(self):
+        """Descarta todas as respostas (chave ou modelo do Gemini trocados)"""
+        answers, self._answers = self._answers, {}
+        self._delete(list(answers))
+
+    def _is_stale(self, row: Dict) -> bool:
+        try:
+            age = (datetime.now() - datetime.fromisoformat(str(row['updated_at']))).total_seconds()
+        except ValueError:
+            return True
+        return age > self.cfg.PRECOMPUTED_TTL
+
+    def lookup(self, message: str) -> Optional[str]:
+        """Resposta pré-gerada para a mensagem, se houver"""
+        if not self.cfg.PRECOMPUTED_ENABLED:
+            return None
+        row = self._answers.get(normalize_prompt(message))
+        if row is None or not self._is_current(row):
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        if self._is_stale(row):
+            with self._lock:
+                self.stats['stale_hits'] += 1
+            self._refresh_async(row['prompt'])
+        return row['response']
+
+    def refresh(self, prompt: str) -> bool:
+        """Gera e salva a resposta de um prompt (sem contexto de conversa)"""
+        gemini = self.gemini_provider()
+        if not gemini or not gemini.is_available():
+            return False
+        result = gemini.generate_response(prompt)
+        if not result.get('success', False):
+            with self._lock:
+                self.stats['failures'] += 1
+            print(f"[PRECOMPUTADO] Falha ao gerar resposta para '{prompt}': {result.get('error')}")
+            return False
+
+        key = normalize_prompt(prompt)
+        self.db_manager.save_precomputed_answer(key, prompt, result['response'], result.get('model'))
+        answers = dict(self._answers)
+        answers[key] = {
+            'prompt_key': key, 'prompt': prompt, 'response': result['response'],
+            'model': result.get('model'), 'updated_at': datetime.now().isoformat()
+        }
+        self._answers = answers
+        with self._lock:
+            self.stats['generated'] += 1
+        return True
+
+    def _refresh_async(self, prompt: str):
+        """Renova em segundo plano (uma única renovação por prompt de cada vez)"""
+        key = normalize_prompt(prompt)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.refresh(prompt)
+            except Exception as e:
+                print(f"[PRECOMPUTADO] Erro ao renovar '{prompt}': {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name='precomputed-refresh', daemon=True).start()
+
+    def warm_up(self, force: bool = False) -> int:
+        """Gera as respostas ausentes ou vencidas (todas, com ``force``); retorna quantas foram geradas"""
+        self.prune()
+        generated = 0
+        for prompt in self.prompts():
+            row = self._answers.get(normalize_prompt(prompt))
+            if force or row is None or self._is_stale(row):
+                if self.refresh(prompt):
+                    generated += 1
+        if generated:
+            print(f"[PRECOMPUTADO] {generated} resposta(s) gerada(s)")
+        return generated
+
+    def start(self):
+        """Inicia a thread de aquecimento (na inicialização e a cada PRECOMPUTED_REFRESH_INTERVAL)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='precomputed-warm-up', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def trigger(self, force: bool = False):
+        """Antecipa o próximo aquecimento (ex.: Gemini reconfigurado)"""
+        self._force = force
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.cfg.PRECOMPUTED_ENABLED:
+                force, self._force = self._force, False
+                try:
+                    self.warm_up(force)
+                except Exception as e:
+                    print(f"[PRECOMPUTADO] Erro no aquecimento: {e}")
+            self._wake.wait(self.cfg.PRECOMPUTED_REFRESH_INTERVAL)
+            self._wake.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            'enabled': self.cfg.PRECOMPUTED_ENABLED,
+            'prompts': len(self.prompts()),
+            'stored': len(self._answers),
+            'stale': sum(1 for row in self._answers.values() if self._is_stale(row)),
+            'ttl': self.cfg.PRECOMPUTED_TTL
+        })
+        return stats
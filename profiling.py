@@ -0,0 +1,196 @@
+"""
+Instrumentação opcional por requisição: spans de tempo, header Server-Timing
+e captura amostrada de perfis (cProfile ou pyinstrument)
+"""
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import g, request
+
+_current_timer: contextvars.ContextVar = contextvars.ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """Acumula os spans medidos durante uma requisição"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration_ms: float):
+        with self._lock:
+            self.spans.append((name, duration_ms))
+
+    def summary(self) -> Dict[str, Dict]:
+        """Total e contagem por nome de span"""
+        totals: Dict[str, Dict] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for name, duration in spans:
+            entry = totals.setdefault(name, {'ms': 0.0, 'count': 0})
+            entry['ms'] += duration
+            entry['count'] += 1
+        for entry in totals.values():
+            entry['ms'] = round(entry['ms'], 3)
+        return totals
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+@contextmanager
+def span(name: str):
+    """Mede um trecho se houver instrumentação ativa (custo quase nulo caso contrário)"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, (time.perf_counter() - started) * 1000)
+
+
+def timed(name: Optional[str] = None):
+    """Decorador que registra a execução da função como um span"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_timer.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing_header(timer: RequestTimer) -> str:
+    """Formata os spans no padrão do header Server-Timing"""
+    parts = [
+        f'{name};dur={entry["ms"]:.2f}' + (f';desc="{entry["count"]}x"' if entry['count'] > 1 else '')
+        for name, entry in timer.summary().items()
+    ]
+    parts.append(f'total;dur={timer.total_ms():.2f}')
+    return ', '.join(parts)
+
+
+class Profiler:
+    """Integra a instrumentação ao Flask"""
+
+    def __init__(self, app=None, cfg=None):
+        self.cfg = cfg
+        if app is not None:
+            self.init_app(app, cfg)
+
+    def init_app(self, app, cfg):
+        self.cfg = cfg
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _requested(self, header: str, query: str) -> bool:
+        if not self.cfg.PROFILING_REQUEST_TOGGLE:
+            return False
+        return request.headers.get(header) == '1' or request.args.get(query) == '1'
+
+    def _before_request(self):
+        cfg = self.cfg
+        debug_timing = self._requested('X-Debug-Timing', '_timing')
+        capture = self._requested('X-Profile', '_profile') or (
+            cfg.PROFILING_SAMPLE_RATE > 0 and random.random() < cfg.PROFILING_SAMPLE_RATE
+        )
+        if not (cfg.PROFILING_ENABLED or debug_timing or capture):
+            return
+
+        g.request_timer = RequestTimer()
+        g.debug_timing = debug_timing
+        g.timer_token = _current_timer.set(g.request_timer)
+        if capture:
+            try:
+                g.profile_capture = self._start_capture()
+            except Exception as e:
+                # Python >= 3.12: só um cProfile ativo por vez (outra requisição já está sendo capturada)
+                print(f"[PERFIL] Captura ignorada: {e}")
+
+    def _after_request(self, response):
+        timer = g.pop('request_timer', None)
+        if timer is None:
+            return response
+
+        capture = g.pop('profile_capture', None)
+        if capture is not None:
+            path = self._stop_capture(capture)
+            if path:
+                response.headers['X-Profile-Path'] = path
+
+        response.headers['Server-Timing'] = server_timing_header(timer)
+        if g.pop('debug_timing', False):
+            response.headers['X-Debug-Timing'] = json.dumps({
+                'total_ms': round(timer.total_ms(), 3),
+                'spans': timer.summary()
+            })
+        return response
+
+    def _teardown_request(self, exc=None):
+        # Roda também quando a view levanta uma exceção (after_request não é chamado)
+        capture = g.pop('profile_capture', None)
+        if capture is not None:
+            self._stop_capture(capture)
+        token = g.pop('timer_token', None)
+        if token is not None:
+            _current_timer.reset(token)
+
+    def _start_capture(self):
+        if self.cfg.PROFILING_PROFILER == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as PyInstrumentProfiler
+                profiler = PyInstrumentProfiler()
+                profiler.start()
+                return ('pyinstrument', profiler)
+            except ImportError:
+                print("[PERFIL] pyinstrument não instalado - usando cProfile")
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return ('cprofile', profiler)
+
+    def _stop_capture(self, capture) -> Optional[str]:
+        kind, profiler = capture
+        try:
+            os.makedirs(self.cfg.PROFILING_DIR, exist_ok=True)
+            endpoint = (request.endpoint or 'unknown').replace('.', '_')
+            base = os.path.join(self.cfg.PROFILING_DIR,
+                                f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{endpoint}")
+            if kind == 'pyinstrument':
+                profiler.stop()
+                path = base + '.html'
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html())
+            else:
+                profiler.disable()
+                path = base + '.prof'
+                profiler.dump_stats(path)
+            return path
+        except Exception as e:
+            print(f"[PERFIL] Erro ao salvar perfil: {e}")
+            return None
+
+
+def bind_context(func):
+    """
+    Vincula ``func`` a uma cópia do contexto atual, para que spans medidos em
+    threads de um pool sejam atribuídos à requisição que as disparou
+    """
+    return functools.partial(contextvars.copy_context().run, func)
@@ -0,0 +1,393 @@
+"""
+Limite de requisições por usuário e por IP (janela deslizante)
+
+Cada chave (``user:<id>`` ou ``ip:<endereço>``) tem um contador por janela
+fixa; a contagem da janela deslizante é estimada pela janela atual mais a
+anterior ponderada pelo tempo que ainda a sobrepõe. Isso usa memória
+constante por chave e não tem o pico de 2x da borda de uma janela fixa.
+
+Os contadores ficam em memória, divididos em shards com locks próprios
+(requisições de chaves diferentes raramente disputam o mesmo lock), ou em
+um arquivo SQLite compartilhado pelos workers (``RATE_LIMIT_BACKEND=sqlite``).
+
+Os limites são definidos por rota em ``RATE_LIMIT_ROUTES``
+(``/api/chat=20/60;/api/chat/batch=5/60``: 20 requisições a cada 60 s) e
+``RATE_LIMIT_DEFAULT`` vale para as demais rotas ``/api/``. O limite por IP
+é o da rota multiplicado por ``RATE_LIMIT_IP_MULTIPLIER`` (vários usuários
+podem compartilhar um IP). Benchmark::
+
+    python ratelimit.py bench --threads 8 --keys 10000
+"""
+import math
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+from flask import g, jsonify, request
+
+# Rotas nunca limitadas (monitoramento)
+EXEMPT_PREFIXES = ('/api/health',)
+
+
+def parse_limit(spec: str) -> Optional[Tuple[int, float]]:
+    """``'20/60'`` -> (20 requisições, 60 segundos); None se vazio ou inválido"""
+    try:
+        count, window = spec.strip().split('/')
+        count, window = int(count), float(window)
+    except ValueError:
+        return None
+    # Janela zero dividiria por zero nos contadores
+    return (count, window) if count > 0 and window > 0 else None
+
+
+def parse_routes(spec: str) -> Dict[str, Tuple[int, float]]:
+    routes = {}
+    for item in spec.split(';'):
+        rule, _, limit = item.partition('=')
+        parsed = parse_limit(limit)
+        if rule.strip() and parsed:
+            routes[rule.strip()] = parsed
+    return routes
+
+
+class ShardedCounters:
+    """Contadores em memória: ``shards`` dicionários, cada um com seu lock"""
+
+    # Operações em um shard entre duas remoções de chaves antigas
+    SWEEP_EVERY = 4096
+
+    def __init__(self, shards: int = 64):
+        self.shards = [(threading.Lock(), {}) for _ in range(shards)]
+        self._ops = [0] * shards
+
+    def hit(self, key: str, limit: int, window: float, now: Optional[float] = None) -> Tuple[bool, int, float]:
+        """
+        Conta uma requisição se ainda couber no limite
+
+        Returns:
+            (permitida, restantes, segundos até liberar uma vaga)
+        """
+        now = time.time() if now is None else now
+        current = math.floor(now / window)
+        index = zlib.crc32(key.encode('utf-8')) % len(self.shards)
+        lock, counters = self.shards[index]
+        with lock:
+            entry = counters.get(key)
+            if entry is None or entry[0] < current - 1:
+                entry = counters[key] = [current, 0, 0]
+            elif entry[0] == current - 1:
+                # Janela virou: a atual passa a ser a anterior
+                entry[0], entry[1], entry[2] = current, entry[2], 0
+            allowed, remaining, reset = _evaluate(entry[1], entry[2], now, current, window, limit)
+            if allowed:
+                entry[2] += 1
+            self._ops[index] += 1
+            if self._ops[index] % self.SWEEP_EVERY == 0:
+                self._sweep(counters, current)
+        return allowed, remaining, reset
+
+    @staticmethod
+    def _sweep(counters: Dict, current: int):
+        for key in [key for key, entry in counters.items() if entry[0] < current - 1]:
+            del counters[key]
+
+    def size(self) -> int:
+        return sum(len(counters) for _, counters in self.shards)
+
+    def close(self):
+        pass
+
+
+class SQLiteCounters:
+    """Contadores compartilhados entre processos (arquivo SQLite em modo WAL)"""
+
+    SWEEP_EVERY = 4096
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._ops = 0
+        with self._conn() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT NOT NULL,
+                    window INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (key, window)
+                ) WITHOUT ROWID
+            ''')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, limit: int, window: float, now: Optional[float] = None) -> Tuple[bool, int, float]:
+        now = time.time() if now is None else now
+        current = math.floor(now / window)
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            counts = dict(conn.execute(
+                'SELECT window, count FROM rate_limits WHERE key = ? AND window >= ?', (key, current - 1)
+            ).fetchall())
+            allowed, remaining, reset = _evaluate(counts.get(current - 1, 0), counts.get(current, 0),
+                                                  now, current, window, limit)
+            if allowed:
+                conn.execute('''
+                    INSERT INTO rate_limits (key, window, count) VALUES (?, ?, 1)
+                    ON CONFLICT (key, window) DO UPDATE SET count = count + 1
+                ''', (key, current))
+            self._ops += 1
+            if self._ops % self.SWEEP_EVERY == 0:
+                conn.execute('DELETE FROM rate_limits WHERE window < ?', (current - 1,))
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            # Falha no armazenamento compartilhado não deve derrubar a API
+            print(f"[LIMITE] Erro nos contadores compartilhados: {e}")
+            return True, limit, 0.0
+        return allowed, remaining, reset
+
+    def size(self) -> int:
+        return self._conn().execute('SELECT COUNT(DISTINCT key) FROM rate_limits').fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _evaluate(previous: int, current_count: int, now: float, current: int, window: float,
+              limit: int) -> Tuple[bool, int, float]:
+    """Estimativa da janela deslizante antes de contar esta requisição"""
+    elapsed = now / window - current  # fração da janela atual já decorrida
+    estimate = previous * (1 - elapsed) + current_count
+    allowed = estimate + 1 <= limit
+    remaining = max(0, int(limit - estimate - (1 if allowed else 0)))
+    if allowed or current_count >= limit:
+        # Vaga livre na próxima janela (ou limite cheio só com a janela atual)
+        reset = (1 - elapsed) * window
+    else:
+        # A parcela da janela anterior decai até caber mais uma requisição
+        needed = estimate + 1 - limit
+        reset = min((1 - elapsed) * window, needed / previous * window if previous else window)
+    return allowed, remaining, reset
+
+
+def create_counters(cfg):
+    if cfg.RATE_LIMIT_BACKEND == 'sqlite':
+        return SQLiteCounters(cfg.RATE_LIMIT_SQLITE_PATH)
+    return ShardedCounters(cfg.RATE_LIMIT_SHARDS)
+
+
+class RateLimiter:
+    """Middleware do Flask (mesmo padrão de integração do Profiler)"""
+
+    def __init__(self, app=None, cfg=None):
+        self.cfg = cfg
+        self.counters = None
+        self._routes_spec = None
+        self._routes: Dict[str, Tuple[int, float]] = {}
+        self._default_spec = None
+        self._default: Optional[Tuple[int, float]] = None
+        self._lock = threading.Lock()
+        self.stats = {'allowed': 0, 'limited_user': 0, 'limited_ip': 0}
+        if app is not None:
+            self.init_app(app, cfg)
+
+    def init_app(self, app, cfg):
+        self.cfg = cfg
+        self.counters = create_counters(cfg)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def on_config_change(self, old, new):
+        """Troca os contadores se o backend mudar (as regras são relidas a cada requisição)"""
+        if (old.RATE_LIMIT_BACKEND, old.RATE_LIMIT_SQLITE_PATH, old.RATE_LIMIT_SHARDS) != \
+                (new.RATE_LIMIT_BACKEND, new.RATE_LIMIT_SQLITE_PATH, new.RATE_LIMIT_SHARDS):
+            self.counters = create_counters(new)
+
+    def limit_for(self, rule: Optional[str], path: str) -> Optional[Tuple[int, float]]:
+        spec = self.cfg.RATE_LIMIT_ROUTES
+        if spec != self._routes_spec:
+            self._routes, self._routes_spec = parse_routes(spec), spec
+        if rule in self._routes:
+            return self._routes[rule]
+        if path.startswith('/api/') and not path.startswith(EXEMPT_PREFIXES):
+            spec = self.cfg.RATE_LIMIT_DEFAULT
+            if spec != self._default_spec:
+                self._default, self._default_spec = parse_limit(spec), spec
+            return self._default
+        return None
+
+    def client_ip(self, req) -> str:
+        if self.cfg.RATE_LIMIT_TRUST_PROXY:
+            forwarded = req.headers.get('X-Forwarded-For')
+            if forwarded:
+                return forwarded.split(',')[0].strip()
+        return req.remote_addr or 'unknown'
+
+    @staticmethod
+    def user_id(req) -> Optional[str]:
+        user_id = (req.view_args or {}).get('user_id')
+        if user_id is None and req.is_json:
+            data = req.get_json(silent=True)
+            if isinstance(data, dict):
+                user_id = data.get('user_id')
+        return str(user_id) if user_id else None
+
+    def check(self) -> Optional[Tuple[bool, int, int, float, str]]:
+        """(permitida, limite, restantes, reset, escopo) da requisição atual; None se não limitada"""
+        req = request._get_current_object()
+        rule = req.url_rule.rule if req.url_rule else req.path
+        limit = self.limit_for(rule, req.path)
+        if limit is None:
+            return None
+        return self._hit(rule, limit, self.client_ip(req), self.user_id(req))
+
+    def check_event(self, rule: str, ip: str, user_id: Optional[str]) -> Optional[Tuple[bool, int, int, float, str]]:
+        """
+        Conta uma mensagem que não chega como requisição HTTP (ex.: WebSocket)
+        com o limite e as chaves da rota ``rule``; None se desativado ou sem limite
+        """
+        if not self.cfg.RATE_LIMIT_ENABLED:
+            return None
+        limit = self.limit_for(rule, rule)
+        if limit is None:
+            return None
+        result = self._hit(rule, limit, ip, user_id)
+        self._count(result)
+        return result
+
+    def _hit(self, rule: str, limit: Tuple[int, float], ip: str,
+             user_id: Optional[str]) -> Tuple[bool, int, int, float, str]:
+        count, window = limit
+        ip_limit = count * self.cfg.RATE_LIMIT_IP_MULTIPLIER
+        allowed, remaining, reset = self.counters.hit(f'ip:{ip}:{rule}', ip_limit, window)
+        result = (allowed, ip_limit, remaining, reset, 'ip')
+        if allowed and user_id:
+            allowed, remaining, reset = self.counters.hit(f'user:{user_id}:{rule}', count, window)
+            result = (allowed, count, remaining, reset, 'user')
+        return result
+
+    def _count(self, result: Tuple[bool, int, int, float, str]):
+        allowed, _, _, _, scope = result
+        with self._lock:
+            self.stats['allowed' if allowed else f'limited_{scope}'] += 1
+
+    def _before_request(self):
+        if not self.cfg.RATE_LIMIT_ENABLED:
+            return None
+        result = self.check()
+        if result is None:
+            return None
+        g.rate_limit = result
+        self._count(result)
+        allowed, _, _, reset, _ = result
+        if allowed:
+            return None
+        response = jsonify({'error': 'Muitas requisições. Tente novamente em instantes.'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(reset)))
+        return response
+
+    def _after_request(self, response):
+        result = g.pop('rate_limit', None)
+        if result is not None:
+            _, limit, remaining, reset, _ = result
+            # Headers novos nesta resposta: add evita a busca de set/__setitem__
+            headers = response.headers
+            headers.add('X-RateLimit-Limit', str(limit))
+            headers.add('X-RateLimit-Remaining', str(remaining))
+            headers.add('X-RateLimit-Reset', str(math.ceil(reset)))
+        return response
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            'enabled': self.cfg.RATE_LIMIT_ENABLED,
+            'backend': self.cfg.RATE_LIMIT_BACKEND,
+            'keys': self.counters.size() if self.counters else 0
+        })
+        return stats
+
+
+def bench(threads: int, requests_per_thread: int, keys: int, workdir: str):
+    """Vazão de ``hit`` por backend e custo do middleware completo por requisição"""
+    from concurrent.futures import ThreadPoolExecutor
+    import os
+    import random
+
+    def run(counters, label):
+        def worker(seed):
+            rng = random.Random(seed)
+            names = [f'user:{rng.randrange(keys)}:/api/chat' for _ in range(requests_per_thread)]
+            started = time.perf_counter()
+            for name in names:
+                counters.hit(name, 1000000, 60.0)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(worker, range(threads)))
+        elapsed = time.perf_counter() - started
+        total = threads * requests_per_thread
+        print(f"{label:<28} {total / elapsed:>12,.0f} ops/s  {elapsed / total * 1e6:>7.2f} µs/op "
+              f"({threads} threads, {keys} chaves)")
+
+    run(ShardedCounters(1), 'memória (1 lock)')
+    run(ShardedCounters(64), 'memória (64 shards)')
+    sqlite_counters = SQLiteCounters(os.path.join(workdir, 'rate_limits.db'))
+    requests_per_thread = max(1, requests_per_thread // 20)
+    run(sqlite_counters, 'sqlite (compartilhado)')
+    sqlite_counters.close()
+
+    # Middleware completo (regra, IP, user_id do JSON, headers) em uma requisição simulada
+    from types import SimpleNamespace
+    from flask import Flask
+
+    app = Flask(__name__)
+    cfg = SimpleNamespace(RATE_LIMIT_ENABLED=True, RATE_LIMIT_BACKEND='memory', RATE_LIMIT_SHARDS=64,
+                          RATE_LIMIT_SQLITE_PATH='', RATE_LIMIT_ROUTES='/api/chat=1000000/60',
+                          RATE_LIMIT_DEFAULT='120/60', RATE_LIMIT_IP_MULTIPLIER=5, RATE_LIMIT_TRUST_PROXY=False)
+    limiter = RateLimiter(app, cfg)
+    app.add_url_rule('/api/chat', 'chat', lambda: 'ok', methods=['POST'])
+    iterations = 50000
+    with app.test_request_context('/api/chat', method='POST', json={'message': 'Olá', 'user_id': 'u1'}):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            app.response_class('ok')
+        baseline = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(iterations):
+            limiter._before_request()
+            limiter._after_request(app.response_class('ok'))
+        elapsed = time.perf_counter() - started - baseline
+    print(f"{'middleware (memória)':<28} {elapsed / iterations * 1e6:>7.2f} µs/requisição "
+          f"(IP + usuário, headers)")
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Benchmark do limitador de requisições")
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench_cmd = sub.add_parser('bench', help="Vazão dos contadores e custo do middleware")
+    bench_cmd.add_argument('--threads', type=int, default=8)
+    bench_cmd.add_argument('--requests', type=int, default=100000, help="Requisições por thread")
+    bench_cmd.add_argument('--keys', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        bench(args.threads, args.requests, args.keys, workdir)
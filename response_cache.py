@@ -0,0 +1,190 @@
+"""
+Cache de respostas do Gemini compartilhado entre workers
+
+As respostas ficam em um arquivo SQLite dedicado (``RESPONSE_CACHE_PATH``)
+em modo WAL: todos os processos do servidor leem ao mesmo tempo sem
+bloquear a escrita, e o cache sobrevive a reinicializações e deploys (o
+próximo processo já começa com as respostas do anterior).
+
+A chave é o hash do modelo, do prompt completo (mensagem + contexto) e dos
+parâmetros de geração. Cada entrada expira após ``RESPONSE_CACHE_TTL`` e o
+arquivo é limitado a ``RESPONSE_CACHE_MAX_ENTRIES`` entradas (as acessadas
+há mais tempo saem primeiro). O cache é um atalho: qualquer erro do SQLite
+é tratado como miss.
+"""
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# Último acesso só é regravado se mais velho que isso: leituras quase sempre sem escrita
+TOUCH_INTERVAL = 60.0
+# Escritas entre duas limpezas (expiradas + excesso de entradas)
+PRUNE_EVERY = 64
+# Conexões reaproveitadas (as requisições e os streams rodam em threads novas)
+POOL_SIZE = 4
+
+
+def cache_key(model: str, prompt: str, generation_config: Optional[Dict] = None) -> str:
+    payload = json.dumps([model, prompt, generation_config or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Cache persistente de respostas (pool limitado de conexões SQLite)"""
+
+    def __init__(self, path: str, ttl: float = 3600.0, max_entries: int = 10000, pool_size: int = POOL_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Mesmo esquema do DatabaseManager: vagas criadas sob demanda e devolvidas ao final
+        self._pool = queue.Queue()
+        for _ in range(max(pool_size, 1)):
+            self._pool.put(None)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0, 'errors': 0}
+        self._init_schema()
+
+    @contextmanager
+    def _connect(self):
+        conn = self._pool.get()
+        try:
+            if conn is None:
+                conn = sqlite3.connect(self.path, timeout=2.0, check_same_thread=False)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _init_schema(self):
+        try:
+            with self._connect() as conn, conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        response TEXT NOT NULL,
+                        model TEXT,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)')
+            # Início a quente: o que já está no disco continua valendo
+            removed = self.prune()
+            print(f"[CACHE] Cache de respostas em {self.path}: {self.count()} entradas "
+                  f"({removed} expiradas removidas)")
+        except sqlite3.Error as e:
+            print(f"[CACHE] Erro ao abrir o cache de respostas: {e}")
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        """(resposta, modelo que a gerou) ou None; o modelo é None em entradas antigas"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT response, last_access, model FROM responses WHERE key = ? AND expires_at > ?',
+                    (key, now)
+                ).fetchone()
+                if row and now - row[1] > TOUCH_INTERVAL:
+                    with conn:
+                        conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+        except sqlite3.Error:
+            row = None
+            self._count('errors')
+        self._count('hits' if row else 'misses')
+        return (row[0], row[2]) if row else None
+
+    def put(self, key: str, response: str, model: Optional[str] = None):
+        now = time.time()
+        try:
+            with self._connect() as conn, conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO responses (key, response, model, created_at, expires_at, last_access) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, response, model, now, now + self.ttl, now)
+                )
+        except sqlite3.Error:
+            self._count('errors')
+            return
+        with self._lock:
+            self.stats['writes'] += 1
+            self._writes += 1
+            due = self._writes % PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def prune(self) -> int:
+        """Remove as entradas expiradas e as menos acessadas acima do limite"""
+        try:
+            with self._connect() as conn, conn:
+                removed = conn.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time(),)).rowcount
+                excess = conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0] - self.max_entries
+                if excess > 0:
+                    removed += conn.execute(
+                        'DELETE FROM responses WHERE key IN '
+                        '(SELECT key FROM responses ORDER BY last_access LIMIT ?)',
+                        (excess,)
+                    ).rowcount
+        except sqlite3.Error:
+            self._count('errors')
+            return 0
+        with self._lock:
+            self.stats['evicted'] += removed
+        return removed
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def clear(self):
+        with self._connect() as conn, conn:
+            conn.execute('DELETE FROM responses')
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def close(self):
+        """Fecha as conexões ociosas do pool (as vagas continuam disponíveis)"""
+        connections = []
+        while True:
+            try:
+                connections.append(self._pool.get_nowait())
+            except queue.Empty:
+                break
+        for conn in connections:
+            if conn is not None:
+                conn.close()
+            self._pool.put(None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        try:
+            entries = self.count()
+        except sqlite3.Error:
+            entries = None
+        stats.update({
+            'enabled': True,
+            'path': self.path,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hit_rate': round(stats['hits'] / lookups, 3) if lookups else 0.0
+        })
+        return stats
+
+
+def create_response_cache(cfg) -> Optional[ResponseCache]:
+    """Cria o cache definido por RESPONSE_CACHE_*; None se desativado"""
+    if not cfg.RESPONSE_CACHE_ENABLED:
+        return None
+    return ResponseCache(cfg.RESPONSE_CACHE_PATH, cfg.RESPONSE_CACHE_TTL, cfg.RESPONSE_CACHE_MAX_ENTRIES)
@@ -0,0 +1,66 @@
+"""
+Compactação das respostas padrão já salvas com o texto completo
+
+Respostas novas do bot iguais a uma resposta padrão (``DEFAULT_RESPONSES``)
+já são salvas só com a referência (``messages.template_id``). Esta
+ferramenta converte as linhas antigas e mostra o espaço economizado.
+
+Uso:
+
+    python response_templates.py report
+    python response_templates.py compact --vacuum
+"""
+import json
+import sys
+from pathlib import Path
+
+# Adicionar o diretório atual ao path
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+
+def print_report(stats, compaction=None):
+    print(f"Respostas padrão cadastradas: {stats.get('templates', 0)}")
+    print(f"Mensagens salvas por referência: {stats.get('interned_messages', 0)} "
+          f"({_format_bytes(stats.get('bytes_saved', 0))} de texto não duplicado)")
+    print(f"Mensagens a compactar: {stats.get('pending_compaction', 0)}")
+    if compaction:
+        print(f"Convertidas agora: {compaction.get('converted', 0)} "
+              f"({_format_bytes(compaction.get('bytes_saved', 0))})")
+        if compaction.get('size_before'):
+            print(f"Arquivo: {_format_bytes(compaction['size_before'])} -> "
+                  f"{_format_bytes(compaction.get('size_after') or 0)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from chatbot import DEFAULT_RESPONSES
+    from config import config
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('report', help="Espaço economizado e linhas ainda não convertidas")
+    compact_cmd = sub.add_parser('compact', help="Converte as respostas antigas em referências")
+    compact_cmd.add_argument('--batch-size', type=int, default=5000)
+    compact_cmd.add_argument('--vacuum', action='store_true', help="Reescreve o arquivo para liberar o espaço")
+    parser.add_argument('--json', action='store_true', help="Saída em JSON")
+    args = parser.parse_args()
+
+    backend = create_storage(config)
+    backend.register_response_templates([text for texts in DEFAULT_RESPONSES.values() for text in texts])
+    compaction = None
+    if args.command == 'compact':
+        compaction = backend.compact_messages(args.batch_size, args.vacuum)
+    stats = backend.get_template_stats()
+    if args.json:
+        print(json.dumps({'stats': stats, 'compaction': compaction}, indent=2))
+    else:
+        print_report(stats, compaction)
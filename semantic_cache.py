@@ -0,0 +1,356 @@
+"""
+Cache semântico de respostas do Gemini para perguntas quase iguais
+
+As mensagens são convertidas em vetores por um vetorizador local de
+n-gramas de caracteres com hashing (sem GPU, sem rede e sem modelo para
+baixar) e comparadas por similaridade de cosseno. O índice pode ser
+força bruta (``flat``) ou IVF (listas invertidas por centróide, k-means).
+
+A similaridade sozinha confunde perguntas que só trocam o assunto ("horário
+de abertura da loja" x "do banco"): um acerto também exige que as palavras
+de conteúdo (radicais, sem palavras vazias) não tenham sido substituídas -
+uma pergunta pode acrescentar palavras à outra, mas não trocar uma por outra.
+Mensagens sem nenhuma palavra de conteúdo ("Conte mais") nunca acertam.
+
+Depende do NumPy; sem ele o cache fica desativado.
+"""
+import json
+import os
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def content_terms(text: str) -> frozenset:
+    """Radicais das palavras de conteúdo (mesma tokenização do FAQ)"""
+    # Importação tardia: faq.py usa normalize_text deste módulo
+    from faq import tokenize
+    return frozenset(tokenize(text))
+
+
+def same_subject(query_terms: frozenset, cached_terms: frozenset) -> bool:
+    """
+    False se a pergunta não tem palavras de conteúdo ou se cada pergunta tem
+    palavras de conteúdo que a outra não tem (assunto trocado)
+    """
+    return bool(query_terms) and not (query_terms - cached_terms and cached_terms - query_terms)
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação, com espaços únicos"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = ''.join(ch if ch.isalnum() else ' ' for ch in text)
+    return ' '.join(text.split())
+
+
+class HashedNgramVectorizer:
+    """
+    Vetorizador de n-gramas de caracteres com hashing assinado.
+
+    Os n-gramas de cada palavra (com bordas) são projetados em ``dim``
+    posições via CRC32; o resultado é normalizado (norma L2 = 1), então o
+    produto interno é a similaridade de cosseno.
+    """
+
+    def __init__(self, dim: int = 1024, ngram_range: Tuple[int, int] = (2, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str) -> List[bytes]:
+        features = []
+        low, high = self.ngram_range
+        for word in normalize_text(text).split():
+            padded = f' {word} '
+            for n in range(low, high + 1):
+                for i in range(max(1, len(padded) - n + 1)):
+                    features.append(padded[i:i + n].encode('utf-8'))
+        return features
+
+    def transform(self, texts: List[str]) -> 'np.ndarray':
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature)
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class VectorIndex:
+    """
+    Matriz de vetores com vagas reutilizáveis e busca do vizinho mais próximo.
+
+    Em modo ``ivf`` os vetores são agrupados em ``nlist`` centróides e a
+    busca só compara os vetores das ``nprobe`` listas mais próximas. O
+    agrupamento é (re)treinado quando o índice dobra de tamanho.
+    """
+
+    def __init__(self, dim: int, capacity: int, kind: str = 'flat',
+                 nlist: int = 16, nprobe: int = 2):
+        self.dim = dim
+        self.kind = kind
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.scopes = np.zeros(capacity, dtype=np.int64)
+        self.used = np.zeros(capacity, dtype=bool)
+        self.centroids = None
+        self._lists: List[set] = []
+        self._assignment: Dict[int, int] = {}
+        self._trained_size = 0
+
+    def add(self, slot: int, vector: 'np.ndarray', scope: int):
+        self.vectors[slot] = vector
+        self.scopes[slot] = scope
+        self.used[slot] = True
+        if self.kind == 'ivf':
+            size = int(self.used.sum())
+            if self.centroids is None or size >= 2 * self._trained_size:
+                self.train()
+            else:
+                self._assign(slot, int(np.argmax(self.centroids @ vector)))
+
+    def remove(self, slot: int):
+        self.used[slot] = False
+        self.vectors[slot] = 0
+        cluster = self._assignment.pop(slot, None)
+        if cluster is not None:
+            self._lists[cluster].discard(slot)
+
+    def _assign(self, slot: int, cluster: int):
+        self._assignment[slot] = cluster
+        self._lists[cluster].add(slot)
+
+    def train(self, iterations: int = 8):
+        """Agrupa os vetores ativos com k-means esférico"""
+        slots = np.flatnonzero(self.used)
+        if len(slots) < self.nlist:
+            self.centroids = None
+            return
+        data = self.vectors[slots]
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(slots), self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            for k in range(self.nlist):
+                members = data[labels == k]
+                if len(members):
+                    center = members.sum(axis=0)
+                    centroids[k] = center / (np.linalg.norm(center) or 1.0)
+        self.centroids = centroids
+        self._lists = [set() for _ in range(self.nlist)]
+        self._assignment = {}
+        for slot, cluster in zip(slots.tolist(), np.argmax(data @ centroids.T, axis=1).tolist()):
+            self._assign(slot, cluster)
+        self._trained_size = len(slots)
+
+    def search(self, vector: 'np.ndarray', scope: int) -> Tuple[int, float]:
+        """Vaga mais similar no mesmo escopo; (-1, 0.0) se não houver"""
+        if self.kind == 'ivf' and self.centroids is not None:
+            # Só as listas dos nprobe centróides mais próximos
+            probes = np.argsort(self.centroids @ vector)[-self.nprobe:]
+            candidates = [slot for cluster in probes.tolist() for slot in self._lists[cluster]]
+            slots = np.array(candidates, dtype=np.int64)
+            if len(slots):
+                slots = slots[self.scopes[slots] == scope]
+            if not len(slots):
+                return -1, 0.0
+            scores = self.vectors[slots] @ vector
+            best = int(np.argmax(scores))
+            return int(slots[best]), float(scores[best])
+
+        # Força bruta: produto com a matriz inteira, sem copiar as linhas
+        scores = self.vectors @ vector
+        scores[~(self.used & (self.scopes == scope))] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] == -np.inf:
+            return -1, 0.0
+        return best, float(scores[best])
+
+
+class SemanticCache:
+    """
+    Cache de respostas indexado pela similaridade da pergunta.
+
+    Entradas são removidas por LRU quando o cache enche e ignoradas após
+    ``ttl`` segundos. Respostas são separadas por ``scope`` (ex.: usuário),
+    para que o contexto de uma conversa não vaze para outra.
+    """
+
+    def __init__(self, max_entries: int = 2048, threshold: float = 0.8,
+                 ttl: float = 0, dim: int = 1024, index: str = 'flat',
+                 nlist: int = 16, nprobe: int = 2, path: Optional[str] = None):
+        if np is None:
+            raise RuntimeError("NumPy não instalado - cache semântico indisponível")
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.path = path
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self.index = VectorIndex(dim, max_entries, index, nlist, nprobe)
+        self._entries: Dict[int, Dict] = {}
+        self._lru: 'OrderedDict[int, None]' = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.stats = {'lookups': 0, 'hits': 0, 'rejected': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+        if path:
+            self.load(path)
+
+    @staticmethod
+    def _scope_id(scope: str) -> int:
+        return zlib.crc32(scope.encode('utf-8'))
+
+    def lookup(self, message: str, scope: str = '') -> Optional[str]:
+        """Resposta em cache para uma pergunta similar, se houver"""
+        vector = self.vectorizer.transform([message])[0]
+        terms = content_terms(message)
+        with self._lock:
+            self.stats['lookups'] += 1
+            slot, score = self.index.search(vector, self._scope_id(scope))
+            if slot < 0 or score < self.threshold:
+                return None
+            entry = self._entries[slot]
+            if not same_subject(terms, entry['terms']):
+                self.stats['rejected'] += 1
+                return None
+            if self.ttl and time.time() - entry['created_at'] > self.ttl:
+                self._remove(slot)
+                self.stats['expired'] += 1
+                return None
+            self._lru.move_to_end(slot)
+            self.stats['hits'] += 1
+            return entry['response']
+
+    def store(self, message: str, response: str, scope: str = ''):
+        """Guarda a resposta; substitui uma entrada quase idêntica do mesmo escopo"""
+        terms = content_terms(message)
+        if not terms:
+            # Nunca acertaria (same_subject exige palavras de conteúdo)
+            return
+        vector = self.vectorizer.transform([message])[0]
+        scope_id = self._scope_id(scope)
+        with self._lock:
+            slot, score = self.index.search(vector, scope_id)
+            if slot >= 0 and score >= 0.999:
+                self._remove(slot)
+            if not self._free:
+                oldest, _ = self._lru.popitem(last=False)
+                self._remove(oldest, lru=False)
+                self.stats['evictions'] += 1
+            slot = self._free.pop()
+            self._entries[slot] = {
+                'message': message,
+                'response': response,
+                'scope': scope,
+                'created_at': time.time(),
+                'terms': terms
+            }
+            self._lru[slot] = None
+            self.index.add(slot, vector, scope_id)
+            self.stats['stores'] += 1
+
+    def _remove(self, slot: int, lru: bool = True):
+        if lru:
+            self._lru.pop(slot, None)
+        self._entries.pop(slot, None)
+        self.index.remove(slot)
+        self._free.append(slot)
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._entries):
+                self._remove(slot)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 3) if stats['lookups'] else 0.0
+        stats['threshold'] = self.threshold
+        stats['index'] = self.index.kind
+        return stats
+
+    # Persistência
+
+    def save(self, path: Optional[str] = None) -> bool:
+        """Salva vetores e entradas (np.savez) na ordem de uso"""
+        path = path or self.path
+        if not path:
+            return False
+        try:
+            with self._lock:
+                slots = list(self._lru)
+                # Os radicais são recalculados ao carregar (o formato salvo não muda)
+                entries = [{key: value for key, value in self._entries[slot].items() if key != 'terms'}
+                           for slot in slots]
+                vectors = self.index.vectors[slots] if slots else np.zeros((0, self.index.dim), np.float32)
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, vectors=vectors, entries=np.array(json.dumps(entries, ensure_ascii=False)))
+            os.replace(tmp_path, path)
+            return True
+        except Exception as e:
+            print(f"[CACHE] Erro ao salvar cache semântico: {e}")
+            return False
+
+    def load(self, path: str) -> int:
+        """Carrega entradas salvas; retorna quantas foram restauradas"""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with np.load(path) as data:
+                vectors = data['vectors']
+                entries = json.loads(str(data['entries']))
+        except Exception as e:
+            print(f"[CACHE] Erro ao carregar cache semântico: {e}")
+            return 0
+        if vectors.shape[1:] != (self.index.dim,):
+            print("[CACHE] Dimensão do cache salvo difere da atual - ignorando")
+            return 0
+
+        restored = 0
+        now = time.time()
+        with self._lock:
+            # Mantém as entradas mais recentes (o arquivo está em ordem de uso)
+            for vector, entry in list(zip(vectors, entries))[-self.max_entries:]:
+                if self.ttl and now - entry['created_at'] > self.ttl:
+                    continue
+                slot = self._free.pop()
+                self._entries[slot] = dict(entry, terms=content_terms(entry['message']))
+                self._lru[slot] = None
+                self.index.add(slot, vector, self._scope_id(entry['scope']))
+                restored += 1
+        print(f"[CACHE] {restored} respostas restauradas de {path}")
+        return restored
+
+
+def create_semantic_cache(cfg) -> Optional[SemanticCache]:
+    """Cria o cache definido por SEMANTIC_CACHE_*; None se desativado"""
+    if not cfg.SEMANTIC_CACHE_ENABLED:
+        return None
+    if np is None:
+        print("[CACHE] NumPy não instalado - cache semântico desativado")
+        return None
+    return SemanticCache(
+        max_entries=cfg.SEMANTIC_CACHE_MAX_ENTRIES,
+        threshold=cfg.SEMANTIC_CACHE_THRESHOLD,
+        ttl=cfg.SEMANTIC_CACHE_TTL,
+        dim=cfg.SEMANTIC_CACHE_DIM,
+        index=cfg.SEMANTIC_CACHE_INDEX,
+        nlist=cfg.SEMANTIC_CACHE_NLIST,
+        nprobe=cfg.SEMANTIC_CACHE_NPROBE,
+        path=cfg.SEMANTIC_CACHE_PATH or None
+    )
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark do cache semântico: taxa de acerto, acertos errados e latência
+
+Cada grupo abaixo reúne paráfrases da mesma pergunta. A primeira frase de
+cada grupo é armazenada; as demais devem acertar o cache, e perguntas de
+outros grupos não. ``NEAR_MISSES`` são pares com quase as mesmas palavras e
+outro assunto: a segunda pergunta nunca pode receber a resposta da
+primeira. Para medir latência o índice é completado com perguntas
+sintéticas. Uso:
+
+    python semantic_cache_bench.py --thresholds 0.6 0.7 0.8 0.85 --entries 2000 --index flat ivf
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Adicionar o diretório atual ao path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from semantic_cache import SemanticCache, np
+
+PARAPHRASES = [
+    ["como você funciona?", "como funciona isso?", "como você funciona", "explica como você funciona"],
+    ["me conte uma curiosidade", "conte uma curiosidade", "me fala uma curiosidade", "quero uma curiosidade"],
+    ["o que é o gemini?", "o que é gemini", "que é o gemini?", "me explica o que é o gemini"],
+    ["qual a capital da frança?", "qual é a capital da França", "capital da frança?", "qual a capital da frança"],
+    ["qual a capital da itália?", "qual é a capital da Itália", "capital da itália?", "qual a capital da italia"],
+    ["como faço um bolo de chocolate?", "receita de bolo de chocolate", "como fazer bolo de chocolate",
+     "como eu faço bolo de chocolate?"],
+    ["quantos planetas existem no sistema solar?", "quantos planetas tem o sistema solar",
+     "número de planetas do sistema solar", "quantos planetas há no sistema solar?"],
+    ["qual a previsão do tempo para amanhã?", "como vai estar o tempo amanhã?", "previsão do tempo amanhã",
+     "vai chover amanhã?"],
+    ["me recomende um livro", "recomenda um livro", "qual livro você recomenda?", "sugira um livro"],
+    ["como aprender python?", "como aprendo python", "dicas para aprender python", "quero aprender python"]
+]
+
+# (pergunta armazenada, pergunta diferente que não pode reutilizar a resposta)
+NEAR_MISSES = [
+    ("qual o horário de abertura da loja?", "qual o horário de abertura do banco?"),
+    ("como faço um bolo de cenoura?", "como faço um bolo de laranja?"),
+    ("quantas luas tem júpiter?", "quantas luas tem saturno?"),
+    ("qual a previsão do tempo para segunda?", "qual a previsão do tempo para sábado?"),
+    ("como aprender java?", "como aprender javascript?"),
+    ("qual a população do brasil?", "qual a população da argentina?"),
+    ("quem ganhou a copa de 2002?", "quem ganhou a copa de 2006?"),
+    ("qual o preço do dólar hoje?", "qual o preço do euro hoje?"),
+    ("me recomende um livro de terror", "me recomende um filme de terror"),
+    ("qual a altura do monte everest?", "qual a altura do pico da neblina?"),
+    ("como trocar o pneu do carro?", "como trocar o óleo do carro?"),
+    ("qual o telefone do suporte?", "qual o email do suporte?"),
+]
+
+TOPICS = ["futebol", "música", "cinema", "história", "física", "química", "viagens", "economia",
+          "programação", "saúde", "culinária", "astronomia", "geografia", "arte", "política"]
+TEMPLATES = ["o que você acha de {} e {}? ({})", "me fale sobre {} e {} - parte {}",
+             "qual a importância de {} para {}? item {}", "como {} influencia {}? caso {}"]
+
+
+def filler_questions(count, seed=42):
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(rng.choice(TOPICS), rng.choice(TOPICS), i) for i in range(count)]
+
+
+def evaluate(threshold, index, entries, nlist=16, nprobe=2):
+    """Retorna (taxa de acerto, acertos errados, quase-acertos aceitos, latências em ms)"""
+    cache = SemanticCache(max_entries=entries + len(PARAPHRASES) + len(NEAR_MISSES), threshold=threshold,
+                          ttl=0, index=index, nlist=nlist, nprobe=nprobe)
+    for position, question in enumerate(filler_questions(entries)):
+        cache.store(question, f"filler-{position}")
+    for group, phrases in enumerate(PARAPHRASES):
+        cache.store(phrases[0], f"group-{group}")
+    for stored, _ in NEAR_MISSES:
+        cache.store(stored, stored)
+
+    hits = wrong = total = 0
+    latencies = []
+    for group, phrases in enumerate(PARAPHRASES):
+        for phrase in phrases[1:]:
+            started = time.perf_counter()
+            answer = cache.lookup(phrase)
+            latencies.append((time.perf_counter() - started) * 1000)
+            total += 1
+            if answer == f"group-{group}":
+                hits += 1
+            elif answer is not None:
+                wrong += 1
+    near = sum(cache.lookup(question) is not None for _, question in NEAR_MISSES)
+    return hits / total, wrong, near, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.7, 0.75, 0.8, 0.85, 0.9])
+    parser.add_argument('--entries', type=int, default=2000, help="Perguntas sintéticas no índice")
+    parser.add_argument('--index', nargs='+', default=['flat', 'ivf'])
+    parser.add_argument('--nlist', type=int, default=16, help="Centróides do índice IVF")
+    parser.add_argument('--nprobe', type=int, default=2, help="Listas consultadas por busca no IVF")
+    args = parser.parse_args()
+
+    if np is None:
+        print("❌ NumPy não instalado - instale com: pip install numpy")
+        return False
+
+    print(f"🔍 Cache semântico ({args.entries} entradas sintéticas + {len(PARAPHRASES)} grupos de paráfrases)")
+    print("=" * 72)
+    print(f"{'índice':<6} {'limiar':>6} {'acertos':>8} {'errados':>8} {'quase':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for index in args.index:
+        for threshold in args.thresholds:
+            hit_rate, wrong, near, latencies = evaluate(threshold, index, args.entries, args.nlist, args.nprobe)
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"{index:<6} {threshold:>6.2f} {hit_rate:>7.0%} {wrong:>8} {near:>4}/{len(NEAR_MISSES):<3} "
+                  f"{statistics.median(latencies):>8.3f} {p99:>8.3f}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -33,7 +33,7 @@ def setup_gemini():
         
         if success:
             print("✅ API key do Gemini configurada com sucesso!")
-            print("🔄 Reinicie a aplicação para ativar o Gemini")
+            print("🔄 A aplicação em execução aplicará a chave automaticamente em alguns segundos")
         else:
             print("❌ Erro ao salvar API key")
             
@@ -0,0 +1,373 @@
+"""
+Armazenamento SQLite particionado por usuário (um arquivo por shard)
+
+Cada usuário é direcionado a um shard pelo hash (CRC32) do ``user_id``; cada
+shard é um ``DatabaseManager`` com pool de conexões e writer próprios, então
+escritas de usuários em shards diferentes não disputam o mesmo lock do SQLite.
+
+IDs de mensagens são globais: ``id_local * num_shards + indice_do_shard``.
+"""
+import os
+import sqlite3
+import zlib
+from typing import Dict, Iterator, List, Optional
+
+from database import DatabaseManager
+from usage import USAGE_FIELDS, build_usage_report
+
+# Conexões por shard quando pool_size <= 0: sem pool o shard não usaria WAL
+DEFAULT_POOL_SIZE = 4
+
+
+def shard_paths(base_path: str, num_shards: int) -> List[str]:
+    """Arquivos dos shards derivados do caminho base (chatbot.db -> chatbot.shard0.db, ...)"""
+    root, ext = os.path.splitext(base_path)
+    return [f"{root}.shard{index}{ext or '.db'}" for index in range(num_shards)]
+
+
+class ShardedStorage:
+    """
+    Backend de armazenamento com N arquivos SQLite.
+
+    Configurações do sistema ficam no shard 0. Operações de um usuário
+    acontecem sempre no mesmo shard; consultas administrativas agregam
+    todos os shards.
+    """
+
+    def __init__(self, base_path: str, num_shards: int = 4, pool_size: int = 4):
+        if num_shards < 1:
+            raise ValueError("num_shards deve ser >= 1")
+        self.base_path = base_path
+        self.num_shards = num_shards
+        if pool_size <= 0:
+            pool_size = DEFAULT_POOL_SIZE
+        self.shards = [DatabaseManager(path, pool_size=pool_size)
+                       for path in shard_paths(base_path, num_shards)]
+
+    # Roteamento e conversão de IDs
+
+    def shard_index(self, user_id: str) -> int:
+        return zlib.crc32(user_id.encode('utf-8')) % self.num_shards
+
+    def shard_for(self, user_id: str) -> DatabaseManager:
+        return self.shards[self.shard_index(user_id)]
+
+    def to_global_id(self, local_id: Optional[int], shard_index: int) -> Optional[int]:
+        if local_id is None:
+            return None
+        return local_id * self.num_shards + shard_index
+
+    def to_local_id(self, global_id: Optional[int]) -> Optional[int]:
+        if global_id is None:
+            return None
+        return global_id // self.num_shards
+
+    def _globalize(self, rows: List[Dict], shard_index: int) -> List[Dict]:
+        for row in rows:
+            row['id'] = self.to_global_id(row['id'], shard_index)
+            if 'parent_message_id' in row:
+                row['parent_message_id'] = self.to_global_id(row['parent_message_id'], shard_index)
+        return rows
+
+    # Operações do StorageBackend
+
+    def init_database(self):
+        for shard in self.shards:
+            shard.init_database()
+
+    def test_connection(self) -> bool:
+        return all(shard.test_connection() for shard in self.shards)
+
+    def create_or_update_user(self, user_data: Dict) -> bool:
+        return self.shard_for(user_data['user_id']).create_or_update_user(user_data)
+
+    def save_message(self, user_id: str, message: str, is_user: bool,
+                     parent_message_id: Optional[int] = None,
+                     usage: Optional[Dict] = None) -> Optional[int]:
+        index = self.shard_index(user_id)
+        local_id = self.shards[index].save_message(
+            user_id, message, is_user, self.to_local_id(parent_message_id), usage
+        )
+        return self.to_global_id(local_id, index)
+
+    def save_conversation_turns(self, turns: List[Dict]) -> List[Optional[tuple]]:
+        """Agrupa os pares por shard; cada shard grava em uma única transação"""
+        by_shard: Dict[int, List[int]] = {}
+        for position, turn in enumerate(turns):
+            by_shard.setdefault(self.shard_index(turn['user_id']), []).append(position)
+
+        ids: List[Optional[tuple]] = [None] * len(turns)
+        for index, positions in by_shard.items():
+            saved = self.shards[index].save_conversation_turns([turns[p] for p in positions])
+            for position, pair in zip(positions, saved):
+                if pair:
+                    ids[position] = tuple(self.to_global_id(i, index) for i in pair)
+        return ids
+
+    def get_user_history(self, user_id: str, limit: int = 50) -> List[Dict]:
+        index = self.shard_index(user_id)
+        return self._globalize(self.shards[index].get_user_history(user_id, limit), index)
+
+    def get_recent_messages(self, user_id: str, limit: int = 10) -> List[Dict]:
+        index = self.shard_index(user_id)
+        return self._globalize(self.shards[index].get_recent_messages(user_id, limit), index)
+
+    def get_user_stats(self, user_id: str) -> Dict:
+        return self.shard_for(user_id).get_user_stats(user_id)
+
+    def get_global_stats(self) -> Dict:
+        """Estatísticas agregadas de todos os shards (com o detalhe de cada um)"""
+        per_shard = [shard.get_global_stats() for shard in self.shards]
+        totals = {}
+        for stats in per_shard:
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        totals['shards'] = [dict(stats, path=shard.db_path) for shard, stats in zip(self.shards, per_shard)]
+        return totals
+
+    def get_messages_page(self, after_id: int = 0, limit: int = 10000,
+                          is_user: Optional[bool] = None,
+                          user_id: Optional[str] = None) -> List[tuple]:
+        """Mescla as páginas de cada shard mantendo a ordem dos ids globais"""
+        indexes = range(self.num_shards) if user_id is None else [self.shard_index(user_id)]
+        rows = []
+        for index in indexes:
+            # id global > after_id  <=>  id local > (after_id - indice) // num_shards
+            local_after = (after_id - index) // self.num_shards
+            for row in self.shards[index].get_messages_page(max(local_after, 0), limit, is_user, user_id):
+                rows.append((self.to_global_id(row[0], index),) + row[1:5] +
+                            (self.to_global_id(row[5], index),))
+        rows.sort(key=lambda row: row[0])
+        return rows[:limit]
+
+    def iter_messages(self, user_id: Optional[str] = None,
+                      batch_size: int = 1000) -> Iterator[List[Dict]]:
+        """Um shard de cada vez, em páginas por id (uma conexão por página)"""
+        indexes = range(self.num_shards) if user_id is None else [self.shard_index(user_id)]
+        for index in indexes:
+            for rows in self.shards[index].iter_messages(user_id, batch_size):
+                yield self._globalize(rows, index)
+
+    def insert_messages(self, rows: List[Dict], id_map: Optional[Dict[int, int]] = None) -> List[int]:
+        """
+        Agrupa as linhas por shard (uma transação por shard); ``id_map``
+        guarda ids globais e é traduzido para ids locais em cada shard
+        """
+        by_shard: Dict[int, List[int]] = {}
+        for position, row in enumerate(rows):
+            by_shard.setdefault(self.shard_index(row['user_id']), []).append(position)
+
+        ids: List[Optional[int]] = [None] * len(rows)
+        for index, positions in by_shard.items():
+            group = [rows[p] for p in positions]
+            # Pai e filho são do mesmo usuário, logo do mesmo shard
+            local_map = {}
+            if id_map is not None:
+                for row in group:
+                    parent_id = row.get('parent_message_id')
+                    if parent_id in id_map:
+                        local_map[parent_id] = self.to_local_id(id_map[parent_id])
+            local_ids = self.shards[index].insert_messages(group, local_map if id_map is not None else None)
+            for position, row, local_id in zip(positions, group, local_ids):
+                ids[position] = self.to_global_id(local_id, index)
+                if id_map is not None and row.get('id') is not None:
+                    id_map[row['id']] = ids[position]
+        return ids
+
+    def replace_intent_stats(self, rows: List[tuple]) -> bool:
+        return self.shards[0].replace_intent_stats(rows)
+
+    def get_intent_stats(self) -> List[Dict]:
+        return self.shards[0].get_intent_stats()
+
+    def get_precomputed_answers(self) -> List[Dict]:
+        return self.shards[0].get_precomputed_answers()
+
+    def save_precomputed_answer(self, prompt_key: str, prompt: str, response: str,
+                                model: Optional[str] = None) -> bool:
+        return self.shards[0].save_precomputed_answer(prompt_key, prompt, response, model)
+
+    def delete_precomputed_answers(self, prompt_keys: List[str]) -> bool:
+        return self.shards[0].delete_precomputed_answers(prompt_keys)
+
+    def register_response_templates(self, texts: List[str]) -> Dict[str, int]:
+        """Cada shard tem sua tabela de respostas padrão (ids locais)"""
+        templates = [shard.register_response_templates(texts) for shard in self.shards]
+        return templates[0]
+
+    def compact_messages(self, batch_size: int = 5000, vacuum: bool = False) -> Dict:
+        return self._sum([shard.compact_messages(batch_size, vacuum) for shard in self.shards])
+
+    def get_template_stats(self) -> Dict:
+        stats = self._sum([shard.get_template_stats() for shard in self.shards])
+        stats['templates'] = stats.get('templates', 0) // self.num_shards
+        return stats
+
+    def get_usage_report(self, since: Optional[str] = None, group_by: str = 'user',
+                         limit: int = 20, order_by: str = 'tokens') -> Dict:
+        """Combina as somas parciais de cada shard (médias recalculadas sobre o total)"""
+        rows = [row for shard in self.shards for row in shard.get_usage_rows(since, group_by)]
+        return build_usage_report(rows, group_by, limit, order_by, since)
+
+    @staticmethod
+    def _sum(reports: List[Dict]) -> Dict:
+        totals = {}
+        for report in reports:
+            for key, value in report.items():
+                totals[key] = totals.get(key, 0) + (value or 0)
+        return totals
+
+    def clear_user_history(self, user_id: str) -> bool:
+        return self.shard_for(user_id).clear_user_history(user_id)
+
+    def get_system_config(self, config_key: str) -> Optional[str]:
+        return self.shards[0].get_system_config(config_key)
+
+    def set_system_config(self, config_key: str, config_value: str) -> bool:
+        return self.shards[0].set_system_config(config_key, config_value)
+
+    def get_all_system_config(self) -> Dict[str, Optional[str]]:
+        return self.shards[0].get_all_system_config()
+
+    def get_system_config_version(self) -> Optional[tuple]:
+        return self.shards[0].get_system_config_version()
+
+
+def migrate_layout(source_paths: List[str], target: ShardedStorage, batch_size: int = 5000) -> Dict:
+    """
+    Copia usuários, mensagens, uso (message_usage) e configurações de um
+    layout (arquivo único ou shards antigos) para ``target``, redistribuindo
+    pelo hash do user_id.
+
+    Datas e encadeamento (parent_message_id) são preservados; o uso acompanha
+    o novo id da mensagem. O destino deve estar vazio.
+    """
+    copied = {'users': 0, 'messages': 0, 'message_usage': 0, 'system_config': 0}
+
+    for source_index, path in enumerate(source_paths):
+        print(f"[SHARDS] Migrando {path}...")
+        source = sqlite3.connect(path)
+        try:
+            # Configurações só do primeiro arquivo (shard 0 ou arquivo único)
+            if source_index == 0:
+                for key, value in source.execute('SELECT config_key, config_value FROM system_config'):
+                    if value is not None:
+                        target.set_system_config(key, value)
+                        copied['system_config'] += 1
+
+            for user_id, username, email, created_at, updated_at in source.execute(
+                    'SELECT user_id, username, email, created_at, updated_at FROM users'):
+                with target.shard_for(user_id)._connect(write=True) as conn:
+                    conn.execute('''
+                        INSERT OR REPLACE INTO users (user_id, username, email, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (user_id, username, email, created_at, updated_at))
+                copied['users'] += 1
+
+            # id antigo -> id local novo (mesmo usuário, mesmo shard), para remapear parent_message_id
+            id_map: Dict[int, int] = {}
+            columns = [row[1] for row in source.execute('PRAGMA table_info(messages)')]
+            if 'template_id' in columns:
+                # Respostas padrão da origem voltam ao texto e o destino as referencia de novo
+                target.register_response_templates(
+                    [text for (text,) in source.execute('SELECT text FROM response_templates')]
+                )
+                cursor = source.execute('''
+                    SELECT m.id, m.user_id, COALESCE(t.text, m.message), m.is_user, m.parent_message_id, m.created_at
+                    FROM messages m LEFT JOIN response_templates t ON t.id = m.template_id ORDER BY m.id
+                ''')
+            else:
+                cursor = source.execute('''
+                    SELECT id, user_id, message, is_user, parent_message_id, created_at
+                    FROM messages ORDER BY id
+                ''')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                by_shard: Dict[int, List[tuple]] = {}
+                for row in rows:
+                    by_shard.setdefault(target.shard_index(row[1]), []).append(row)
+
+                for index, shard_rows in by_shard.items():
+                    shard = target.shards[index]
+                    with shard._connect(write=True) as conn:
+                        for old_id, user_id, message, is_user, parent_id, created_at in shard_rows:
+                            message, template_id = shard._intern(message, is_user)
+                            new_cursor = conn.execute('''
+                                INSERT INTO messages (user_id, message, is_user, parent_message_id, created_at, template_id)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                            ''', (user_id, message, is_user, id_map.get(parent_id), created_at, template_id))
+                            id_map[old_id] = new_cursor.lastrowid
+                            copied['messages'] += 1
+
+            copied['message_usage'] += _migrate_usage(source, target, id_map, batch_size)
+        finally:
+            source.close()
+
+    print(f"[SHARDS] Migração concluída: {copied}")
+    return copied
+
+
+def _migrate_usage(source: sqlite3.Connection, target: ShardedStorage, id_map: Dict[int, int],
+                   batch_size: int) -> int:
+    """Copia message_usage com os ids novos das mensagens; retorna as linhas copiadas"""
+    if not source.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_usage'").fetchone():
+        return 0
+    columns = ('message_id', 'user_id') + USAGE_FIELDS + ('created_at',)
+    cursor = source.execute(f"SELECT {', '.join(columns)} FROM message_usage ORDER BY message_id")
+    insert = (f"INSERT INTO message_usage ({', '.join(columns)}) "
+              f"VALUES ({', '.join('?' * len(columns))})")
+    copied = skipped = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        by_shard: Dict[int, List[tuple]] = {}
+        for row in rows:
+            new_id = id_map.get(row[0])
+            if new_id is None:
+                # Mensagem apagada antes da limpeza do uso ter sido implementada
+                skipped += 1
+                continue
+            by_shard.setdefault(target.shard_index(row[1]), []).append((new_id,) + row[1:])
+        for index, shard_rows in by_shard.items():
+            with target.shards[index]._connect(write=True) as conn:
+                conn.executemany(insert, shard_rows)
+            copied += len(shard_rows)
+    if skipped:
+        print(f"[SHARDS] {skipped} registros de uso sem mensagem ignorados")
+    return copied
+
+
+if __name__ == "__main__":
+    # Ferramenta de migração/rebalanceamento e consultas administrativas
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Ferramenta de shards SQLite do chatbot")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    migrate_cmd = sub.add_parser('migrate', help="Migra o arquivo único (ou shards antigos) para N shards")
+    migrate_cmd.add_argument('--source', default='chatbot.db', help="Arquivo único de origem")
+    migrate_cmd.add_argument('--source-shards', type=int, default=0,
+                             help="Número de shards da origem (rebalanceamento); 0 = arquivo único")
+    migrate_cmd.add_argument('--target', required=True, help="Caminho base dos novos shards")
+    migrate_cmd.add_argument('--shards', type=int, required=True)
+
+    stats_cmd = sub.add_parser('stats', help="Estatísticas agregadas de todos os shards")
+    stats_cmd.add_argument('--base', default='chatbot.db')
+    stats_cmd.add_argument('--shards', type=int, required=True)
+
+    args = parser.parse_args()
+    if args.command == 'migrate':
+        sources = shard_paths(args.source, args.source_shards) if args.source_shards else [args.source]
+        targets = shard_paths(args.target, args.shards)
+        if set(sources) & set(targets):
+            raise SystemExit("Origem e destino não podem ser os mesmos arquivos")
+        if any(os.path.exists(path) for path in targets):
+            raise SystemExit("Os arquivos de destino já existem - use um caminho base novo")
+        migrate_layout(sources, ShardedStorage(args.target, args.shards, pool_size=1))
+    else:
+        stats = ShardedStorage(args.base, args.shards, pool_size=1).get_global_stats()
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
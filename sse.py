@@ -0,0 +1,131 @@
+"""
+Camada de protocolo SSE (Server-Sent Events) usada pelo streaming do chat
+"""
+import json
+import queue
+import threading
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+# Sentinela usada para indicar um heartbeat no lugar de um trecho de texto
+HEARTBEAT = object()
+
+
+def format_event(data: Any, event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    """
+    Formata um evento SSE com payload JSON.
+
+    O JSON nunca contém quebras de linha literais, então trechos com "\\n"
+    não quebram o enquadramento do protocolo.
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def format_comment(text: str = 'keep-alive') -> str:
+    """Comentário SSE (ignorado pelos clientes, mantém proxies com a conexão aberta)"""
+    return f": {text}\n\n"
+
+
+def format_retry(milliseconds: int) -> str:
+    """Define o intervalo de reconexão sugerido ao cliente"""
+    return f"retry: {int(milliseconds)}\n\n"
+
+
+def make_event_id(stream_id: Any, seq: int) -> str:
+    return f"{stream_id}:{seq}"
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Converte um Last-Event-ID no formato "<stream>:<seq>" em (stream, seq)"""
+    if not value:
+        return None
+    stream_id, sep, seq = value.strip().rpartition(':')
+    if not sep or not stream_id:
+        return None
+    try:
+        return stream_id, int(seq)
+    except ValueError:
+        return None
+
+
+class EventWriter:
+    """
+    Produz eventos numerados de um stream e controla quando o texto
+    acumulado é enviado (flush) ao cliente.
+
+    Cada evento formatado é entregue ao ``sink`` (qualquer objeto com
+    ``append(seq, frame)`` e ``close()``), que o repassa aos clientes.
+    """
+
+    def __init__(self, stream_id: Any, sink, flush_bytes: int = 0, start_seq: int = 0):
+        self.stream_id = stream_id
+        self.sink = sink
+        self.flush_bytes = flush_bytes
+        self.seq = start_seq
+        self._pending = []
+        self._pending_size = 0
+
+    def event(self, event: str, data: Any) -> str:
+        """Formata um evento com o próximo id e o entrega ao sink"""
+        self.seq += 1
+        frame = format_event(data, event=event, event_id=make_event_id(self.stream_id, self.seq))
+        self.sink.append(self.seq, frame)
+        return frame
+
+    def write(self, text: str) -> Optional[str]:
+        """Acumula um trecho; emite um evento quando o limite de flush é atingido"""
+        self._pending.append(text)
+        self._pending_size += len(text.encode('utf-8'))
+        if self._pending_size >= self.flush_bytes:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[str]:
+        """Envia o texto acumulado como um único evento 'chunk'"""
+        if not self._pending:
+            return None
+        text = ''.join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        return self.event('chunk', {'text': text})
+
+    def close(self):
+        self.flush()
+        self.sink.close()
+
+
+def with_heartbeat(iterable: Iterable, interval: float) -> Iterator:
+    """
+    Consome ``iterable`` em uma thread e repassa seus itens, produzindo
+    ``HEARTBEAT`` sempre que nada chegar em ``interval`` segundos
+    """
+    items = queue.Queue()
+    finished = object()
+
+    def pump():
+        try:
+            for item in iterable:
+                items.put(item)
+        except Exception as e:
+            items.put(e)
+        finally:
+            items.put(finished)
+
+    threading.Thread(target=pump, name='sse-pump', daemon=True).start()
+
+    while True:
+        try:
+            item = items.get(timeout=interval)
+        except queue.Empty:
+            yield HEARTBEAT
+            continue
+        if item is finished:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
@@ -1,9 +1,75 @@
+class HistoryCache {
+    // Cache do histórico no IndexedDB (uma entrada por mensagem, indexada por usuário).
+    // Sem IndexedDB (modo privado, navegador antigo) todas as operações viram no-op.
+    constructor(name = 'chatbot') {
+        this.ready = new Promise((resolve) => {
+            if (!window.indexedDB) return resolve(null);
+            const request = indexedDB.open(name, 1);
+            request.onupgradeneeded = () => {
+                const store = request.result.createObjectStore('messages', { keyPath: 'id' });
+                store.createIndex('user_id', 'user_id');
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(null);
+        });
+    }
+    
+    async transaction(mode, callback) {
+        const db = await this.ready;
+        if (!db) return null;
+        return new Promise((resolve) => {
+            const tx = db.transaction('messages', mode);
+            const result = callback(tx.objectStore('messages'));
+            tx.oncomplete = () => resolve(result && 'result' in result ? result.result : null);
+            tx.onerror = () => resolve(null);
+        });
+    }
+    
+    async load(userId) {
+        // Mensagens do usuário em ordem de id
+        const rows = await this.transaction('readonly',
+            store => store.index('user_id').getAll(IDBKeyRange.only(userId)));
+        return (rows || []).sort((a, b) => a.id - b.id);
+    }
+    
+    async put(userId, messages) {
+        if (!messages.length) return;
+        await this.transaction('readwrite', store => {
+            messages.forEach(msg => store.put({ ...msg, user_id: userId }));
+        });
+    }
+    
+    async clear(userId) {
+        await this.transaction('readwrite', store => {
+            const cursor = store.index('user_id').openKeyCursor(IDBKeyRange.only(userId));
+            cursor.onsuccess = () => {
+                if (cursor.result) {
+                    store.delete(cursor.result.primaryKey);
+                    cursor.result.continue();
+                }
+            };
+        });
+    }
+}
+
 class ChatBot {
     constructor() {
-        this.userId = this.generateUserId();
+        this.userId = this.loadUserId();
+        this.historyCache = new HistoryCache();
+        // Mensagens da conversa; só uma janela delas fica no DOM
+        this.messages = [];
+        this.windowStart = 0;
+        this.windowEnd = 0;
+        this.lastSyncedId = 0;
         this.isLoading = false;
         this.autoScroll = true;
         this.soundEnabled = true;
+        // Conexão WebSocket da sessão (requisições pendentes indexadas pelo id do cliente)
+        this.socket = null;
+        this.socketReady = false;
+        this.socketPending = new Map();
+        this.socketSeq = 0;
+        this.socketFailures = 0;
         
         this.initializeElements();
         this.bindEvents();
@@ -16,6 +82,16 @@ class ChatBot {
         return 'user_' + Date.now() + '_' + Math.random().toString(36).substr(2, 9);
     }
     
+    loadUserId() {
+        // Reutilizar o ID entre recarregamentos para recuperar o histórico do servidor
+        let userId = localStorage.getItem('chatbot_user_id');
+        if (!userId) {
+            userId = this.generateUserId();
+            localStorage.setItem('chatbot_user_id', userId);
+        }
+        return userId;
+    }
+    
     initializeElements() {
         // Elementos do DOM
         this.chatMessages = document.getElementById('chatMessages');
@@ -84,9 +160,15 @@ class ChatBot {
     }
     
     initializeChat() {
+        // Renderização em janela para históricos longos
+        this.setupVirtualList();
+        
         // Carregar histórico se existir
         this.loadChatHistory();
         
+        // Conexão persistente para as próximas mensagens (fallback: HTTP/SSE)
+        this.connectSocket();
+        
         // Configurar auto-scroll
         this.setupAutoScroll();
     }
@@ -113,6 +195,8 @@ class ChatBot {
                 await this.saveUserSettings();
                 this.hideLoading();
             }
+            // Guardar no cache local as mensagens gravadas pelo servidor
+            this.fetchNewMessages().catch(error => console.warn('Falha ao atualizar o cache:', error));
         } catch (error) {
             console.error('Erro ao enviar mensagem:', error);
             this.addMessage('Desculpe, ocorreu um erro. Tente novamente.', 'bot');
@@ -123,17 +207,34 @@ class ChatBot {
 
     async sendStreaming(message) {
         // Cria uma mensagem vazia do bot e vai preenchendo em tempo real
-        const placeholderDiv = document.createElement('div');
-        placeholderDiv.className = 'message bot';
-        const timestamp = new Date().toLocaleTimeString('pt-BR', { hour: '2-digit', minute: '2-digit' });
-        placeholderDiv.innerHTML = `
-            <div class="message-avatar">🤖</div>
-            <div class="message-content"><span class="stream-text"></span>
-                <div class="message-time">${timestamp}</div>
-            </div>`;
-        this.chatMessages.appendChild(placeholderDiv);
-        const streamSpan = placeholderDiv.querySelector('.stream-text');
-        if (this.autoScroll) this.scrollToBottom();
+        const record = { message: '', is_user: false, created_at: new Date().toISOString(), streaming: true };
+        let placeholderDiv = this.appendRecord(record);
+        let streamSpan = placeholderDiv.querySelector('.stream-text');
+        const showChunk = (text) => {
+            record.message += text;
+            // O elemento pode ter saído da janela (e voltado) durante o stream
+            if (record.element !== placeholderDiv) {
+                placeholderDiv = record.element;
+                streamSpan = placeholderDiv && placeholderDiv.querySelector('.stream-text');
+            }
+            if (streamSpan) streamSpan.textContent = record.message;
+            if (this.autoScroll) this.scrollToBottom();
+        };
+
+        // Conexão WebSocket aberta: sem requisição HTTP nem handshake SSE por mensagem
+        if (this.socketReady) {
+            try {
+                await this.socketRequest({ type: 'send', message: message, use_gemini: true }, (event) => {
+                    if (event.type === 'chunk') showChunk(event.text);
+                });
+                delete record.streaming;
+                return;
+            } catch (error) {
+                // Mensagem já gravada pelo servidor: reenviar via SSE a duplicaria
+                if (!error.fallback) throw error;
+                console.warn('WebSocket indisponível, usando SSE...', error);
+            }
+        }
 
         const payload = {
             message: message,
@@ -141,13 +242,52 @@ class ChatBot {
             use_gemini: true
         };
 
+        // Reconectar com Last-Event-ID (e o token do evento 'meta') se a conexão cair no meio do stream
+        let lastEventId = null;
+        let streamToken = null;
+        let finished = false;
+        for (let attempt = 0; attempt <= 3 && !finished; attempt++) {
+            if (attempt > 0) {
+                await new Promise(resolve => setTimeout(resolve, this.streamRetryMs || 2000));
+            }
+            try {
+                finished = await this.readStream(payload, lastEventId, streamToken, (event) => {
+                    if (event.id) lastEventId = event.id;
+                    if (event.event === 'meta') streamToken = event.data.token;
+                    if (event.event === 'chunk') showChunk(event.data.text);
+                });
+            } catch (error) {
+                // Sem id não há o que retomar
+                if (!lastEventId || error.fatal) throw error;
+                console.warn('Stream interrompido, tentando retomar...', error);
+            }
+            if (!finished && !lastEventId) {
+                throw new Error('Stream encerrado sem resposta');
+            }
+        }
+        delete record.streaming;
+    }
+
+    async readStream(payload, lastEventId, streamToken, onEvent) {
+        // Lê eventos SSE (payload JSON) e retorna true quando o evento 'end' chega
+        const headers = { 'Content-Type': 'application/json' };
+        if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+        if (streamToken) headers['X-Stream-Token'] = streamToken;
+
         const resp = await fetch('/api/chat/stream', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: headers,
             body: JSON.stringify(payload)
         });
-        if (!resp.ok) throw new Error('Falha ao iniciar streaming');
+        if (!resp.ok) {
+            const error = new Error('Falha ao iniciar streaming');
+            error.fatal = resp.status < 500;
+            throw error;
+        }
+        return this.readEvents(resp, onEvent);
+    }
 
+    async readEvents(resp, onEvent) {
         const reader = resp.body.getReader();
         const decoder = new TextDecoder('utf-8');
         let buffer = '';
@@ -155,24 +295,171 @@ class ChatBot {
             const { value, done } = await reader.read();
             if (done) break;
             buffer += decoder.decode(value, { stream: true });
-            const parts = buffer.split('\n\n');
-            buffer = parts.pop();
-            for (const part of parts) {
-                if (!part.startsWith('data:') && !part.startsWith('event:')) continue;
-                if (part.startsWith('event: end')) {
-                    // fim do stream
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+            for (const frame of frames) {
+                const event = this.parseSSEFrame(frame);
+                if (!event) continue;
+                if (event.retry) this.streamRetryMs = event.retry;
+                if (event.data === undefined) continue;
+                onEvent(event);
+                if (event.event === 'end') return true;
+            }
+        }
+        return false;
+    }
+
+    parseSSEFrame(frame) {
+        // Campos do protocolo SSE; linhas iniciadas por ':' são heartbeats
+        const event = { event: 'message' };
+        let hasField = false;
+        for (const line of frame.split('\n')) {
+            if (!line || line.startsWith(':')) continue;
+            const index = line.indexOf(':');
+            const field = index === -1 ? line : line.slice(0, index);
+            const value = index === -1 ? '' : line.slice(index + 1).replace(/^ /, '');
+            hasField = true;
+            if (field === 'id') event.id = value;
+            else if (field === 'event') event.event = value;
+            else if (field === 'retry') event.retry = parseInt(value, 10);
+            else if (field === 'data') {
+                try {
+                    event.data = JSON.parse(value);
+                } catch (_) {
+                    event.data = { text: value };
+                }
+            }
+        }
+        return hasField ? event : null;
+    }
+    
+    connectSocket() {
+        // Uma conexão WebSocket por sessão do navegador; sem ela o chat usa HTTP/SSE
+        if (!('WebSocket' in window) || this.socketFailures >= 3) return;
+        const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${scheme}://${location.host}/api/chat/ws`);
+        this.socket = socket;
+        socket.addEventListener('open', () => {
+            socket.send(JSON.stringify({ type: 'hello', user_id: this.userId }));
+        });
+        socket.addEventListener('message', (event) => this.handleSocketMessage(event));
+        socket.addEventListener('close', () => {
+            const wasReady = this.socketReady;
+            this.socket = null;
+            this.socketReady = false;
+            for (const pending of this.socketPending.values()) {
+                // Depois do 'ack' a mensagem já foi gravada: retomar a resposta em vez de reenviá-la
+                if (pending.messageId) {
+                    this.resumeSocketReply(pending);
                     continue;
                 }
-                if (part.startsWith('data:')) {
-                    const text = part.slice(5).trimStart();
-                    streamSpan.textContent += text;
-                    if (this.autoScroll) this.scrollToBottom();
+                const error = new Error('Conexão WebSocket encerrada');
+                error.fallback = true;
+                pending.reject(error);
+            }
+            this.socketPending.clear();
+            // Falhas seguidas antes do 'ready' (ex.: servidor sem flask-sock): ficar no HTTP/SSE
+            this.socketFailures = wasReady ? 0 : this.socketFailures + 1;
+            setTimeout(() => this.connectSocket(), Math.min(30000, 1000 * 2 ** this.socketFailures));
+        });
+    }
+
+    handleSocketMessage(event) {
+        let data;
+        try {
+            data = JSON.parse(event.data);
+        } catch (_) {
+            return;
+        }
+        if (data.type === 'ready') {
+            this.socketReady = true;
+            this.socketFailures = 0;
+            return;
+        }
+        const pending = this.socketPending.get(data.id);
+        if (!pending) return;
+        if (data.type === 'ack') {
+            pending.messageId = data.message_id;
+            pending.token = data.token;
+            return;
+        }
+        if (data.seq) pending.lastSeq = data.seq;
+        if (data.type === 'chunk') pending.received += data.text;
+        if (pending.onEvent) pending.onEvent(data);
+        if (data.type === 'end' || data.type === 'history') {
+            this.socketPending.delete(data.id);
+            pending.resolve(data);
+        } else if (data.type === 'error') {
+            this.socketPending.delete(data.id);
+            const error = new Error(data.error);
+            error.fallback = false;
+            pending.reject(error);
+        }
+    }
+
+    async resumeSocketReply(pending) {
+        // Retoma por SSE (o stream do socket fica registrado com o id da mensagem);
+        // stream expirado: busca a resposta já salva no histórico
+        const deliver = (data) => {
+            if (data.type === 'chunk') pending.received += data.text;
+            if (pending.onEvent) pending.onEvent(data);
+        };
+        try {
+            const headers = { 'X-Stream-Token': pending.token };
+            if (pending.lastSeq) headers['Last-Event-ID'] = `${pending.messageId}:${pending.lastSeq}`;
+            const resp = await fetch(`/api/chat/stream/${pending.messageId}`, { headers: headers });
+            if (resp.ok) {
+                let end = null;
+                await this.readEvents(resp, (event) => {
+                    const data = { ...event.data, type: event.event };
+                    if (event.event === 'end') end = data;
+                    else deliver(data);
+                });
+                if (end) {
+                    pending.resolve(end);
+                    return;
                 }
             }
+            const page = await this.requestHistory(this.userId, pending.messageId);
+            const reply = ((page && page.history) || []).find(
+                row => !row.is_user && row.parent_message_id === pending.messageId);
+            if (!reply) throw new Error('Resposta ainda não disponível');
+            if (reply.message.startsWith(pending.received)) {
+                deliver({ type: 'chunk', text: reply.message.slice(pending.received.length) });
+            }
+            pending.resolve({ type: 'end', saved: true, message_id: reply.id });
+        } catch (error) {
+            error.fallback = false;
+            pending.reject(error);
         }
     }
+
+    socketRequest(payload, onEvent = null) {
+        // Envia uma requisição pela conexão da sessão; resolve no evento final ('end' ou 'history')
+        return new Promise((resolve, reject) => {
+            const id = 'c' + (++this.socketSeq);
+            this.socketPending.set(id, { resolve, reject, onEvent, messageId: null, token: null, lastSeq: 0, received: '' });
+            this.socket.send(JSON.stringify({ ...payload, id: id }));
+        });
+    }
     
     async sendToBackend(message) {
+        if (this.socketReady) {
+            try {
+                let text = '';
+                await this.socketRequest({
+                    type: 'send',
+                    message: message,
+                    use_gemini: this.useGeminiCheckbox.checked
+                }, (event) => {
+                    if (event.type === 'chunk') text += event.text;
+                });
+                return { response: text };
+            } catch (error) {
+                if (!error.fallback) throw error;
+                console.warn('WebSocket indisponível, usando HTTP...', error);
+            }
+        }
         const response = await fetch('/api/chat', {
             method: 'POST',
             headers: {
@@ -193,42 +480,77 @@ class ChatBot {
     }
     
     addMessage(content, sender) {
-        // Remover mensagem de boas-vindas se existir
+        this.appendRecord({
+            message: content,
+            is_user: sender === 'user',
+            created_at: new Date().toISOString()
+        });
+        
+        // Som de notificação
+        if (this.soundEnabled && sender === 'bot') {
+            this.playNotificationSound();
+        }
+    }
+    
+    removeWelcomeMessage() {
         const welcomeMessage = this.chatMessages.querySelector('.welcome-message');
         if (welcomeMessage) {
             welcomeMessage.remove();
         }
-        
-        // Criar elemento da mensagem
+    }
+    
+    createMessageElement(record) {
         const messageDiv = document.createElement('div');
-        messageDiv.className = `message ${sender}`;
+        messageDiv.className = `message ${record.is_user ? 'user' : 'bot'}`;
         
-        const timestamp = new Date().toLocaleTimeString('pt-BR', {
+        // created_at do SQLite vem em UTC sem fuso ("AAAA-MM-DD HH:MM:SS")
+        const raw = String(record.created_at || '');
+        const date = /[zZ]|[+-]\d\d:?\d\d$/.test(raw) ? new Date(raw) : new Date(raw.replace(' ', 'T') + 'Z');
+        const timestamp = (isNaN(date) ? new Date() : date).toLocaleTimeString('pt-BR', {
             hour: '2-digit',
             minute: '2-digit'
         });
         
-        const avatar = sender === 'user' ? 'U' : '🤖';
+        const avatar = record.is_user ? 'U' : '🤖';
+        const content = record.streaming
+            ? `<span class="stream-text">${this.escapeHtml(record.message)}</span>`
+            : this.formatMessage(record.message);
         
         messageDiv.innerHTML = `
             <div class="message-avatar">${avatar}</div>
             <div class="message-content">
-                ${this.formatMessage(content)}
+                ${content}
                 <div class="message-time">${timestamp}</div>
             </div>
         `;
-        
-        this.chatMessages.appendChild(messageDiv);
+        record.element = messageDiv;
+        return messageDiv;
+    }
+    
+    escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+    
+    appendRecord(record) {
+        // Nova mensagem no fim da conversa; retorna o elemento exibido
+        this.removeWelcomeMessage();
+        this.messages.push(record);
+        if (this.windowEnd < this.messages.length - 1) {
+            // Usuário está lendo mensagens antigas: pular para o fim
+            this.renderWindow(Math.max(0, this.messages.length - this.windowPage));
+        } else {
+            this.chatMessages.insertBefore(this.createMessageElement(record), this.bottomSentinel);
+            this.windowEnd = this.messages.length;
+            this.trimWindow('top');
+        }
         
         // Auto-scroll
-        if (this.autoScroll) {
+        if (this.autoScroll || record.is_user) {
             this.scrollToBottom();
         }
-        
-        // Som de notificação
-        if (this.soundEnabled && sender === 'bot') {
-            this.playNotificationSound();
-        }
+        return record.element;
     }
     
     formatMessage(content) {
@@ -341,34 +663,164 @@ class ChatBot {
     }
     
     async loadChatHistory() {
+        // Exibe primeiro o cache local e depois busca no servidor apenas as mensagens novas
         try {
-            const response = await fetch(`/api/history/${this.userId}`);
-            if (response.ok) {
-                const data = await response.json();
-                if (data.history && data.history.length > 0) {
-                    this.displayChatHistory(data.history);
-                }
+            const cached = await this.historyCache.load(this.userId);
+            if (cached.length > 0) {
+                this.lastSyncedId = cached[cached.length - 1].id;
+                this.displayChatHistory(cached);
             }
+            await this.fetchNewMessages(true);
         } catch (error) {
             console.error('Erro ao carregar histórico:', error);
         }
     }
     
+    async fetchNewMessages(display = false) {
+        // Pagina /api/history/<user_id>?after_id=N até alcançar o servidor
+        const userId = this.userId;
+        let hasMore = true;
+        while (hasMore) {
+            const data = await this.requestHistory(userId, this.lastSyncedId);
+            if (!data || userId !== this.userId) return;
+            if (data.latest_id < this.lastSyncedId) {
+                // Histórico apagado no servidor: o cache local não vale mais
+                await this.historyCache.clear(userId);
+                this.lastSyncedId = 0;
+                if (display) this.clearMessages();
+                continue;
+            }
+            const history = data.history || [];
+            if (history.length === 0) return;
+            await this.historyCache.put(userId, history);
+            this.lastSyncedId = history[history.length - 1].id;
+            if (display) this.displayChatHistory(history);
+            hasMore = data.has_more;
+        }
+    }
+    
+    async requestHistory(userId, afterId) {
+        // Página do histórico pela conexão WebSocket, se aberta, ou por HTTP
+        if (this.socketReady) {
+            try {
+                return await this.socketRequest({ type: 'history', after_id: afterId });
+            } catch (error) {
+                console.warn('Histórico via WebSocket falhou, usando HTTP...', error);
+            }
+        }
+        const response = await fetch(`/api/history/${encodeURIComponent(userId)}?after_id=${afterId}`);
+        return response.ok ? await response.json() : null;
+    }
+    
     displayChatHistory(history) {
         // Remover mensagem de boas-vindas
-        const welcomeMessage = this.chatMessages.querySelector('.welcome-message');
-        if (welcomeMessage) {
-            welcomeMessage.remove();
-        }
+        this.removeWelcomeMessage();
         
-        // Adicionar mensagens do histórico
-        history.forEach(msg => {
-            this.addMessage(msg.message, msg.is_user ? 'user' : 'bot');
-        });
+        // Apenas a última página de mensagens vai para o DOM
+        const atEnd = this.windowEnd === this.messages.length;
+        history.forEach(msg => this.messages.push({ ...msg }));
+        if (atEnd) {
+            this.renderWindow(Math.max(0, this.messages.length - this.windowPage));
+            this.scrollToBottom();
+        }
+    }
+    
+    setupVirtualList() {
+        // Janela de mensagens no DOM: páginas entram/saem conforme a rolagem
+        this.windowPage = 50;
+        this.windowMax = 150;
+        this.topSentinel = document.createElement('div');
+        this.bottomSentinel = document.createElement('div');
+        this.topSentinel.className = this.bottomSentinel.className = 'history-sentinel';
+        this.chatMessages.prepend(this.topSentinel);
+        this.chatMessages.append(this.bottomSentinel);
+        
+        if (!('IntersectionObserver' in window)) return;
+        const observer = new IntersectionObserver((entries) => {
+            entries.forEach(entry => {
+                if (!entry.isIntersecting) return;
+                if (entry.target === this.topSentinel) this.extendWindow('top');
+                else this.extendWindow('bottom');
+            });
+        }, { root: this.chatMessages, rootMargin: '200px 0px' });
+        observer.observe(this.topSentinel);
+        observer.observe(this.bottomSentinel);
+    }
+    
+    renderWindow(start) {
+        // Substitui o conteúdo do DOM pelas mensagens [start, start + windowPage)
+        this.chatMessages.querySelectorAll('.message').forEach(el => el.remove());
+        this.messages.forEach(record => { record.element = null; });
+        this.windowStart = start;
+        this.windowEnd = Math.min(this.messages.length, start + this.windowPage);
+        const fragment = document.createDocumentFragment();
+        for (let i = this.windowStart; i < this.windowEnd; i++) {
+            fragment.appendChild(this.createMessageElement(this.messages[i]));
+        }
+        this.chatMessages.insertBefore(fragment, this.bottomSentinel);
+    }
+    
+    extendWindow(side) {
+        const container = this.chatMessages;
+        if (side === 'top' && this.windowStart > 0) {
+            const start = Math.max(0, this.windowStart - this.windowPage);
+            const fragment = document.createDocumentFragment();
+            for (let i = start; i < this.windowStart; i++) {
+                fragment.appendChild(this.createMessageElement(this.messages[i]));
+            }
+            // Manter a posição visual ao inserir acima
+            const previousHeight = container.scrollHeight;
+            container.insertBefore(fragment, this.topSentinel.nextSibling);
+            this.adjustScroll(container.scrollHeight - previousHeight);
+            this.windowStart = start;
+            this.trimWindow('bottom');
+        } else if (side === 'bottom' && this.windowEnd < this.messages.length) {
+            const end = Math.min(this.messages.length, this.windowEnd + this.windowPage);
+            const fragment = document.createDocumentFragment();
+            for (let i = this.windowEnd; i < end; i++) {
+                fragment.appendChild(this.createMessageElement(this.messages[i]));
+            }
+            container.insertBefore(fragment, this.bottomSentinel);
+            this.windowEnd = end;
+            this.trimWindow('top');
+        }
+    }
+    
+    trimWindow(side) {
+        // Remove mensagens do lado oposto à rolagem quando a janela passa de windowMax
+        const container = this.chatMessages;
+        while (this.windowEnd - this.windowStart > this.windowMax) {
+            if (side === 'top') {
+                const record = this.messages[this.windowStart++];
+                const previousHeight = container.scrollHeight;
+                if (record.element) record.element.remove();
+                record.element = null;
+                this.adjustScroll(container.scrollHeight - previousHeight);
+            } else {
+                const record = this.messages[--this.windowEnd];
+                if (record.element) record.element.remove();
+                record.element = null;
+            }
+        }
+    }
+    
+    adjustScroll(delta) {
+        // Compensação instantânea (sem o scroll-behavior: smooth do CSS)
+        this.chatMessages.style.scrollBehavior = 'auto';
+        this.chatMessages.scrollTop += delta;
+        this.chatMessages.style.scrollBehavior = '';
+    }
+    
+    clearMessages() {
+        this.chatMessages.querySelectorAll('.message').forEach(el => el.remove());
+        this.messages = [];
+        this.windowStart = this.windowEnd = 0;
     }
     
     startNewChat() {
         // Limpar mensagens
+        this.messages = [];
+        this.windowStart = this.windowEnd = 0;
         this.chatMessages.innerHTML = `
             <div class="welcome-message">
                 <div class="welcome-content">
@@ -405,8 +857,18 @@ class ChatBot {
             });
         });
         
-        // Gerar novo ID de usuário
+        this.chatMessages.prepend(this.topSentinel);
+        this.chatMessages.append(this.bottomSentinel);
+        
+        // Gerar novo ID de usuário (o cache da conversa anterior não será mais lido)
+        this.historyCache.clear(this.userId);
         this.userId = this.generateUserId();
+        localStorage.setItem('chatbot_user_id', this.userId);
+        this.lastSyncedId = 0;
+        // A sessão WebSocket passa a usar (e manter o contexto de) o novo usuário
+        if (this.socketReady) {
+            this.socket.send(JSON.stringify({ type: 'hello', user_id: this.userId }));
+        }
         
         this.showNotification('Nova conversa iniciada!');
     }
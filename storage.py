@@ -0,0 +1,581 @@
+"""
+Interface de armazenamento do chatbot e backends disponíveis
+
+O ``DatabaseManager`` (SQLite) é a implementação padrão e ``ShardedStorage``
+(sharding.py) a distribui em vários arquivos. ``MemoryStorage`` serve para
+testes e benchmarks, e ``RemoteStorage`` é o ponto de extensão para um
+backend em rede (exercitado localmente com ``StorageServer``).
+"""
+import bisect
+import itertools
+import threading
+import xmlrpc.client
+from datetime import datetime
+from socketserver import ThreadingMixIn
+from typing import Dict, Iterator, List, Optional, Protocol, runtime_checkable
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+from database import DatabaseManager
+from usage import USAGE_FIELDS, build_usage_report, usage_rows, usage_values
+
+
+@runtime_checkable
+class StorageBackend(Protocol):
+    """Operações de armazenamento usadas pelo ChatBot e pela API"""
+
+    def init_database(self): ...
+
+    def test_connection(self) -> bool: ...
+
+    def create_or_update_user(self, user_data: Dict) -> bool: ...
+
+    def save_message(self, user_id: str, message: str, is_user: bool,
+                     parent_message_id: Optional[int] = None,
+                     usage: Optional[Dict] = None) -> Optional[int]: ...
+
+    def save_conversation_turns(self, turns: List[Dict]) -> List[Optional[tuple]]: ...
+
+    def get_user_history(self, user_id: str, limit: int = 50) -> List[Dict]: ...
+
+    def get_recent_messages(self, user_id: str, limit: int = 10) -> List[Dict]: ...
+
+    def get_user_stats(self, user_id: str) -> Dict: ...
+
+    def get_global_stats(self) -> Dict: ...
+
+    def get_messages_page(self, after_id: int = 0, limit: int = 10000,
+                          is_user: Optional[bool] = None,
+                          user_id: Optional[str] = None) -> List[tuple]: ...
+
+    def iter_messages(self, user_id: Optional[str] = None,
+                      batch_size: int = 1000) -> Iterator[List[Dict]]: ...
+
+    def insert_messages(self, rows: List[Dict], id_map: Optional[Dict[int, int]] = None) -> List[int]: ...
+
+    def replace_intent_stats(self, rows: List[tuple]) -> bool: ...
+
+    def get_intent_stats(self) -> List[Dict]: ...
+
+    def get_precomputed_answers(self) -> List[Dict]: ...
+
+    def save_precomputed_answer(self, prompt_key: str, prompt: str, response: str,
+                                model: Optional[str] = None) -> bool: ...
+
+    def delete_precomputed_answers(self, prompt_keys: List[str]) -> bool: ...
+
+    def register_response_templates(self, texts: List[str]) -> Dict[str, int]: ...
+
+    def compact_messages(self, batch_size: int = 5000, vacuum: bool = False) -> Dict: ...
+
+    def get_template_stats(self) -> Dict: ...
+
+    def get_usage_report(self, since: Optional[str] = None, group_by: str = 'user',
+                         limit: int = 20, order_by: str = 'tokens') -> Dict: ...
+
+    def clear_user_history(self, user_id: str) -> bool: ...
+
+    def get_system_config(self, config_key: str) -> Optional[str]: ...
+
+    def set_system_config(self, config_key: str, config_value: str) -> bool: ...
+
+    def get_all_system_config(self) -> Dict[str, Optional[str]]: ...
+
+    def get_system_config_version(self) -> Optional[tuple]: ...
+
+
+def _page_row_to_dict(row: tuple) -> Dict:
+    """Converte uma linha de get_messages_page no formato de iter_messages"""
+    message_id, user_id, message, is_user, created_at, parent_message_id = row
+    return {
+        'id': message_id,
+        'user_id': user_id,
+        'message': message,
+        'is_user': is_user,
+        'created_at': created_at,
+        'parent_message_id': parent_message_id
+    }
+
+
+class MemoryStorage:
+    """
+    Backend em memória (sem persistência), para testes e benchmarks
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.init_database()
+
+    def init_database(self):
+        """Cria as estruturas ausentes; como no SQLite, chamadas seguintes mantêm os dados"""
+        with self._lock:
+            if self._initialized:
+                return
+            self._initialized = True
+            self._users = {}
+            self._by_user = {}
+            self._all = []  # (id, user_id, linha) em ordem de id
+            self._intent_stats = []
+            self._precomputed = {}
+            self._templates = {}  # texto -> (id, o próprio texto, compartilhado pelas mensagens)
+            self._usage = []  # registros de message_usage (usage.py)
+            self._next_id = 1
+            self._config = {'gemini_api_key': None}
+            self._config_updated_at = {'gemini_api_key': None}
+
+    def test_connection(self) -> bool:
+        return True
+
+    def create_or_update_user(self, user_data: Dict) -> bool:
+        with self._lock:
+            self._users[user_data['user_id']] = {
+                'user_id': user_data['user_id'],
+                'username': user_data.get('username', ''),
+                'email': user_data.get('email', ''),
+                'updated_at': datetime.now().isoformat()
+            }
+        return True
+
+    def save_message(self, user_id: str, message: str, is_user: bool,
+                     parent_message_id: Optional[int] = None,
+                     usage: Optional[Dict] = None) -> Optional[int]:
+        with self._lock:
+            message_id = self._insert(user_id, message, is_user, parent_message_id)
+            if usage:
+                self._insert_usage(message_id, user_id, usage)
+            return message_id
+
+    def save_conversation_turns(self, turns: List[Dict]) -> List[Optional[tuple]]:
+        with self._lock:
+            ids = []
+            for turn in turns:
+                user_message_id = self._insert(turn['user_id'], turn['message'], True, None)
+                bot_message_id = self._insert(turn['user_id'], turn['response'], False, user_message_id)
+                if turn.get('usage'):
+                    self._insert_usage(bot_message_id, turn['user_id'], turn['usage'])
+                ids.append((user_message_id, bot_message_id))
+            return ids
+
+    def get_user_history(self, user_id: str, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            rows = self._by_user.get(user_id, [])[:limit]
+            return [dict(row) for row in rows]
+
+    def get_recent_messages(self, user_id: str, limit: int = 10) -> List[Dict]:
+        with self._lock:
+            rows = self._by_user.get(user_id, [])[-limit:] if limit > 0 else []
+            return [{k: row[k] for k in ('id', 'message', 'is_user', 'created_at')} for row in rows]
+
+    def get_user_stats(self, user_id: str) -> Dict:
+        with self._lock:
+            rows = self._by_user.get(user_id, [])
+            user_messages = sum(1 for row in rows if row['is_user'])
+            return {
+                'total_messages': len(rows),
+                'user_messages': user_messages,
+                'bot_messages': len(rows) - user_messages,
+                'first_message_date': rows[0]['created_at'] if rows else None
+            }
+
+    def get_global_stats(self) -> Dict:
+        with self._lock:
+            rows = [row for user_rows in self._by_user.values() for row in user_rows]
+            user_messages = sum(1 for row in rows if row['is_user'])
+            return {
+                'total_messages': len(rows),
+                'user_messages': user_messages,
+                'bot_messages': len(rows) - user_messages,
+                'active_users': sum(1 for user_rows in self._by_user.values() if user_rows),
+                'registered_users': len(self._users),
+                'size_bytes': 0
+            }
+
+    def get_messages_page(self, after_id: int = 0, limit: int = 10000,
+                          is_user: Optional[bool] = None,
+                          user_id: Optional[str] = None) -> List[tuple]:
+        with self._lock:
+            page = []
+            start = bisect.bisect_right(self._all, after_id, key=lambda entry: entry[0])
+            for message_id, owner, row in itertools.islice(self._all, start, None):
+                if (is_user is None or row['is_user'] == bool(is_user)) and user_id in (None, owner):
+                    page.append((message_id, owner, row['message'], row['is_user'],
+                                 row['created_at'], row['parent_message_id']))
+                    if len(page) >= limit:
+                        break
+            return page
+
+    def iter_messages(self, user_id: Optional[str] = None,
+                      batch_size: int = 1000) -> Iterator[List[Dict]]:
+        after_id = 0
+        while True:
+            page = self.get_messages_page(after_id, batch_size, None, user_id)
+            if not page:
+                return
+            yield [_page_row_to_dict(row) for row in page]
+            after_id = page[-1][0]
+
+    def insert_messages(self, rows: List[Dict], id_map: Optional[Dict[int, int]] = None) -> List[int]:
+        """Importação: mantém created_at e remapeia parent_message_id com ``id_map``"""
+        with self._lock:
+            ids = []
+            for row in rows:
+                parent_id = row.get('parent_message_id')
+                if id_map is not None:
+                    parent_id = id_map.get(parent_id)
+                new_id = self._insert(row['user_id'], row['message'], row['is_user'], parent_id,
+                                      row.get('created_at'))
+                ids.append(new_id)
+                if id_map is not None and row.get('id') is not None:
+                    id_map[row['id']] = new_id
+            return ids
+
+    def replace_intent_stats(self, rows: List[tuple]) -> bool:
+        updated_at = datetime.now().isoformat()
+        with self._lock:
+            self._intent_stats = [
+                {'day': day, 'intent': intent, 'messages': count, 'updated_at': updated_at}
+                for day, intent, count in sorted(rows)
+            ]
+        return True
+
+    def get_intent_stats(self) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._intent_stats]
+
+    def get_precomputed_answers(self) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._precomputed.values()]
+
+    def save_precomputed_answer(self, prompt_key: str, prompt: str, response: str,
+                                model: Optional[str] = None) -> bool:
+        with self._lock:
+            self._precomputed[prompt_key] = {
+                'prompt_key': prompt_key, 'prompt': prompt, 'response': response,
+                'model': model, 'updated_at': datetime.now().isoformat()
+            }
+        return True
+
+    def delete_precomputed_answers(self, prompt_keys: List[str]) -> bool:
+        with self._lock:
+            for key in prompt_keys:
+                self._precomputed.pop(key, None)
+        return True
+
+    def register_response_templates(self, texts: List[str]) -> Dict[str, int]:
+        with self._lock:
+            for text in texts:
+                self._templates.setdefault(text, (len(self._templates) + 1, text))
+            return {text: entry[0] for text, entry in self._templates.items()}
+
+    def compact_messages(self, batch_size: int = 5000, vacuum: bool = False) -> Dict:
+        """Faz as respostas iguais a uma resposta padrão apontarem para a mesma string"""
+        report = {'converted': 0, 'bytes_saved': 0, 'size_before': 0, 'size_after': 0}
+        with self._lock:
+            for _, _, row in self._all:
+                entry = self._templates.get(row['message']) if not row['is_user'] else None
+                if entry and row['message'] is not entry[1]:
+                    row['message'] = entry[1]
+                    report['converted'] += 1
+                    report['bytes_saved'] += len(entry[1].encode('utf-8'))
+        return report
+
+    def get_template_stats(self) -> Dict:
+        with self._lock:
+            interned, bytes_saved, pending = 0, 0, 0
+            for _, _, row in self._all:
+                entry = self._templates.get(row['message']) if not row['is_user'] else None
+                if entry and row['message'] is entry[1]:
+                    interned += 1
+                    bytes_saved += len(entry[1].encode('utf-8'))
+                elif entry:
+                    pending += 1
+            return {'templates': len(self._templates), 'interned_messages': interned,
+                    'bytes_saved': bytes_saved, 'pending_compaction': pending}
+
+    def get_usage_report(self, since: Optional[str] = None, group_by: str = 'user',
+                         limit: int = 20, order_by: str = 'tokens') -> Dict:
+        with self._lock:
+            records = [record for record in self._usage if record['created_at'] >= (since or '')]
+        return build_usage_report(usage_rows(records, group_by), group_by, limit, order_by, since)
+
+    def clear_user_history(self, user_id: str) -> bool:
+        # Uso das respostas apagado junto, como no DatabaseManager
+        with self._lock:
+            if self._by_user.pop(user_id, None):
+                self._all = [entry for entry in self._all if entry[1] != user_id]
+            self._usage = [record for record in self._usage if record['user_id'] != user_id]
+        return True
+
+    def get_system_config(self, config_key: str) -> Optional[str]:
+        with self._lock:
+            return self._config.get(config_key)
+
+    def set_system_config(self, config_key: str, config_value: str) -> bool:
+        with self._lock:
+            self._config[config_key] = config_value
+            self._config_updated_at[config_key] = datetime.now().isoformat()
+        return True
+
+    def get_all_system_config(self) -> Dict[str, Optional[str]]:
+        with self._lock:
+            return dict(self._config)
+
+    def get_system_config_version(self) -> Optional[tuple]:
+        with self._lock:
+            updated = [v for v in self._config_updated_at.values() if v]
+            return len(self._config), max(updated) if updated else None
+
+    def _insert(self, user_id, message, is_user, parent_message_id, created_at=None) -> int:
+        if not is_user and message in self._templates:
+            # Mesma string para todas as cópias de uma resposta padrão
+            message = self._templates[message][1]
+        row = {
+            'id': self._next_id,
+            'message': message,
+            'is_user': bool(is_user),
+            'created_at': created_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'parent_message_id': parent_message_id
+        }
+        self._next_id += 1
+        self._by_user.setdefault(user_id, []).append(row)
+        self._all.append((row['id'], user_id, row))
+        return row['id']
+
+    def _insert_usage(self, message_id: int, user_id: str, usage: Dict):
+        record = dict(zip(USAGE_FIELDS, usage_values(usage)))
+        # Em UTC, como o CURRENT_TIMESTAMP do SQLite (filtro ``since`` do relatório)
+        record.update(message_id=message_id, user_id=user_id,
+                      created_at=datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+        self._usage.append(record)
+
+
+class RemoteStorage:
+    """
+    Cliente de um backend de armazenamento em rede (XML-RPC).
+
+    Cada thread usa sua própria conexão, já que ``ServerProxy`` não é
+    seguro para uso concorrente.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._local = threading.local()
+
+    def _proxy(self):
+        proxy = getattr(self._local, 'proxy', None)
+        if proxy is None:
+            proxy = xmlrpc.client.ServerProxy(self.url, allow_none=True)
+            self._local.proxy = proxy
+        return proxy
+
+    def _call(self, method: str, *args, default=None):
+        try:
+            return getattr(self._proxy(), method)(*args)
+        except Exception as e:
+            print(f"Erro no armazenamento remoto ({method}): {e}")
+            return default
+
+    def init_database(self):
+        # O servidor inicializa o próprio backend; init_database não é exportado
+        return None
+
+    def test_connection(self) -> bool:
+        return bool(self._call('test_connection', default=False))
+
+    def create_or_update_user(self, user_data: Dict) -> bool:
+        return bool(self._call('create_or_update_user', user_data, default=False))
+
+    def save_message(self, user_id: str, message: str, is_user: bool,
+                     parent_message_id: Optional[int] = None,
+                     usage: Optional[Dict] = None) -> Optional[int]:
+        return self._call('save_message', user_id, message, is_user, parent_message_id, usage)
+
+    def save_conversation_turns(self, turns: List[Dict]) -> List[Optional[tuple]]:
+        ids = self._call('save_conversation_turns', turns, default=[None] * len(turns))
+        return [tuple(pair) if pair else None for pair in ids]
+
+    def get_user_history(self, user_id: str, limit: int = 50) -> List[Dict]:
+        return self._call('get_user_history', user_id, limit, default=[])
+
+    def get_recent_messages(self, user_id: str, limit: int = 10) -> List[Dict]:
+        return self._call('get_recent_messages', user_id, limit, default=[])
+
+    def get_user_stats(self, user_id: str) -> Dict:
+        return self._call('get_user_stats', user_id, default={})
+
+    def get_global_stats(self) -> Dict:
+        return self._call('get_global_stats', default={})
+
+    def get_messages_page(self, after_id: int = 0, limit: int = 10000,
+                          is_user: Optional[bool] = None,
+                          user_id: Optional[str] = None) -> List[tuple]:
+        # Sem valor padrão: numa varredura, uma falha não pode parecer o fim da tabela
+        return [tuple(row) for row in self._proxy().get_messages_page(after_id, limit, is_user, user_id)]
+
+    def iter_messages(self, user_id: Optional[str] = None,
+                      batch_size: int = 1000) -> Iterator[List[Dict]]:
+        """XML-RPC não tem streaming: percorre o servidor em páginas por id"""
+        after_id = 0
+        while True:
+            page = self.get_messages_page(after_id, batch_size, None, user_id)
+            if not page:
+                return
+            yield [_page_row_to_dict(row) for row in page]
+            after_id = page[-1][0]
+
+    def insert_messages(self, rows: List[Dict], id_map: Optional[Dict[int, int]] = None) -> List[int]:
+        """
+        O mapa de ids fica no cliente (XML-RPC só aceita chaves de texto): os
+        pais são remapeados aqui e o servidor recebe as linhas prontas
+        """
+        payload = []
+        for row in rows:
+            parent_id = row.get('parent_message_id')
+            if id_map is not None:
+                parent_id = id_map.get(parent_id)
+            payload.append({'user_id': row['user_id'], 'message': row['message'], 'is_user': bool(row['is_user']),
+                            'created_at': row.get('created_at'), 'parent_message_id': parent_id})
+        # Sem valor padrão: uma falha deve interromper a importação
+        ids = self._proxy().insert_messages(payload)
+        if id_map is not None:
+            for row, new_id in zip(rows, ids):
+                if row.get('id') is not None:
+                    id_map[row['id']] = new_id
+        return ids
+
+    def replace_intent_stats(self, rows: List[tuple]) -> bool:
+        return bool(self._call('replace_intent_stats', [list(row) for row in rows], default=False))
+
+    def get_intent_stats(self) -> List[Dict]:
+        return self._call('get_intent_stats', default=[])
+
+    def get_precomputed_answers(self) -> List[Dict]:
+        return self._call('get_precomputed_answers', default=[])
+
+    def save_precomputed_answer(self, prompt_key: str, prompt: str, response: str,
+                                model: Optional[str] = None) -> bool:
+        return bool(self._call('save_precomputed_answer', prompt_key, prompt, response, model, default=False))
+
+    def delete_precomputed_answers(self, prompt_keys: List[str]) -> bool:
+        return bool(self._call('delete_precomputed_answers', list(prompt_keys), default=False))
+
+    def register_response_templates(self, texts: List[str]) -> Dict[str, int]:
+        return self._call('register_response_templates', texts, default={})
+
+    def compact_messages(self, batch_size: int = 5000, vacuum: bool = False) -> Dict:
+        return self._call('compact_messages', batch_size, vacuum, default={})
+
+    def get_template_stats(self) -> Dict:
+        return self._call('get_template_stats', default={})
+
+    def get_usage_report(self, since: Optional[str] = None, group_by: str = 'user',
+                         limit: int = 20, order_by: str = 'tokens') -> Dict:
+        return self._call('get_usage_report', since, group_by, limit, order_by,
+                          default=build_usage_report([], group_by, limit, order_by, since))
+
+    def clear_user_history(self, user_id: str) -> bool:
+        return bool(self._call('clear_user_history', user_id, default=False))
+
+    def get_system_config(self, config_key: str) -> Optional[str]:
+        return self._call('get_system_config', config_key)
+
+    def set_system_config(self, config_key: str, config_value: str) -> bool:
+        return bool(self._call('set_system_config', config_key, config_value, default=False))
+
+    def get_all_system_config(self) -> Dict[str, Optional[str]]:
+        return self._call('get_all_system_config', default={})
+
+    def get_system_config_version(self) -> Optional[tuple]:
+        version = self._call('get_system_config_version')
+        return tuple(version) if version else None
+
+
+class _ThreadingXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class _QuietHandler(SimpleXMLRPCRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _ExportedBackend:
+    """
+    Métodos do StorageBackend expostos pelo servidor: sem init_database
+    (administração local) e iter_messages (gerador; o cliente pagina com
+    get_messages_page)
+    """
+
+    HIDDEN = frozenset({'init_database', 'iter_messages'})
+    METHODS = frozenset(name for name in dir(StorageBackend) if not name.startswith('_')) - HIDDEN
+
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+
+    def _dispatch(self, method: str, params: tuple):
+        if method not in self.METHODS:
+            raise Exception(f'method "{method}" is not supported')
+        return getattr(self.backend, method)(*params)
+
+
+class StorageServer:
+    """
+    Expõe um backend local via XML-RPC; usado como substituto de um
+    serviço de armazenamento em rede em desenvolvimento e benchmarks
+    """
+
+    def __init__(self, backend: StorageBackend, host: str = '127.0.0.1', port: int = 0):
+        self.backend = backend
+        self.server = _ThreadingXMLRPCServer((host, port), requestHandler=_QuietHandler,
+                                             allow_none=True, logRequests=False)
+        self.server.register_instance(_ExportedBackend(backend))
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> 'StorageServer':
+        self._thread = threading.Thread(target=self.server.serve_forever, name='storage-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def create_storage(cfg) -> StorageBackend:
+    """Cria o backend de armazenamento definido em STORAGE_BACKEND"""
+    backend = cfg.STORAGE_BACKEND
+    if backend == 'memory':
+        print("[ARMAZENAMENTO] Usando backend em memória (dados não serão persistidos)")
+        return MemoryStorage()
+    if backend == 'remote':
+        print(f"[ARMAZENAMENTO] Usando backend remoto em {cfg.STORAGE_REMOTE_URL}")
+        return RemoteStorage(cfg.STORAGE_REMOTE_URL)
+    if backend == 'sharded':
+        from sharding import ShardedStorage
+        print(f"[ARMAZENAMENTO] Usando {cfg.STORAGE_SHARDS} shards SQLite a partir de {cfg.DATABASE_PATH}")
+        return ShardedStorage(cfg.DATABASE_PATH, cfg.STORAGE_SHARDS, cfg.STORAGE_POOL_SIZE)
+    return DatabaseManager(cfg.DATABASE_PATH, pool_size=cfg.STORAGE_POOL_SIZE)
+
+
+if __name__ == "__main__":
+    # Substituto local de um serviço de armazenamento em rede
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor de armazenamento XML-RPC (desenvolvimento)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db', default=None, help="Arquivo SQLite (padrão: backend em memória)")
+    args = parser.parse_args()
+
+    backend = DatabaseManager(args.db) if args.db else MemoryStorage()
+    server = StorageServer(backend, args.host, args.port)
+    print(f"[ARMAZENAMENTO] Servidor em {server.url} - use STORAGE_BACKEND=remote STORAGE_REMOTE_URL={server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Conformidade e benchmark dos backends de armazenamento
+
+Executa as mesmas verificações em todos os backends e compara a vazão de
+save_message/get_recent_messages. Uso:
+
+    python storage_bench.py --backends sqlite sharded memory remote --messages 2000 --threads 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Adicionar o diretório atual ao path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from database import DatabaseManager
+from sharding import ShardedStorage
+from storage import MemoryStorage, RemoteStorage, StorageBackend, StorageServer
+
+
+def check_save_and_history(backend):
+    """Mensagens salvas voltam no histórico em ordem, com parent_message_id"""
+    first = backend.save_message('conf_user', 'olá', True)
+    second = backend.save_message('conf_user', 'oi!', False, parent_message_id=first)
+    assert isinstance(first, int) and isinstance(second, int) and second != first
+    history = backend.get_user_history('conf_user')
+    assert [m['message'] for m in history] == ['olá', 'oi!'], history
+    assert history[0]['is_user'] is True and history[1]['is_user'] is False
+    assert history[1]['parent_message_id'] == first
+    assert backend.get_user_history('conf_user', limit=1)[0]['message'] == 'olá'
+
+
+def check_recent_messages(backend):
+    """get_recent_messages retorna as últimas N em ordem cronológica"""
+    for i in range(5):
+        backend.save_message('conf_recent', f'msg {i}', i % 2 == 0)
+    recent = backend.get_recent_messages('conf_recent', 3)
+    assert [m['message'] for m in recent] == ['msg 2', 'msg 3', 'msg 4'], recent
+    assert set(recent[0]) >= {'id', 'message', 'is_user', 'created_at'}
+    assert backend.get_recent_messages('conf_unknown', 3) == []
+
+
+def check_conversation_turns(backend):
+    """save_conversation_turns salva pares na ordem e retorna os ids"""
+    ids = backend.save_conversation_turns([
+        {'user_id': 'conf_turns', 'message': 'a', 'response': 'A'},
+        {'user_id': 'conf_turns', 'message': 'b', 'response': 'B'}
+    ])
+    assert len(ids) == 2 and all(ids), ids
+    history = backend.get_user_history('conf_turns')
+    assert [m['message'] for m in history] == ['a', 'A', 'b', 'B']
+    assert history[1]['parent_message_id'] == ids[0][0]
+
+
+def check_stats_and_clear(backend):
+    """Estatísticas por usuário e limpeza do histórico"""
+    backend.save_message('conf_stats', 'pergunta', True)
+    backend.save_message('conf_stats', 'resposta', False)
+    stats = backend.get_user_stats('conf_stats')
+    assert stats['total_messages'] == 2 and stats['user_messages'] == 1 and stats['bot_messages'] == 1
+    assert backend.clear_user_history('conf_stats')
+    assert backend.get_user_history('conf_stats') == []
+
+
+def check_global_stats(backend):
+    """Estatísticas globais somam as mensagens de todos os usuários"""
+    before = backend.get_global_stats()['total_messages']
+    backend.save_message('conf_global_a', 'x', True)
+    backend.save_message('conf_global_b', 'y', False)
+    stats = backend.get_global_stats()
+    assert stats['total_messages'] == before + 2, stats
+    assert stats['user_messages'] + stats['bot_messages'] == stats['total_messages']
+
+
+def check_users_and_config(backend):
+    """Usuários e configurações do sistema"""
+    assert backend.test_connection()
+    assert backend.create_or_update_user({'user_id': 'conf_cfg', 'username': 'Ana', 'email': ''})
+    version = backend.get_system_config_version()
+    assert backend.set_system_config('conf_key', 'valor')
+    assert backend.get_system_config('conf_key') == 'valor'
+    assert backend.get_all_system_config()['conf_key'] == 'valor'
+    assert backend.get_system_config_version() != version
+    assert backend.get_system_config('conf_missing') is None
+
+
+def check_messages_page(backend):
+    """get_messages_page percorre todas as mensagens em ordem de id"""
+    for i in range(7):
+        backend.save_message(f'conf_page_{i % 3}', f'página {i}', i % 2 == 0)
+    seen, after_id = [], 0
+    while True:
+        page = backend.get_messages_page(after_id, 3)
+        if not page:
+            break
+        assert len(page) <= 3 and all(row[0] > after_id for row in page), page
+        seen.extend(page)
+        after_id = page[-1][0]
+    ids = [row[0] for row in seen]
+    assert ids == sorted(ids) and len(ids) == len(set(ids))
+    # Entre usuários a ordem dos ids pode variar (shards); por usuário é a de inserção
+    for user in range(3):
+        mine = [row[2] for row in seen if row[1] == f'conf_page_{user}']
+        assert mine == [f'página {i}' for i in range(user, 7, 3)], mine
+    users = [row for row in backend.get_messages_page(0, 100000, True) if row[1].startswith('conf_page_')]
+    assert len(users) == 4 and all(row[3] is True for row in users)
+
+
+def check_insert_messages(backend):
+    """insert_messages mantém created_at e remapeia os pais em lotes (importação)"""
+    user = f'conf_import_{time.time_ns()}'
+    rows = [
+        {'id': 900001, 'user_id': user, 'message': 'pergunta antiga', 'is_user': True,
+         'created_at': '2001-02-03 04:05:06', 'parent_message_id': None},
+        {'id': 900002, 'user_id': user, 'message': 'resposta antiga', 'is_user': False,
+         'created_at': '2001-02-03 04:05:07', 'parent_message_id': 900001}
+    ]
+    id_map = {}
+    first = backend.insert_messages(rows[:1], id_map)
+    second = backend.insert_messages(rows[1:], id_map)
+    assert id_map == {900001: first[0], 900002: second[0]}, id_map
+    history = backend.get_user_history(user)
+    assert [row['created_at'] for row in history] == ['2001-02-03 04:05:06', '2001-02-03 04:05:07'], history
+    exported = [row for rows in backend.iter_messages(user, 1) for row in rows]
+    assert [row['id'] for row in exported] == [first[0], second[0]], exported
+    assert exported[1]['parent_message_id'] == first[0], exported
+
+
+def check_intent_stats(backend):
+    """Distribuição de intenções é substituída por inteiro"""
+    assert backend.replace_intent_stats([('2024-01-01', 'greeting', 3), ('2024-01-01', 'default', 1)])
+    assert backend.replace_intent_stats([('2024-01-02', 'greeting', 5)])
+    stats = backend.get_intent_stats()
+    assert [(row['day'], row['intent'], row['messages']) for row in stats] == [('2024-01-02', 'greeting', 5)], stats
+
+
+def check_precomputed_answers(backend):
+    """Resposta pré-gerada é criada e substituída pela chave do prompt"""
+    assert backend.save_precomputed_answer('conf prompt', 'Conf prompt?', 'primeira', 'modelo-a')
+    assert backend.save_precomputed_answer('conf prompt', 'Conf prompt?', 'segunda', None)
+    rows = [row for row in backend.get_precomputed_answers() if row['prompt_key'] == 'conf prompt']
+    assert len(rows) == 1 and rows[0]['response'] == 'segunda' and rows[0]['updated_at'], rows
+    assert backend.delete_precomputed_answers(['conf prompt', 'prompt inexistente'])
+    assert not [row for row in backend.get_precomputed_answers() if row['prompt_key'] == 'conf prompt']
+
+
+def check_response_templates(backend):
+    """Resposta padrão é salva por referência e lida com o texto completo"""
+    text = 'Resposta padrão de conformidade'
+    # Cópia do texto salva antes do cadastro (a compactação deve convertê-la)
+    old_id = backend.save_message('conf_tpl', text[:-1] + text[-1], False)
+    backend.register_response_templates([text])
+    new_id = backend.save_message('conf_tpl', text, False)
+    backend.save_message('conf_tpl', text, True)
+    assert [row['message'] for row in backend.get_user_history('conf_tpl')] == [text] * 3
+    assert [row['message'] for row in backend.get_recent_messages('conf_tpl', 2)] == [text] * 2
+    page = backend.get_messages_page(0, 100000, False, 'conf_tpl')
+    assert [row[0] for row in page] == [old_id, new_id] and all(row[2] == text for row in page), page
+    before = backend.get_template_stats()
+    assert before['pending_compaction'] >= 1, before
+    assert backend.compact_messages()['converted'] >= 1
+    after = backend.get_template_stats()
+    assert after['pending_compaction'] == 0 and after['interned_messages'] >= 2, after
+    assert all(row['message'] == text for rows in backend.iter_messages('conf_tpl') for row in rows)
+
+
+def check_usage_report(backend):
+    """Uso de tokens é salvo com a mensagem, agregado por usuário e por origem e apagado com o histórico"""
+    user = f'conf_usage_{time.time_ns()}'
+    backend.save_message(user, 'resposta cara', False, None, {
+        'source': 'gemini', 'model': 'modelo-conf', 'prompt_tokens': 120, 'output_tokens': 30,
+        'latency_ms': 800.0, 'first_chunk_ms': 200.0
+    })
+    backend.save_conversation_turns([{
+        'user_id': user, 'message': 'pergunta', 'response': 'do cache',
+        'usage': {'source': 'response_cache', 'model': 'modelo-conf', 'latency_ms': 2.0}
+    }])
+    backend.save_message(user, 'sem uso registrado', False)
+    report = backend.get_usage_report(group_by='user', limit=100000)
+    group = next(group for group in report['groups'] if group['key'] == user)
+    assert group['messages'] == 2 and group['prompt_tokens'] == 120 and group['total_tokens'] == 150, group
+    assert group['cache_hits'] == 1 and group['avg_latency_ms'] == 401.0 and group['max_latency_ms'] == 800.0, group
+    assert group['avg_first_chunk_ms'] == 200.0, group
+    sources = {group['key'] for group in backend.get_usage_report(group_by='source')['groups']}
+    assert {'gemini', 'response_cache'} <= sources, sources
+    assert backend.get_usage_report(since='9999-01-01')['totals']['messages'] == 0
+    # Limpar o histórico apaga também o uso do usuário
+    backend.clear_user_history(user)
+    report = backend.get_usage_report(group_by='user', limit=100000)
+    assert all(group['key'] != user for group in report['groups']), report
+
+
+CHECKS = [
+    check_save_and_history,
+    check_recent_messages,
+    check_conversation_turns,
+    check_stats_and_clear,
+    check_global_stats,
+    check_users_and_config,
+    check_messages_page,
+    check_insert_messages,
+    check_intent_stats,
+    check_precomputed_answers,
+    check_response_templates,
+    check_usage_report
+]
+
+
+def run_conformance(name, backend):
+    """Executa todas as verificações; retorna o número de falhas"""
+    failures = 0
+    if not isinstance(backend, StorageBackend):
+        print(f"❌ {name}: não implementa StorageBackend")
+        failures += 1
+    for check in CHECKS:
+        try:
+            check(backend)
+            print(f"✅ {name}: {check.__doc__}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {name}: {check.__doc__} ({type(e).__name__}: {e})")
+    return failures
+
+
+def run_benchmark(name, backend, messages, users, reads, threads=1):
+    """Mede a vazão de escrita e leitura de um backend"""
+    def write(offset):
+        for i in range(offset, messages, threads):
+            backend.save_message(f'bench_{i % users}', f'mensagem de benchmark {i}', i % 2 == 0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(write, range(threads)))
+    write_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(reads):
+        backend.get_recent_messages(f'bench_{i % users}', 6)
+    read_elapsed = time.perf_counter() - started
+
+    print(f"{name:<12} save_message: {messages / write_elapsed:>10.0f} ops/s   "
+          f"get_recent_messages: {reads / read_elapsed:>10.0f} ops/s")
+
+
+def build_backends(names, workdir):
+    """Cria os backends pedidos; retorna [(nome, backend)] e servidores a encerrar"""
+    backends, servers = [], []
+    for name in names:
+        if name == 'sqlite':
+            backends.append((name, DatabaseManager(os.path.join(workdir, 'bench.db'))))
+        elif name == 'sqlite-pool':
+            backends.append((name, DatabaseManager(os.path.join(workdir, 'bench-pool.db'), pool_size=4)))
+        elif name == 'sharded':
+            backends.append((name, ShardedStorage(os.path.join(workdir, 'bench-sharded.db'), 4)))
+        elif name == 'memory':
+            backends.append((name, MemoryStorage()))
+        elif name == 'remote':
+            server = StorageServer(MemoryStorage()).start()
+            servers.append(server)
+            backends.append((name, RemoteStorage(server.url)))
+        else:
+            raise SystemExit(f"Backend desconhecido: {name}")
+    return backends, servers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['sqlite', 'sqlite-pool', 'sharded', 'memory', 'remote'])
+    parser.add_argument('--threads', type=int, default=1, help="Threads escrevendo em paralelo no benchmark")
+    parser.add_argument('--messages', type=int, default=2000, help="Mensagens gravadas no benchmark")
+    parser.add_argument('--reads', type=int, default=2000, help="Leituras no benchmark")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--skip-benchmark', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        backends, servers = build_backends(args.backends, workdir)
+        try:
+            print("🔍 Conformidade")
+            print("=" * 50)
+            failures = sum(run_conformance(name, backend) for name, backend in backends)
+
+            if not args.skip_benchmark:
+                print("\n⏱️ Benchmark")
+                print("=" * 50)
+                for name, backend in backends:
+                    run_benchmark(name, backend, args.messages, args.users, args.reads, args.threads)
+        finally:
+            for server in servers:
+                server.stop()
+
+    print(f"\nResultado: {'todas as verificações passaram' if not failures else f'{failures} falha(s)'}")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,219 @@
+"""
+Registro de streams em andamento para retomada de respostas em streaming
+
+Os ids dos streams são sequenciais (id da mensagem do usuário): a retomada
+exige também o token do stream, enviado só a quem o iniciou (evento 'meta'
+ou 'ack' do WebSocket) e devolvido no header ``X-Stream-Token``.
+"""
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterator, Optional
+
+from sse import EventWriter, format_comment, format_event, make_event_id
+
+STREAM_TOKEN_HEADER = 'X-Stream-Token'
+
+
+class ChatStream:
+    """
+    Resposta em streaming de uma mensagem do usuário.
+
+    Guarda os eventos já gerados para que clientes (re)conectados recebam
+    o prefixo e depois acompanhem o restante em tempo real. Acima de
+    ``max_events`` eventos guardados, os 'chunk' consecutivos são fundidos
+    em um só (com o fim do texto de cada seq, para retomar no meio dele).
+    """
+
+    def __init__(self, stream_id, max_events: int = 512):
+        self.stream_id = stream_id
+        self.token = secrets.token_urlsafe(16)
+        self.max_events = max(max_events, 2)
+        # (primeiro seq, último seq, evento formatado, fins do texto por seq ou None)
+        self.frames = []
+        self.done = False
+        self.updated_at = time.monotonic()
+        self._cond = threading.Condition()
+
+    def owned_by(self, token: Optional[str]) -> bool:
+        """True se ``token`` é o token deste stream (comparação em tempo constante)"""
+        return bool(token) and hmac.compare_digest(self.token, token)
+
+    def append(self, seq: int, frame: str):
+        with self._cond:
+            self.frames.append((seq, seq, frame, None))
+            if len(self.frames) > self.max_events:
+                self._coalesce()
+            self.updated_at = time.monotonic()
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.done = True
+            self.updated_at = time.monotonic()
+            self._cond.notify_all()
+
+    def _coalesce(self):
+        """Funde cada sequência de eventos 'chunk' consecutivos em um único evento"""
+        merged, run = [], []
+
+        def flush():
+            if len(run) == 1:
+                merged.append(run[0][0])
+            elif run:
+                text, ends = '', []
+                for entry, chunk in run:
+                    ends.extend(len(text) + end for end in (entry[3] or [len(chunk)]))
+                    text += chunk
+                last = run[-1][0][1]
+                merged.append((run[0][0][0], last, self._chunk_frame(text, last), ends))
+            run.clear()
+
+        for entry in self.frames:
+            text = _chunk_text(entry[2])
+            if not text or (run and run[-1][0][1] + 1 != entry[0]):
+                flush()
+            if text:
+                run.append((entry, text))
+            else:
+                merged.append(entry)
+        flush()
+        self.frames = merged
+
+    def _chunk_frame(self, text: str, seq: int) -> str:
+        return format_event({'text': text}, event='chunk', event_id=make_event_id(self.stream_id, seq))
+
+    def _pending(self, after_seq: int):
+        """Eventos com seq > after_seq como (seq, evento); corta um 'chunk' fundido no ponto certo"""
+        pending = []
+        for first, last, frame, ends in self.frames:
+            if last <= after_seq:
+                continue
+            if ends is not None and first <= after_seq:
+                frame = self._chunk_frame(_chunk_text(frame)[ends[after_seq - first]:], last)
+            pending.append((last, frame))
+        return pending
+
+    def follow(self, after_seq: int = 0, heartbeat_interval: float = 15.0,
+               coalesce: bool = False) -> Iterator[str]:
+        """
+        Produz os eventos após ``after_seq`` e acompanha o stream até o fim.
+
+        Com ``coalesce`` o prefixo já gerado é enviado como um único evento
+        'chunk'. Se nada acontecer em ``heartbeat_interval`` segundos um
+        comentário de keep-alive é enviado.
+        """
+        if coalesce:
+            with self._cond:
+                frames = self._pending(after_seq)
+            chunks = [(seq, frame) for seq, frame in frames if _chunk_text(frame)]
+            if chunks:
+                last_seq = chunks[-1][0]
+                for seq, frame in frames:
+                    if seq < last_seq and not _chunk_text(frame):
+                        yield frame
+                prefix = ''.join(_chunk_text(frame) for _, frame in chunks)
+                yield self._chunk_frame(prefix, last_seq)
+                after_seq = last_seq
+
+        while True:
+            with self._cond:
+                pending = self._pending(after_seq)
+                if not pending and not self.done:
+                    self._cond.wait(timeout=heartbeat_interval)
+                    pending = self._pending(after_seq)
+                done = self.done
+
+            if not pending:
+                if done:
+                    return
+                yield format_comment()
+                continue
+
+            for seq, frame in pending:
+                yield frame
+            after_seq = pending[-1][0]
+
+
+class StreamRegistry:
+    """
+    Registro limitado de streams indexados por ``user_message_id``.
+
+    A geração roda em uma thread própria, desacoplada da conexão do
+    cliente: uma desconexão não interrompe a chamada ao Gemini e a resposta
+    final é salva uma única vez pelo produtor.
+    """
+
+    def __init__(self, max_streams: int = 256, ttl: float = 120.0, max_events: int = 512):
+        self.max_streams = max_streams
+        self.ttl = ttl
+        self.max_events = max_events
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, stream_id, producer: Callable[[EventWriter], None],
+              flush_bytes: int = 0) -> ChatStream:
+        """Registra um stream e executa ``producer(writer)`` em segundo plano"""
+        stream = self.register(stream_id)
+        writer = EventWriter(stream_id, stream, flush_bytes)
+
+        def run():
+            try:
+                producer(writer)
+            except Exception as e:
+                print(f"[STREAM] Erro no stream {stream_id}: {e}")
+                writer.flush()
+                writer.event('error', {'error': str(e)})
+            finally:
+                writer.close()
+
+        threading.Thread(target=run, name=f'stream-{stream_id}', daemon=True).start()
+        return stream
+
+    def register(self, stream_id) -> ChatStream:
+        """Registra um stream alimentado por quem o chamou (ex.: sessões WebSocket)"""
+        stream = ChatStream(stream_id, self.max_events)
+        with self._lock:
+            self._streams[str(stream_id)] = stream
+            self._evict()
+        return stream
+
+    def get(self, stream_id, token: Optional[str]) -> Optional[ChatStream]:
+        """Stream registrado, se ``token`` for o dele (None se expirado, desconhecido ou de outro cliente)"""
+        with self._lock:
+            self._evict()
+            stream = self._streams.get(str(stream_id))
+        return stream if stream is not None and stream.owned_by(token) else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = sum(1 for s in self._streams.values() if not s.done)
+            return {'streams': len(self._streams), 'active': active}
+
+    def _evict(self):
+        """
+        Remove streams concluídos expirados ou excedentes; se ainda houver
+        streams demais, remove os ativos mais antigos (a geração continua e
+        a resposta é salva, só a retomada deixa de ser possível)
+        """
+        now = time.monotonic()
+        finished = [k for k, s in self._streams.items() if s.done]
+        for key in finished:
+            if now - self._streams[key].updated_at > self.ttl:
+                del self._streams[key]
+        finished = [k for k in finished if k in self._streams]
+        while len(self._streams) > self.max_streams and finished:
+            del self._streams[finished.pop(0)]
+        while len(self._streams) > self.max_streams:
+            key, _ = self._streams.popitem(last=False)
+            print(f"[STREAM] Limite de streams atingido - stream ativo {key} sem retomada")
+
+def _chunk_text(frame: str) -> str:
+    """Extrai o texto de um evento 'chunk' formatado (vazio para outros eventos)"""
+    if '\nevent: chunk\n' not in frame:
+        return ''
+    data = frame.split('\ndata: ', 1)[1]
+    return json.loads(data)['text']
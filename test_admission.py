@@ -0,0 +1,109 @@
+"""
+Testes do controle de admissão (fila, prazo, limite por usuário e liberação das vagas)
+
+Uso:
+    python -m pytest -q test_admission.py
+"""
+import threading
+import time
+
+from admission import AdmissionController
+from streams import StreamRegistry
+
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condição não atingida'
+        time.sleep(0.005)
+
+
+def acquire_in_thread(controller, user_id, results):
+    thread = threading.Thread(target=lambda: results.append((user_id, controller.acquire(user_id))))
+    thread.start()
+    return thread
+
+
+def test_queue_full_is_rejected_immediately():
+    controller = AdmissionController('t', max_in_flight=1, max_queue=1, queue_timeout=5, max_per_user=5)
+    ticket = controller.acquire('a')
+    results = []
+    waiter = acquire_in_thread(controller, 'b', results)
+    wait_for(lambda: controller.stats()['waiting'] == 1)
+
+    started = time.monotonic()
+    assert controller.acquire('c') is None
+    assert time.monotonic() - started < 0.5
+
+    ticket.release()
+    waiter.join()
+    assert results[0][1] is not None
+    assert controller.stats()['rejected'] == 1
+
+
+def test_queue_timeout():
+    controller = AdmissionController('t', max_in_flight=1, max_queue=4, queue_timeout=0.05)
+    ticket = controller.acquire('a')
+    assert controller.acquire('b') is None
+    stats = controller.stats()
+    assert (stats['queued'], stats['rejected'], stats['waiting']) == (1, 1, 0)
+    ticket.release()
+    assert controller.acquire('b') is not None
+
+
+def test_per_user_cap_on_slots_and_queue():
+    controller = AdmissionController('t', max_in_flight=4, max_queue=8, queue_timeout=5, max_per_user=1)
+    ticket = controller.acquire('a')
+    results = []
+    waiter = acquire_in_thread(controller, 'a', results)
+    wait_for(lambda: controller.stats()['waiting'] == 1)
+
+    # 'a' já ocupa sua vaga e sua posição na fila: não monopoliza o resto
+    assert controller.acquire('a') is None
+    assert controller.acquire('b') is not None
+
+    ticket.release()
+    waiter.join()
+    assert results[0][1] is not None
+    assert controller.stats()['in_flight'] == 2
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    controller = AdmissionController('t', max_in_flight=1, max_queue=8, queue_timeout=5, max_per_user=1)
+    ticket = controller.acquire('a')
+    results, threads = [], []
+    for user_id in ('b', 'c', 'd'):
+        threads.append(acquire_in_thread(controller, user_id, results))
+        wait_for(lambda: controller.stats()['waiting'] == len(threads))
+
+    for expected in ('b', 'c', 'd'):
+        ticket.release()
+        wait_for(lambda: len(results) == ('b', 'c', 'd').index(expected) + 1)
+        user_id, ticket = results[-1]
+        assert user_id == expected and ticket is not None
+    ticket.release()
+    for thread in threads:
+        thread.join()
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_slot_released_when_producer_fails():
+    controller = AdmissionController('t', max_in_flight=1, max_queue=0)
+    registry = StreamRegistry()
+    ticket = controller.acquire('a')
+
+    def producer(writer):
+        try:
+            raise RuntimeError('falha no Gemini')
+        finally:
+            ticket.release()
+
+    stream = registry.start(1, producer)
+    frames = list(stream.follow(heartbeat_interval=1))
+    assert 'event: error' in frames[-1]
+    assert controller.stats()['in_flight'] == 0
+    # Liberar de novo não devolve uma vaga a mais
+    ticket.release()
+    assert controller.stats()['in_flight'] == 0
+    assert controller.acquire('b') is not None
+    assert controller.acquire('c') is None
@@ -0,0 +1,119 @@
+"""
+Testes do FAQ local (ranking BM25, cobertura dos termos e recarga incremental)
+
+Uso:
+    python -m pytest -q test_faq.py
+"""
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from faq import BENCH_QUERIES, FaqEngine, FaqIndex, is_match, stem, tokenize
+
+ENTRIES = [
+    {'id': 'limpar', 'question': 'Como apago o histórico da conversa?',
+     'alternatives': ['limpar o histórico'], 'answer': 'Use a lixeira.'},
+    {'id': 'exportar', 'question': 'Como exporto meu histórico de mensagens?',
+     'alternatives': ['baixar minhas conversas'], 'answer': 'Use /export.'},
+    {'id': 'tema', 'question': 'Tem tema escuro?', 'keywords': ['modo', 'noturno'],
+     'answer': 'Sim, no menu.'}
+]
+
+
+def write_entries(path, entries):
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def make_cfg(path, **overrides):
+    return SimpleNamespace(**dict({'FAQ_ENABLED': True, 'FAQ_PATH': str(path), 'FAQ_THRESHOLD': 0.5,
+                                   'FAQ_RELOAD_INTERVAL': 0}, **overrides))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / 'faq.jsonl'
+    write_entries(path, ENTRIES)
+    return FaqEngine(make_cfg(path))
+
+
+def test_tokenize_drops_stopwords_accents_and_plurals():
+    assert tokenize('Como apago o Histórico das conversas?') == tokenize('apagar historico conversa')
+    assert stem('mensagens') == stem('mensagem')
+
+
+def test_index_ranks_by_bm25():
+    index = FaqIndex()
+    index.add_document('a', 'limpar histórico')
+    index.add_document('b', 'exportar histórico')
+    index.add_document('c', 'tema escuro')
+    results = index.search('limpar o histórico')
+    assert [doc_id for doc_id, _, _ in results] == ['a', 'b']
+    doc_id, score, confidence = results[0]
+    assert confidence == pytest.approx(1.0)
+    assert score > results[1][1]
+    # Remover um documento atualiza postings e comprimento médio
+    index.remove_document('a')
+    assert len(index) == 2
+    assert tokenize('limpar')[0] not in index.postings
+    assert [doc_id for doc_id, _, _ in index.search('limpar o histórico')] == ['b']
+
+
+def test_search_returns_one_result_per_entry(engine):
+    results = engine.search('como limpar o histórico da conversa', limit=3)
+    assert results[0]['id'] == 'limpar'
+    assert [result['id'] for result in results].count('limpar') == 1
+    assert results[0]['missing'] == []
+
+
+def test_lookup_matches_alternatives_and_keywords(engine):
+    assert engine.lookup('quero baixar as minhas conversas')['id'] == 'exportar'
+    assert engine.lookup('tem modo noturno?')['id'] == 'tema'
+    assert engine.answer('como apago o histórico?') == 'Use a lixeira.'
+
+
+def test_near_miss_is_rejected_by_missing_terms(engine):
+    # Bem pontuada, mas "navegador" não existe na entrada: segue para o Gemini
+    result = engine.search('como limpar o histórico do navegador?', limit=1)[0]
+    assert result['id'] == 'limpar'
+    assert result['missing'] == [stem('navegador')]
+    assert not is_match(result, 0.0)
+    assert engine.lookup('como limpar o histórico do navegador?') is None
+    assert engine.lookup('qual a capital da frança?') is None
+    assert engine.get_stats()['below_threshold'] == 1
+
+
+def test_threshold(engine):
+    result = engine.search('apago histórico conversa', limit=1)[0]
+    assert is_match(result, result['confidence'])
+    assert not is_match(result, result['confidence'] + 0.01)
+
+
+def test_disabled_engine_does_not_answer(tmp_path):
+    path = tmp_path / 'faq.jsonl'
+    write_entries(path, ENTRIES)
+    assert FaqEngine(make_cfg(path, FAQ_ENABLED=False)).lookup('limpar o histórico') is None
+
+
+def test_reload_is_incremental(engine, tmp_path):
+    path = tmp_path / 'faq.jsonl'
+    changed = [dict(ENTRIES[0], answer='Use o ícone de lixeira.'), ENTRIES[2],
+               {'id': 'celular', 'question': 'Funciona no celular?', 'answer': 'Sim.'}]
+    write_entries(path, changed)
+    os.utime(path, (0, os.path.getmtime(path) + 1))
+    assert engine.reload() == {'added': 1, 'updated': 1, 'removed': 1}
+    assert engine.answer('limpar o histórico') == 'Use o ícone de lixeira.'
+    assert engine.lookup('baixar minhas conversas') is None
+    assert engine.lookup('funciona no celular?')['id'] == 'celular'
+    assert engine.reload() == {'added': 0, 'updated': 0, 'removed': 0}
+
+
+def test_bundled_faq_bench_queries():
+    cfg = make_cfg('faq.jsonl', FAQ_RELOAD_INTERVAL=30)
+    engine = FaqEngine(cfg)
+    for message, expected in BENCH_QUERIES:
+        match = engine.lookup(message)
+        assert (match['id'] if match else None) == expected, message
@@ -0,0 +1,100 @@
+"""
+Testes do hedging do Gemini (requisição extra, prazo máximo, respostas atrasadas e tokens cobrados)
+
+Uso:
+    python -m pytest -q test_hedging.py
+"""
+import threading
+import time
+
+import pytest
+
+from chatbot import ChatBot
+from storage import MemoryStorage
+
+
+class SlowGemini:
+    """Integração falsa: a n-ésima chamada demora ``delays[n]`` segundos"""
+
+    def __init__(self, *delays: float):
+        self.delays = list(delays)
+        self.calls = 0
+        self.finished = threading.Semaphore(0)
+        self._lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate_response(self, message, context=None):
+        with self._lock:
+            number = self.calls
+            self.calls += 1
+        time.sleep(self.delays[min(number, len(self.delays) - 1)])
+        self.finished.release()
+        return {'success': True, 'response': f'resposta {number}', 'model': 'falso',
+                'prompt_tokens': 10 * (number + 1), 'output_tokens': number + 1, 'latency_ms': 1.0}
+
+    def wait_finished(self, count: int):
+        for _ in range(count):
+            assert self.finished.acquire(timeout=2), 'chamada ao Gemini não terminou'
+
+
+@pytest.fixture
+def bot():
+    chatbot = ChatBot(MemoryStorage())
+    yield chatbot
+    chatbot._gemini_executor.shutdown(wait=True)
+
+
+def ask(bot, message='Qual é a maior montanha do mundo?', **kwargs):
+    usage = {}
+    response = bot._get_gemini_response(message, 'u1', usage=usage, **kwargs)
+    return response, usage
+
+
+def test_hedge_fires_and_faster_request_wins(bot):
+    bot.gemini_integration = SlowGemini(0.5, 0.01)
+    response, usage = ask(bot, hedge_delay=0.05, deadline=2.0)
+
+    assert response == 'resposta 1'
+    stats = bot.get_latency_stats()
+    assert (stats['hedged'], stats['hedge_wins'], stats['timeouts']) == (1, 1, 0)
+    assert (usage['source'], usage['prompt_tokens'], usage['output_tokens']) == ('gemini', 20, 2)
+
+    # A requisição perdedora também é cobrada: seus tokens vão para a próxima resposta
+    bot.gemini_integration.wait_finished(2)
+    time.sleep(0.05)
+    assert bot.get_latency_stats()['carried_tokens'] == 11
+    bot.gemini_integration.delays = [0.0]
+    _, usage = ask(bot, 'Outra pergunta qualquer', hedge_delay=0, deadline=2.0)
+    assert (usage['prompt_tokens'], usage['output_tokens']) == (30 + 10, 3 + 1)
+    assert bot.get_latency_stats()['carried_tokens'] == 0
+
+
+def test_no_hedge_when_first_request_is_fast(bot):
+    bot.gemini_integration = SlowGemini(0.0)
+    response, usage = ask(bot, hedge_delay=0.2, deadline=2.0)
+    assert response == 'resposta 0'
+    assert bot.gemini_integration.calls == 1
+    assert bot.get_latency_stats()['hedged'] == 0
+
+
+def test_deadline_returns_default_and_late_reply_is_served_next(bot):
+    bot.gemini_integration = SlowGemini(0.3)
+    started = time.monotonic()
+    response, usage = ask(bot, hedge_delay=0, deadline=0.05)
+
+    assert time.monotonic() - started < 0.25
+    assert response in [text for texts in bot.responses.values() for text in texts]
+    assert usage['source'] == 'timeout'
+    assert bot.get_latency_stats()['timeouts'] == 1
+
+    # A resposta atrasada fica guardada e responde a mesma pergunta sem nova chamada
+    bot.gemini_integration.wait_finished(1)
+    time.sleep(0.05)
+    assert bot.get_latency_stats()['late_cached'] == 1
+    response, usage = ask(bot, '  qual é a maior MONTANHA do mundo? ', hedge_delay=0, deadline=0.05)
+    assert response == 'resposta 0'
+    assert bot.gemini_integration.calls == 1
+    assert (usage['source'], usage['prompt_tokens'], usage['output_tokens']) == ('late', 10, 1)
+    assert bot.get_latency_stats()['late_hits'] == 1
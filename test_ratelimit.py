@@ -0,0 +1,97 @@
+"""
+Testes do limitador de requisições (janela deslizante, Retry-After e regras por rota)
+
+Uso:
+    python -m pytest -q test_ratelimit.py
+"""
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask, jsonify
+
+import ratelimit
+from ratelimit import RateLimiter, ShardedCounters, _evaluate, parse_limit, parse_routes
+
+WINDOW = 60.0
+LIMIT = 10
+CURRENT = 100
+NOW = CURRENT * WINDOW + 15  # 25% da janela atual já decorrida
+
+
+def test_evaluate_previous_window_decays():
+    # 8 * 0.75 + 3 = 9: cabe mais uma e não sobra nenhuma
+    assert _evaluate(8, 3, NOW, CURRENT, WINDOW, LIMIT) == (True, 0, 45.0)
+
+
+def test_evaluate_waits_for_previous_window_to_decay():
+    # 8 * 0.75 + 4 = 10: falta 1 requisição, que a janela anterior libera em 1/8 da janela
+    allowed, remaining, reset = _evaluate(8, 4, NOW, CURRENT, WINDOW, LIMIT)
+    assert (allowed, remaining, reset) == (False, 0, 7.5)
+    assert _evaluate(8, 4, NOW + reset, CURRENT, WINDOW, LIMIT)[0]
+
+
+def test_evaluate_full_current_window_waits_for_next_window():
+    assert _evaluate(0, LIMIT, NOW, CURRENT, WINDOW, LIMIT) == (False, 0, 45.0)
+
+
+def test_evaluate_empty_windows():
+    assert _evaluate(0, 0, NOW, CURRENT, WINDOW, LIMIT) == (True, LIMIT - 1, 45.0)
+
+
+def test_sharded_counters_carry_previous_window():
+    counters = ShardedCounters(shards=4)
+    previous = NOW - WINDOW
+    for _ in range(4):
+        assert counters.hit('k', 4, WINDOW, now=previous)[0]
+    assert not counters.hit('k', 4, WINDOW, now=previous)[0]
+    # 4 * 0.75 = 3: uma vaga na janela nova, depois 15 s até a anterior decair
+    assert counters.hit('k', 4, WINDOW, now=NOW)[0]
+    assert counters.hit('k', 4, WINDOW, now=NOW) == (False, 0, 15.0)
+    assert counters.hit('k', 4, WINDOW, now=NOW + 15)[0]
+
+
+def test_parse_limit():
+    assert parse_limit('20/60') == (20, 60.0)
+    assert parse_limit(' 5 / 1.5 ') == (5, 1.5)
+    for spec in ('', '20', '0/60', '20/0', 'x/60', '20/-1'):
+        assert parse_limit(spec) is None
+
+
+def test_parse_routes_skips_invalid_entries():
+    spec = '/api/chat=20/60; /api/chat/stream = 10/60;;/api/x=abc;sem-limite;=5/60'
+    assert parse_routes(spec) == {'/api/chat': (20, 60.0), '/api/chat/stream': (10, 60.0)}
+    assert parse_routes('') == {}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    cfg = SimpleNamespace(
+        RATE_LIMIT_ENABLED=True,
+        RATE_LIMIT_ROUTES='/api/x=2/60',
+        RATE_LIMIT_DEFAULT='',
+        RATE_LIMIT_IP_MULTIPLIER=5,
+        RATE_LIMIT_TRUST_PROXY=False,
+        RATE_LIMIT_BACKEND='memory',
+        RATE_LIMIT_SHARDS=4,
+        RATE_LIMIT_SQLITE_PATH=str(tmp_path / 'ratelimit.db')
+    )
+    app = Flask(__name__)
+    app.route('/api/x', methods=['POST'])(lambda: jsonify({'ok': True}))
+    RateLimiter(app, cfg)
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: NOW)
+    return app.test_client()
+
+
+def test_retry_after_when_user_limit_is_reached(client):
+    for remaining in ('1', '0'):
+        response = client.post('/api/x', json={'user_id': 'u1'})
+        assert response.status_code == 200
+        assert response.headers['X-RateLimit-Limit'] == '2'
+        assert response.headers['X-RateLimit-Remaining'] == remaining
+        assert response.headers['X-RateLimit-Reset'] == '45'
+
+    response = client.post('/api/x', json={'user_id': 'u1'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '45'
+    # Outro usuário no mesmo IP ainda tem vagas (limite por IP = 2 * 5)
+    assert client.post('/api/x', json={'user_id': 'u2'}).status_code == 200
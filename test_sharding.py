@@ -0,0 +1,117 @@
+"""
+Testes do armazenamento particionado (ids globais, paginação entre shards e migração de layout)
+
+Uso:
+    python -m pytest -q test_sharding.py
+"""
+import pytest
+
+from database import DatabaseManager
+from sharding import ShardedStorage, migrate_layout, shard_paths
+
+USERS = [f'usuario-{n}' for n in range(8)]
+
+
+def usage(n):
+    return {'source': 'gemini', 'model': 'falso', 'prompt_tokens': 10 + n, 'output_tokens': n, 'latency_ms': 5.0}
+
+
+def fill(storage, turns=2):
+    """Grava ``turns`` pares pergunta/resposta por usuário (intercalados); retorna {id: (user, texto, pai)}"""
+    saved = {}
+    for turn in range(turns):
+        for n, user_id in enumerate(USERS):
+            question = f'pergunta {turn} de {user_id}'
+            question_id = storage.save_message(user_id, question, True)
+            answer = f'resposta {turn} para {user_id}'
+            answer_id = storage.save_message(user_id, answer, False, question_id, usage(n))
+            saved[question_id] = (user_id, question, None)
+            saved[answer_id] = (user_id, answer, question_id)
+    return saved
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    storage = ShardedStorage(str(tmp_path / 'chat.db'), 3, pool_size=1)
+    storage.init_database()
+    return storage
+
+
+def snapshot(storage):
+    """Conversas por usuário como (texto, texto do pai), independente dos ids"""
+    conversations = {}
+    for user_id in USERS:
+        history = storage.get_user_history(user_id)
+        texts = {message['id']: message['message'] for message in history}
+        conversations[user_id] = [(message['message'], texts.get(message['parent_message_id']))
+                                  for message in history]
+    return conversations
+
+
+def test_global_ids_round_trip(sharded):
+    saved = fill(sharded)
+    assert len({sharded.shard_index(user_id) for user_id in USERS}) == 3
+    assert len(saved) == 4 * len(USERS)
+
+    for global_id, (user_id, text, parent_id) in saved.items():
+        index = sharded.shard_index(user_id)
+        assert global_id % sharded.num_shards == index
+        assert sharded.to_global_id(sharded.to_local_id(global_id), index) == global_id
+        local = {m['id']: m for m in sharded.shards[index].get_user_history(user_id)}
+        assert local[sharded.to_local_id(global_id)]['message'] == text
+
+    # O histórico devolve ids e pais globais, que voltam a apontar para o mesmo shard
+    for user_id in USERS:
+        for message in sharded.get_user_history(user_id):
+            assert saved[message['id']] == (user_id, message['message'], message['parent_message_id'])
+
+
+def test_messages_page_merges_shards_in_global_order(sharded):
+    saved = fill(sharded)
+    seen, after_id = [], 0
+    while True:
+        page = sharded.get_messages_page(after_id, limit=5)
+        if not page:
+            break
+        assert len(page) <= 5
+        for message_id, user_id, message, is_user, created_at, parent_id in page:
+            assert saved[message_id] == (user_id, message, parent_id)
+            assert is_user == (parent_id is None)
+        seen.extend(row[0] for row in page)
+        after_id = page[-1][0]
+    assert seen == sorted(saved)
+
+    answers = sharded.get_messages_page(0, limit=1000, is_user=False)
+    assert [row[0] for row in answers] == sorted(i for i, (_, _, parent) in saved.items() if parent)
+    mine = sharded.get_messages_page(0, limit=1000, user_id=USERS[0])
+    assert [row[0] for row in mine] == sorted(i for i, (user, _, _) in saved.items() if user == USERS[0])
+
+
+def test_migrate_between_shard_counts(tmp_path):
+    single = DatabaseManager(str(tmp_path / 'single.db'))
+    single.init_database()
+    fill(single)
+    single.set_system_config('gemini_temperature', '0.3')
+    expected = snapshot(single)
+    assert all(len(conversation) == 4 for conversation in expected.values())
+    expected_usage = single.get_usage_report(group_by='user')['totals']
+
+    three = ShardedStorage(str(tmp_path / 'three.db'), 3, pool_size=1)
+    copied = migrate_layout([str(tmp_path / 'single.db')], three, batch_size=7)
+    assert (copied['messages'], copied['message_usage']) == (4 * len(USERS), 2 * len(USERS))
+    assert snapshot(three) == expected
+    assert three.get_usage_report(group_by='user')['totals'] == expected_usage
+    assert three.get_system_config('gemini_temperature') == '0.3'
+
+    # Rebalanceamento: 3 shards -> 2 shards
+    two = ShardedStorage(str(tmp_path / 'two.db'), 2, pool_size=1)
+    copied = migrate_layout(shard_paths(str(tmp_path / 'three.db'), 3), two, batch_size=7)
+    assert (copied['messages'], copied['message_usage']) == (4 * len(USERS), 2 * len(USERS))
+    assert snapshot(two) == expected
+    assert two.get_usage_report(group_by='user')['totals'] == expected_usage
+    assert two.get_system_config('gemini_temperature') == '0.3'
+
+    # Cada usuário ficou só no shard do seu hash
+    for user_id in USERS:
+        for index, shard in enumerate(two.shards):
+            assert bool(shard.get_user_history(user_id)) == (index == two.shard_index(user_id))
@@ -0,0 +1,150 @@
+"""
+Testes dos streams retomáveis (replay do prefixo, acompanhamento ao vivo, fusão de eventos e expiração)
+
+Uso:
+    python -m pytest -q test_streams.py
+"""
+import json
+import threading
+import time
+
+from sse import EventWriter, format_event, make_event_id
+from streams import ChatStream, StreamRegistry
+
+
+def parse(frame):
+    """Converte um evento SSE em (evento, seq, dados); comentários viram ('comment', None, None)"""
+    if frame.startswith(':'):
+        return 'comment', None, None
+    fields = dict(line.split(': ', 1) for line in frame.strip().split('\n'))
+    return fields['event'], int(fields['id'].rsplit(':', 1)[1]), json.loads(fields['data'])
+
+
+def text_of(frames):
+    return ''.join(data['text'] for event, _, data in map(parse, frames) if event == 'chunk')
+
+
+def write_reply(stream, chunks):
+    """Produz 'meta', um 'chunk' por trecho e 'end' (seqs 1..len(chunks) + 2)"""
+    writer = EventWriter(stream.stream_id, stream)
+    writer.event('meta', {'model': 'falso'})
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.event('end', {})
+    writer.close()
+
+
+def test_prefix_replay_after_seq():
+    stream = ChatStream(7)
+    write_reply(stream, ['ab', 'cd', 'ef'])
+
+    events = [parse(frame) for frame in stream.follow(heartbeat_interval=1)]
+    assert [(event, seq) for event, seq, _ in events] == [
+        ('meta', 1), ('chunk', 2), ('chunk', 3), ('chunk', 4), ('end', 5)]
+
+    # Retomada a partir do Last-Event-ID "7:3": só o que veio depois
+    frames = list(stream.follow(after_seq=3, heartbeat_interval=1))
+    assert [parse(frame)[:2] for frame in frames] == [('chunk', 4), ('end', 5)]
+    assert text_of(frames) == 'ef'
+    assert list(stream.follow(after_seq=5, heartbeat_interval=1)) == []
+
+
+def test_follow_live_tail_from_producer_thread():
+    stream = ChatStream(1)
+    chunks = [f'trecho {n} ' for n in range(5)]
+
+    def producer():
+        writer = EventWriter(1, stream)
+        for chunk in chunks:
+            time.sleep(0.01)
+            writer.write(chunk)
+        writer.close()
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    frames = list(stream.follow(heartbeat_interval=1))
+    thread.join()
+    assert text_of(frames) == ''.join(chunks)
+    assert [parse(frame)[1] for frame in frames] == [1, 2, 3, 4, 5]
+
+
+def test_follow_sends_heartbeat_while_idle():
+    stream = ChatStream(1)
+    follower = stream.follow(heartbeat_interval=0.01)
+    assert next(follower) == ': keep-alive\n\n'
+    stream.append(1, format_event({'text': 'oi'}, event='chunk', event_id=make_event_id(1, 1)))
+    assert parse(next(follower))[2] == {'text': 'oi'}
+    stream.close()
+    assert list(follower) == []
+
+
+def test_coalesced_chunks_are_sliced_when_resuming_mid_run():
+    stream = ChatStream(3, max_events=4)
+    write_reply(stream, ['ab', 'cd', 'ef', 'gh', 'ij'])
+    assert len(stream.frames) <= 4
+
+    frames = list(stream.follow(heartbeat_interval=1))
+    assert parse(frames[0])[0] == 'meta'
+    assert parse(frames[-1])[:2] == ('end', 7)
+    assert text_of(frames) == 'abcdefghij'
+
+    # Retomar no meio de um chunk fundido entrega só o restante, com o id do último seq fundido
+    frames = list(stream.follow(after_seq=3, heartbeat_interval=1))
+    assert text_of(frames) == 'efghij'
+    seqs = [parse(frame)[1] for frame in frames]
+    assert seqs == sorted(seqs) and seqs[-1] == 7
+
+
+def test_max_events_bounds_stored_frames():
+    stream = ChatStream(1, max_events=8)
+    chunks = [f'{n};' for n in range(200)]
+    write_reply(stream, chunks)
+    assert len(stream.frames) <= 8
+    assert text_of(stream.follow(heartbeat_interval=1)) == ''.join(chunks)
+    for after_seq in (1, 50, 150, 201):
+        expected = ''.join(chunks[after_seq - 1:])
+        assert text_of(stream.follow(after_seq=after_seq, heartbeat_interval=1)) == expected
+
+
+def test_follow_coalesce_sends_prefix_as_one_chunk():
+    stream = ChatStream(1)
+    write_reply(stream, ['ab', 'cd', 'ef'])
+    frames = list(stream.follow(after_seq=2, heartbeat_interval=1, coalesce=True))
+    assert [parse(frame)[:2] for frame in frames] == [('chunk', 4), ('end', 5)]
+    assert text_of(frames) == 'cdef'
+
+
+def test_get_requires_stream_token():
+    registry = StreamRegistry()
+    stream = registry.register(10)
+    assert registry.get(10, stream.token) is stream
+    assert registry.get('10', stream.token) is stream
+    assert registry.get(10, None) is None
+    assert registry.get(10, 'outro-token') is None
+    assert registry.get(11, stream.token) is None
+
+
+def test_finished_streams_expire_after_ttl():
+    registry = StreamRegistry(ttl=0.05)
+    finished, active = registry.register(1), registry.register(2)
+    finished.close()
+    time.sleep(0.1)
+    assert registry.get(1, finished.token) is None
+    # Streams ainda em geração não expiram pelo TTL
+    assert registry.get(2, active.token) is active
+
+
+def test_eviction_prefers_finished_then_oldest_active():
+    registry = StreamRegistry(max_streams=2, ttl=60)
+    first, second = registry.register(1), registry.register(2)
+    second.close()
+    third = registry.register(3)
+    assert registry.get(2, second.token) is None
+    assert registry.get(1, first.token) is first
+
+    # Só restam ativos: o mais antigo perde a retomada
+    fourth = registry.register(4)
+    assert registry.get(1, first.token) is None
+    assert registry.get(3, third.token) is third
+    assert registry.get(4, fourth.token) is fourth
+    assert registry.stats() == {'streams': 2, 'active': 2}
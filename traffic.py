@@ -0,0 +1,457 @@
+"""
+Gravação amostrada do tráfego de produção e replay contra uma instância local
+
+``TrafficRecorder`` registra uma fração (``TRAFFIC_RECORD_SAMPLE_RATE``)
+dos pares requisição/resposta com seus tempos. A requisição só monta um
+dicionário e o coloca em uma fila; a serialização e a escrita em arquivos
+JSONL rotativos (``TRAFFIC_RECORD_DIR``) ficam com uma thread em segundo
+plano. Com a fila cheia o registro é descartado, nunca espera. Requisições
+fora da amostra custam só o sorteio. O texto das conversas só é gravado com
+``TRAFFIC_RECORD_BODIES``; sem ele os campos de texto são mascarados.
+
+O replay reenvia o tráfego gravado, no ritmo original ou N vezes mais
+rápido, para uma instância local do app (iniciada com um servidor que imita
+o Gemini) e compara as distribuições de latência entre builds::
+
+    python traffic.py replay recordings/*.jsonl --speed 4 --out atual.json
+    python traffic.py replay recordings/*.jsonl --app-dir ../build-antigo --out antigo.json
+    python traffic.py compare antigo.json atual.json
+    python traffic.py overhead
+"""
+import glob
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import g, request
+
+# Headers gravados (nunca tokens ou cookies)
+RECORDED_HEADERS = ('Content-Type', 'Accept', 'Accept-Encoding', 'Last-Event-ID')
+# Campos com texto dos usuários, mascarados se TRAFFIC_RECORD_BODIES estiver desligado
+REDACTED_FIELDS = frozenset(('message', 'response', 'text', 'api_key'))
+TEXT_MIMETYPES = ('application/json', 'application/x-ndjson', 'application/x-www-form-urlencoded')
+
+
+def redact(value):
+    """Troca o texto dos campos sensíveis por '*' (mantém o tamanho para o replay)"""
+    if isinstance(value, dict):
+        return {key: '*' * len(item) if key in REDACTED_FIELDS and isinstance(item, str) else redact(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def capture_body(message, max_body: int, full: bool) -> Optional[str]:
+    """
+    Corpo textual de uma requisição/resposta, truncado em ``max_body``
+
+    Corpos comprimidos (Content-Encoding) ou binários não são gravados. Sem
+    ``full`` só corpos JSON são gravados, com os campos de REDACTED_FIELDS
+    mascarados.
+    """
+    mimetype = message.mimetype or ''
+    if message.headers.get('Content-Encoding') or not (mimetype.startswith('text/') or mimetype in TEXT_MIMETYPES):
+        return None
+    data = message.get_data()
+    if not data:
+        return None
+    if not full:
+        if mimetype != 'application/json':
+            return None
+        try:
+            text = json.dumps(redact(json.loads(data)), ensure_ascii=False)
+        except ValueError:
+            return None
+        return text[:max_body]
+    return data[:max_body].decode('utf-8', errors='replace')
+
+
+class TrafficRecorder:
+    """Middleware de gravação (mesmo padrão de integração do Profiler)"""
+
+    def __init__(self, app=None, cfg=None):
+        self.cfg = cfg
+        self._queue: Optional[queue.Queue] = None
+        self._thread = None
+        self._file = None
+        self._path = None
+        self._lock = threading.Lock()
+        self.stats = {'recorded': 0, 'dropped': 0, 'files': 0, 'errors': 0}
+        if app is not None:
+            self.init_app(app, cfg)
+
+    def init_app(self, app, cfg):
+        self.cfg = cfg
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        cfg = self.cfg
+        if not cfg.TRAFFIC_RECORD_ENABLED or random.random() >= cfg.TRAFFIC_RECORD_SAMPLE_RATE:
+            return
+        g.traffic_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('traffic_started', None)
+        if started is None:
+            return response
+        # A gravação nunca pode derrubar a requisição
+        try:
+            self._capture(response, started)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            print(f"[TRAFEGO] Erro ao capturar requisição: {e}")
+        return response
+
+    def _capture(self, response, started: float):
+        cfg = self.cfg
+        record = {
+            'ts': time.time(),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'headers': {name: request.headers[name] for name in RECORDED_HEADERS if name in request.headers},
+            'body': capture_body(request, cfg.TRAFFIC_RECORD_MAX_BODY, cfg.TRAFFIC_RECORD_BODIES),
+            'status': response.status_code,
+            'response_bytes': response.calculate_content_length(),
+            'response_body': None,
+            'headers_ms': round((time.perf_counter() - started) * 1000, 3),
+            'total_ms': None
+        }
+        if not response.is_streamed and not response.direct_passthrough:
+            if cfg.TRAFFIC_RECORD_BODIES:
+                record['response_body'] = capture_body(response, cfg.TRAFFIC_RECORD_MAX_BODY, True)
+            record['total_ms'] = record['headers_ms']
+            self.submit(record)
+            return
+
+        def finish():
+            # Respostas em streaming: tempo total só quando o corpo termina de ser enviado
+            record['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            self.submit(record)
+
+        response.call_on_close(finish)
+
+    def submit(self, record: Dict):
+        """Enfileira um registro sem bloquear (descartado se a fila estiver cheia)"""
+        if self._queue is None:
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.stats['dropped'] += 1
+
+    def _start(self):
+        with self._lock:
+            if self._queue is not None:
+                return
+            self._queue = queue.Queue(maxsize=self.cfg.TRAFFIC_RECORD_QUEUE_SIZE)
+            self._thread = threading.Thread(target=self._run, name='traffic-recorder', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Escrever em lote tudo o que já estiver na fila
+            while len(batch) < 500:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                batch = [record for record in batch if record is not None]
+                self._write(batch)
+                self._close_file()
+                return
+            self._write(batch)
+
+    def _write(self, batch: List[Dict]):
+        if not batch:
+            return
+        try:
+            if self._file is None or self._file.tell() >= self.cfg.TRAFFIC_RECORD_MAX_BYTES:
+                self._rotate()
+            self._file.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in batch))
+            self._file.flush()
+            with self._lock:
+                self.stats['recorded'] += len(batch)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            print(f"[TRAFEGO] Erro ao gravar registros: {e}")
+
+    def _rotate(self):
+        """Abre um novo arquivo e remove os mais antigos acima de TRAFFIC_RECORD_MAX_FILES"""
+        self._close_file()
+        directory = self.cfg.TRAFFIC_RECORD_DIR
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, f"traffic-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.jsonl")
+        self._file = open(self._path, 'a', encoding='utf-8')
+        with self._lock:
+            self.stats['files'] += 1
+        for old in sorted(glob.glob(os.path.join(directory, 'traffic-*.jsonl')))[:-self.cfg.TRAFFIC_RECORD_MAX_FILES]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self, timeout: float = 5.0):
+        """Grava o que está na fila e fecha o arquivo atual"""
+        if self._queue is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._queue = None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            'enabled': self.cfg.TRAFFIC_RECORD_ENABLED,
+            'sample_rate': self.cfg.TRAFFIC_RECORD_SAMPLE_RATE,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'file': self._path
+        })
+        return stats
+
+
+# --- Replay ---------------------------------------------------------------
+
+def load_records(paths: List[str]) -> List[Dict]:
+    records = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record['ts'])
+    return records
+
+
+def route_of(path: str) -> str:
+    """Agrupa caminhos com ids (``/api/history/u1`` -> ``/api/history/<id>``)"""
+    parts = path.split('?', 1)[0].split('/')
+    if len(parts) > 3 and parts[1] == 'api' and parts[2] in ('history', 'chat') and parts[3] not in ('batch', 'stream'):
+        parts[3] = '<id>'
+    if len(parts) > 4 and parts[2] == 'chat' and parts[3] == 'stream':
+        parts[4] = '<id>'
+    return '/'.join(parts)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def summarize(results: List[Dict]) -> Dict[str, Dict]:
+    by_route: Dict[str, List[Dict]] = {}
+    for result in results:
+        by_route.setdefault(f"{result['method']} {route_of(result['path'])}", []).append(result)
+    summary = {}
+    for route, items in sorted(by_route.items()):
+        latencies = [item['ms'] for item in items]
+        summary[route] = {
+            'count': len(items),
+            'errors': sum(1 for item in items if item['status'] >= 500 or item['status'] == 0),
+            'p50': round(percentile(latencies, 0.5), 2),
+            'p90': round(percentile(latencies, 0.9), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'max': round(max(latencies), 2)
+        }
+    return summary
+
+
+def send(base_url: str, record: Dict, timeout: float = 60.0) -> Dict:
+    import urllib.error
+    import urllib.request
+
+    body = record['body'].encode('utf-8') if record.get('body') else None
+    req = urllib.request.Request(base_url + record['path'], data=body, method=record['method'],
+                                 headers=record.get('headers') or {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except Exception:
+        status = 0
+    return {'method': record['method'], 'path': record['path'], 'status': status,
+            'ms': (time.perf_counter() - started) * 1000}
+
+
+def replay(records: List[Dict], base_url: str, speed: float = 1.0, workers: int = 32) -> List[Dict]:
+    """Reenvia os registros respeitando os intervalos originais divididos por ``speed``"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not records:
+        return []
+    first = records[0]['ts']
+    started = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for record in records:
+            delay = (record['ts'] - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(send, base_url, record))
+    return [future.result() for future in futures]
+
+
+def start_local_instance(app_dir: str, gemini_base: str, workdir: str):
+    """Inicia ``app.py`` de ``app_dir`` com banco temporário e o Gemini local; retorna (processo, url)"""
+    import socket
+    import subprocess
+    import sys
+    import urllib.request
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, HOST='127.0.0.1', PORT=str(port), DEBUG='false', STORAGE_BACKEND='sqlite',
+               DATABASE_PATH=os.path.join(workdir, 'replay.db'), GEMINI_API_KEY='replay-key',
+               GEMINI_TRANSPORT='rest', GEMINI_API_BASE=gemini_base, TRAFFIC_RECORD_ENABLED='false',
+               RESPONSE_CACHE_ENABLED='false', PRECOMPUTED_ENABLED='false',
+               RATE_LIMIT_ENABLED='false')
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=app_dir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/api/health/live', timeout=1).read()
+            return process, base_url
+        except Exception:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Instância local não respondeu em {base_url}")
+
+
+def print_summary(summary: Dict[str, Dict]):
+    print(f"{'rota':<40} {'n':>6} {'erros':>6} {'p50':>9} {'p90':>9} {'p99':>9}")
+    for route, entry in summary.items():
+        print(f"{route:<40} {entry['count']:>6} {entry['errors']:>6} {entry['p50']:>7.2f}ms "
+              f"{entry['p90']:>7.2f}ms {entry['p99']:>7.2f}ms")
+
+
+def compare(baseline: Dict[str, Dict], candidate: Dict[str, Dict]):
+    print(f"{'rota':<40} {'p50 base':>10} {'p50 novo':>10} {'Δ':>8} {'p99 base':>10} {'p99 novo':>10} {'Δ':>8}")
+
+    def delta(old, new):
+        return f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+
+    for route in sorted(set(baseline) | set(candidate)):
+        old, new = baseline.get(route), candidate.get(route)
+        if not old or not new:
+            print(f"{route:<40} {'(só em ' + ('novo' if new else 'base') + ')':>10}")
+            continue
+        print(f"{route:<40} {old['p50']:>8.2f}ms {new['p50']:>8.2f}ms {delta(old['p50'], new['p50']):>8} "
+              f"{old['p99']:>8.2f}ms {new['p99']:>8.2f}ms {delta(old['p99'], new['p99']):>8}")
+
+
+def measure_overhead(iterations: int = 100000) -> Dict[str, float]:
+    """Custo por requisição dos hooks, fora e dentro da amostra (µs)"""
+    import tempfile
+    from types import SimpleNamespace
+    from flask import Flask
+
+    app = Flask(__name__)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, rate in (('fora da amostra', 0.0), ('amostrado', 1.0)):
+            cfg = SimpleNamespace(TRAFFIC_RECORD_ENABLED=True, TRAFFIC_RECORD_SAMPLE_RATE=rate,
+                                  TRAFFIC_RECORD_DIR=workdir, TRAFFIC_RECORD_MAX_BYTES=50 * 1024 * 1024,
+                                  TRAFFIC_RECORD_MAX_FILES=5, TRAFFIC_RECORD_MAX_BODY=4096, TRAFFIC_RECORD_BODIES=False,
+                                  TRAFFIC_RECORD_QUEUE_SIZE=iterations + 1)
+            recorder = TrafficRecorder(cfg=cfg)
+            count = iterations if rate == 0 else iterations // 10
+            with app.test_request_context('/api/chat', method='POST', json={'message': 'Olá'}):
+                response = app.response_class('{"response": "Oi"}', mimetype='application/json')
+                started = time.perf_counter()
+                for _ in range(count):
+                    recorder._before_request()
+                    recorder._after_request(response)
+                    for func in response._on_close:
+                        func()
+                    response._on_close.clear()
+                results[name] = (time.perf_counter() - started) / count * 1e6
+            recorder.close()
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import tempfile
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).parent))
+
+    parser = argparse.ArgumentParser(description="Replay e comparação do tráfego gravado")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    replay_cmd = sub.add_parser('replay', help="Reenvia o tráfego gravado")
+    replay_cmd.add_argument('files', nargs='+')
+    replay_cmd.add_argument('--speed', type=float, default=1.0, help="1 = ritmo original, N = N vezes mais rápido")
+    replay_cmd.add_argument('--target', help="URL de uma instância já em execução (padrão: iniciar uma local)")
+    replay_cmd.add_argument('--app-dir', default=str(Path(__file__).parent),
+                            help="Diretório do build a iniciar (para comparar builds)")
+    replay_cmd.add_argument('--gemini-latency', type=float, default=300.0, help="Latência do Gemini local (ms)")
+    replay_cmd.add_argument('--workers', type=int, default=32)
+    replay_cmd.add_argument('--out', help="Salva o resumo em JSON (para o compare)")
+
+    compare_cmd = sub.add_parser('compare', help="Compara dois resumos de replay")
+    compare_cmd.add_argument('baseline')
+    compare_cmd.add_argument('candidate')
+
+    sub.add_parser('overhead', help="Mede o custo dos hooks de gravação por requisição")
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        records = load_records([path for pattern in args.files for path in sorted(glob.glob(pattern)) or [pattern]])
+        print(f"[TRAFEGO] {len(records)} requisições, velocidade {args.speed}x")
+        process = None
+        with tempfile.TemporaryDirectory() as workdir:
+            try:
+                base_url = args.target
+                if not base_url:
+                    from gemini_rest_bench import start_stand_in
+                    stand_in = start_stand_in(args.gemini_latency, chunks=8)
+                    process, base_url = start_local_instance(
+                        os.path.abspath(args.app_dir), f'http://127.0.0.1:{stand_in.server_port}/v1beta', workdir
+                    )
+                started = time.perf_counter()
+                results = replay(records, base_url.rstrip('/'), args.speed, args.workers)
+                print(f"[TRAFEGO] Replay concluído em {time.perf_counter() - started:.1f}s")
+            finally:
+                if process is not None:
+                    process.terminate()
+                    process.wait(10)
+        summary = summarize(results)
+        print_summary(summary)
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+    elif args.command == 'compare':
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.candidate, encoding='utf-8') as f:
+            candidate = json.load(f)
+        compare(baseline, candidate)
+    else:
+        for name, micros in measure_overhead().items():
+            print(f"{name:<16} {micros:>8.2f} µs/requisição")
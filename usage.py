@@ -0,0 +1,134 @@
+"""
+Contabilização de tokens e latência por resposta do bot
+
+Cada resposta gerada pelo caminho do Gemini grava uma linha na tabela
+``message_usage`` (mesma transação do ``save_message``) com a origem da
+resposta, o modelo, os tokens do prompt e da saída, a latência do Gemini e,
+no streaming, o tempo até o primeiro trecho. As origens são:
+
+- ``gemini``: chamada ao modelo (tokens cobrados)
+- ``response_cache``, ``semantic_cache``, ``precomputed``, ``late``:
+  respostas já conhecidas (sem custo de tokens, exceto ``late``, que grava
+  os tokens da chamada que chegou depois do prazo); ``faq`` aparece em
+  linhas gravadas quando o FAQ também respondia no caminho do Gemini
+- ``timeout``, ``error``: o Gemini não respondeu a tempo ou falhou
+
+Tokens de chamadas sem mensagem própria (o hedge perdedor, uma resposta
+atrasada descartada) são somados à próxima resposta do mesmo usuário.
+
+Os relatórios agrupam por usuário, modelo, origem ou dia; cada backend
+devolve somas parciais (``usage_rows``) e ``build_usage_report`` as combina,
+o que permite somar os shards sem recalcular médias.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Ordem das colunas gravadas em message_usage (depois de message_id e user_id)
+USAGE_FIELDS = ('source', 'model', 'prompt_tokens', 'output_tokens', 'cache_hit', 'latency_ms', 'first_chunk_ms')
+CACHE_SOURCES = frozenset({'response_cache', 'semantic_cache', 'precomputed', 'faq', 'late'})
+USAGE_GROUPS = ('user', 'model', 'source', 'day')
+USAGE_ORDERS = ('tokens', 'latency', 'messages')
+
+
+def token_counts(response) -> Tuple[int, int]:
+    """(tokens do prompt, tokens da saída) de uma resposta do SDK ou do transporte REST"""
+    metadata = getattr(response, 'usage_metadata', None)
+    if metadata is None:
+        return 0, 0
+    return (int(getattr(metadata, 'prompt_token_count', 0) or 0),
+            int(getattr(metadata, 'candidates_token_count', 0) or 0))
+
+
+def usage_values(usage: Dict) -> tuple:
+    """Valores de ``USAGE_FIELDS`` de um dict de uso (campos ausentes com padrão)"""
+    source = usage.get('source') or 'gemini'
+    return (
+        source,
+        usage.get('model'),
+        int(usage.get('prompt_tokens') or 0),
+        int(usage.get('output_tokens') or 0),
+        bool(usage.get('cache_hit', source in CACHE_SOURCES)),
+        usage.get('latency_ms'),
+        usage.get('first_chunk_ms')
+    )
+
+
+# Linha parcial de um grupo:
+# (chave, mensagens, tokens do prompt, tokens da saída, acertos de cache,
+#  soma da latência, mensagens com latência, maior latência,
+#  soma do primeiro trecho, mensagens com primeiro trecho)
+UsageRow = tuple
+
+
+def usage_rows(records: Iterable[Dict], group_by: str) -> List[UsageRow]:
+    """Somas parciais por grupo a partir de registros em memória (dicts com user_id e created_at)"""
+    groups: Dict[str, list] = {}
+    for record in records:
+        key = _group_key(record, group_by)
+        row = groups.setdefault(key, [key, 0, 0, 0, 0, 0.0, 0, None, 0.0, 0])
+        _accumulate(row, (key, 1, record['prompt_tokens'], record['output_tokens'], int(record['cache_hit']),
+                          record['latency_ms'] or 0.0, int(record['latency_ms'] is not None),
+                          record['latency_ms'], record['first_chunk_ms'] or 0.0,
+                          int(record['first_chunk_ms'] is not None)))
+    return [tuple(row) for row in groups.values()]
+
+
+def _group_key(record: Dict, group_by: str) -> str:
+    if group_by == 'user':
+        return record['user_id']
+    if group_by == 'model':
+        return record['model'] or ''
+    if group_by == 'source':
+        return record['source']
+    return str(record['created_at'])[:10]
+
+
+def _accumulate(total: list, row: UsageRow):
+    for position in (1, 2, 3, 4, 5, 6, 8, 9):
+        total[position] += row[position] or 0
+    if row[7] is not None and (total[7] is None or row[7] > total[7]):
+        total[7] = row[7]
+
+
+def _summary(row: list) -> Dict:
+    (key, messages, prompt_tokens, output_tokens, cache_hits,
+     latency_total, latency_count, latency_max, first_chunk_total, first_chunk_count) = row
+    return {
+        'key': key,
+        'messages': messages,
+        'prompt_tokens': prompt_tokens,
+        'output_tokens': output_tokens,
+        'total_tokens': prompt_tokens + output_tokens,
+        'cache_hits': cache_hits,
+        'cache_hit_rate': round(cache_hits / messages, 3) if messages else 0.0,
+        'total_latency_ms': round(latency_total, 2),
+        'avg_latency_ms': round(latency_total / latency_count, 2) if latency_count else None,
+        'max_latency_ms': round(latency_max, 2) if latency_max is not None else None,
+        'avg_first_chunk_ms': round(first_chunk_total / first_chunk_count, 2) if first_chunk_count else None
+    }
+
+
+def build_usage_report(rows: Iterable[UsageRow], group_by: str = 'user', limit: int = 20,
+                       order_by: str = 'tokens', since: Optional[str] = None) -> Dict:
+    """Relatório com os totais e os ``limit`` grupos mais caros (combina linhas de mesma chave)"""
+    merged: Dict[str, list] = {}
+    totals = ['total', 0, 0, 0, 0, 0.0, 0, None, 0.0, 0]
+    for row in rows:
+        group = merged.setdefault(row[0], [row[0], 0, 0, 0, 0, 0.0, 0, None, 0.0, 0])
+        _accumulate(group, row)
+        _accumulate(totals, row)
+
+    sort_key = {
+        'tokens': lambda item: (item['total_tokens'], item['total_latency_ms']),
+        'latency': lambda item: (item['total_latency_ms'], item['total_tokens']),
+        'messages': lambda item: (item['messages'], item['total_tokens'])
+    }[order_by]
+    groups = sorted((_summary(group) for group in merged.values()), key=sort_key, reverse=True)
+    summary = _summary(totals)
+    summary.pop('key')
+    return {
+        'group_by': group_by,
+        'order_by': order_by,
+        'since': since,
+        'totals': summary,
+        'groups': groups[:limit]
+    }